@@ -1,128 +1,186 @@
 from __future__ import annotations
 
+import asyncio
+import json
+import os
+import re
+
 from dotenv import load_dotenv
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph import StateGraph, START, END
 from langchain.chat_models import init_chat_model
-from langchain_core.messages import SystemMessage, AIMessage
-from typing import Annotated, Literal
-from pydantic import BaseModel, Field, field_validator
-
+from langchain_core.messages import SystemMessage, AIMessage, HumanMessage
+
+from catalog import Problem, catalog
+from checkpoint_store import default_checkpointer
+from classifier import classifier_messages
+from complexity import complexity_report, format_report
+from context import pinned_question_number, build_prompt, planner_context, summary_messages, unsummarized
+from intent import DEFAULT_FAST_PATH_THRESHOLD, pre_classify
+from llm_gateway import GatedLLM, LLMGateway, gateway as default_gateway
+from llm_policy import NODE_POLICIES, CallPolicy, ResilientLLM, call_stats
+from model_tiers import FallbackLLM, ModelChoice, TieredLLM, default_node_models
+from models import MessageClassifier
+from registry import ModelRegistry
+from response_cache import ResponseCache
+from sandbox import CheckResult, SandboxPool, extract_python_blocks
 from state import State
+from telemetry import CODE_CHECKS, metrics, traced_node
 
 load_dotenv()
 
+CODE_NODE = "Code the solution as per user req/code correction"
+# Parallel branches of CODE_NODE when code drafts fan out (see build_graph).
+BRUTE_FORCE_DRAFT = "Code draft - brute force"
+OPTIMIZED_DRAFT = "Code draft - optimized"
+CODE_DRAFT_NODES = (BRUTE_FORCE_DRAFT, OPTIMIZED_DRAFT)
+
+VERIFY_NODE = "Verify code"
+# Nodes whose Python code is run against the pinned problem's examples when a sandbox is set.
+VERIFIED_NODES = (CODE_NODE, "User code correction")
+
+REPAIR_PROMPT = """
+    You fix Python solutions to a LeetCode problem that failed its examples.
+    For each failing solution below, return the corrected code in its own ```python block, in the same order.
+    Keep the approach, the class and method names and the signature; change only what is needed to pass.
+    Return only the code blocks.
+"""
+
+_EXPLANATION_HEADING = re.compile(r"^[ \t#*]*C[12]\.", re.MULTILINE)
+
+
+def describe_failure(problem: Problem, result: CheckResult) -> str:
+    for example, case in zip(problem.examples, result.cases):
+        if not case.ok:
+            args = ", ".join(f"{name} = {json.dumps(value)}" for name, value in example["input"].items())
+            outcome = f"raised {case.error}" if case.error else f"got {case.got}"
+            return f"Input: {args} -> expected {json.dumps(example['output'])}, {outcome}"
+    return result.error or "failed"
+
+
+def verification_summary(problem: Problem, checks: list[tuple[str, CheckResult, bool]]) -> str:
+    """Markdown footer with pass/fail and runtime per (label, result, repaired) code block."""
+    total = len(problem.examples)
+    lines = [f"**Checked against the {total} examples of #{problem.number} in a sandbox:**"]
+    for label, result, repaired in checks:
+        passed = sum(case.ok for case in result.cases)
+        if result.passed:
+            fixed = " (after an automatic fix)" if repaired else ""
+            lines.append(f"- {label}: ✅ {passed}/{total} passed in {result.runtime_ms:.2f} ms{fixed}")
+        else:
+            lines.append(f"- {label}: ❌ {passed}/{total} passed. {describe_failure(problem, result)}")
+    return "\n".join(lines)
+
+
+def merge_code_drafts(brute_force: str, optimized: str) -> str:
+    """Interleave the two drafts into the single-call layout: A, B1, B2, C1, C2, D.
+
+    Each draft puts its code first and its explanation under a C1./C2. heading;
+    drafts without that heading are simply concatenated.
+    """
+    brute_split = _EXPLANATION_HEADING.search(brute_force)
+    optimized_split = _EXPLANATION_HEADING.search(optimized)
+    if not brute_split or not optimized_split:
+        return f"{brute_force.strip()}\n\n{optimized.strip()}"
+    return "\n\n".join(part.strip() for part in (
+        brute_force[:brute_split.start()],
+        optimized[:optimized_split.start()],
+        brute_force[brute_split.start():],
+        optimized[optimized_split.start():],
+    ))
+
+
+def build_graph(
+    model: str = "claude-3-5-haiku-20241022",
+    system_prompt: str | None = None,
+    fast_path_threshold: float | None = DEFAULT_FAST_PATH_THRESHOLD,
+    response_cache: ResponseCache | None = None,
+    prompt_caching: bool | None = None,
+    gateway: LLMGateway | None = None,
+    call_policies: dict[str, CallPolicy] | None = None,
+    node_models: dict[str, ModelChoice] | None = None,
+    registry: ModelRegistry | None = None,
+    parallel_code_drafts: bool | None = None,
+    sandbox: SandboxPool | None = None,
+    benchmark_seconds: float | None = None,
+    checkpointer: BaseCheckpointSaver | None = None,
+):
+    """Build the planner/router graph.
+
+    `fast_path_threshold` is the minimum `intent.pre_classify` confidence at which the
+    planner trusts the local classifier and skips its LLM call; None disables it.
+    `response_cache` serves question-level replies for cold-context turns.
+    `prompt_caching` marks the static system prompts and the pinned question as
+    provider-cacheable; by default it is on for Anthropic models.
+    `gateway` bounds concurrency and rate of the model calls and schedules them fairly.
+    `call_policies` overrides the per-node timeout/retry/hedging policies of `llm_policy`.
+    `node_models` picks a model (and fallback) per node, defaulting to the fast/strong
+    tiers of `model_tiers`; nodes without an entry use `model`. Pass {} to use `model`
+    everywhere.
+    `registry` supplies the (lazily created, shared) chat-model clients.
+    `parallel_code_drafts` writes the brute-force and optimized halves of a code
+    answer in two parallel branches and merges them, so the turn takes about as
+    long as the slower half; by default it follows PARALLEL_CODE_DRAFTS (off).
+    `sandbox` runs the Python code of code answers and code corrections against the
+    pinned problem's examples, asks the model once to repair failing blocks, and
+    appends the pass/fail and runtime of each block to the reply.
+    `benchmark_seconds` (with a sandbox) then times the brute-force and optimized
+    blocks, once both pass, on growing synthetic inputs for up to that many seconds
+    each and appends measured against claimed complexity; by default it is
+    CODE_BENCHMARK_SECONDS (2) when CODE_BENCHMARK is on, else 0 (off).
+    `checkpointer` persists the graph state after every step under the run's
+    `thread_id` (see checkpoint_store); runs then need that in their config.
+    """
+    registry = registry or default_registry
+    if parallel_code_drafts is None:
+        parallel_code_drafts = os.getenv("PARALLEL_CODE_DRAFTS", "off").lower() in {"on", "1", "true"}
+    if benchmark_seconds is None:
+        benchmark_on = os.getenv("CODE_BENCHMARK", "off").lower() in {"on", "1", "true"}
+        benchmark_seconds = float(os.getenv("CODE_BENCHMARK_SECONDS", "2")) if benchmark_on else 0.0
+    policies = {**NODE_POLICIES, **(call_policies or {})}
+    node_models = default_node_models() if node_models is None else node_models
+    clients: dict[str, ResilientLLM] = {}
+
+    def client(name: str) -> ResilientLLM:
+        if name not in clients:
+            base = registry.client(name)
+            clients[name] = ResilientLLM(GatedLLM(base, gateway) if gateway is not None else base, policies, call_stats)
+        return clients[name]
+
+    def route(choice: ModelChoice):
+        if choice.fallback and choice.fallback != choice.primary:
+            return FallbackLLM(client(choice.primary).single_attempt(), client(choice.fallback), call_stats)
+        return client(choice.primary)
+
+    llm = TieredLLM({node: route(choice) for node, choice in node_models.items()}, client(model))
+
+    def model_for(node: str) -> str:
+        return node_models[node].primary if node in node_models else model
+
+    model_names = [model] + [choice.primary for choice in node_models.values()] + [
+        choice.fallback for choice in node_models.values() if choice.fallback
+    ]
+    cache_prompts = prompt_caching if prompt_caching is not None else all(
+        name.startswith(("claude", "anthropic:")) for name in model_names
+    )
+    # Derived once per build; the registry's clients also share it across builds.
+    classifier_llm = llm.with_structured_output(MessageClassifier)
 
-def build_graph(model: str = "claude-3-5-haiku-20241022", system_prompt: str | None = None,):
-    llm = init_chat_model(model)
-
-    class MessageClassifier(BaseModel):
-        message_type: Literal[
-            "LeetCode Question",
-            "Question explanation",
-            "Solution explanation",
-            "User explanation correction",
-            "User solution correction",
-            "Code the solution as per user req/code correction",
-            "Asking user for programming language",
-            "User code correction",
-        ] = Field(
-            ...,
-            description="Classify if the message requires based on the user's intent."
-        )
-
-        @field_validator("message_type", mode="before")
-        @classmethod
-        def normalize_message_type(cls, value: str) -> str:
-            """Normalize classifier output to the expected canonical label."""
-            if not isinstance(value, str):
-                raise TypeError("message_type must be a string")
-
-            normalized = value.strip().lower()
-            mapping = {
-                "leetcode question": "LeetCode Question",
-                "question explanation": "Question explanation",
-                "solution explanation": "Solution explanation",
-                "user explanation correction": "User explanation correction",
-                "user solution correction": "User solution correction",
-                "code the solution as per user req/code correction": "Code the solution as per user req/code correction",
-                "asking user for programming language": "Asking user for programming language",
-                "user code correction": "User code correction",
-            }
-            mapped = mapping.get(normalized)
-            if mapped:
-                return mapped
-            raise ValueError(f"Unexpected message_type: {value}")
-
-    def planner_node(state: State) -> dict:
+    async def planner_node(state: State) -> dict:
         last_message = state["messages"][-1]
-        classifier_llm = llm.with_structured_output(MessageClassifier)
-
-        result = classifier_llm.invoke([{
-            "role": "system",
-            "content":  """
-            You are an expert at classifying user intents based on their messages.
-            Classify each message into one of the following categories. Read the detailed meaning of each category carefully before deciding.
-
-            0. LeetCode Question
-            - Meaning: The user is providing a LeetCode question to be stored/acknowledged for later use (often asking for a simple title of the Question).
-            - Indicators: Mentions a LeetCode question number/title and asks to remember/store it; requests only an acknowledgment.
-            - Focus: Acknowledge and remember the question context; no explanation or code yet.
-
-            1. Question Explanation
-            - Meaning: The user wants you to explain the question.
-            - Indicators: "What does this question mean?", "Explain this problem statement", "What is being asked here?"
-            - Focus: Explain what the question is asking, not how to solve it.
-
-            2. Solution Explanation
-            - Meaning: The user wants the AI to explain the thought process of solving the problem — including BOTH a brute-force baseline and an optimized approach.
-            - Indicators: "Can you explain the thought process of the solution?", "Break down the solution", "Can you walk me through how this solution works?"
-            - Focus: Explain reasoning and strategy for BOTH brute-force and optimized approaches (conceptual only). Do NOT provide code unless the user explicitly asked for code.
-
-            3. User Explanation Correction
-            - Meaning: The user provides their own explanation of a question or solution and wants it corrected or validated.
-            - Indicators: "Is my explanation correct?", "Please fix my explanation", "Did I understand this properly?"
-            - Focus: Improve or validate the user’s explanation text, not the code or question itself.
-
-            4. User Solution Correction
-            - Meaning: The user submits their own solution (in code or logic) and asks the AI to check or correct it.
-            - Indicators: "Here’s my code — is it correct?", "Review my solution", "What’s wrong with my approach?"
-            - Focus: Validate or improve the user’s provided solution, not rewrite it completely.
-
-            5. Code the Solution as per User Req / Code Correction
-            - Meaning: The user wants new or modified code written to meet specific requirements, or correction of existing code.
-            - Indicators: "Write code for this problem", "Modify my code to do X", "Fix this error"
-            - Focus: Produce, modify, or debug code — mainly code generation or editing.
-
-            6. Asking User for Programming Language
-            - Meaning: The AI needs clarification about which programming language to use before coding.
-            - Indicators: The user did not specify a language, and the AI asks: "Which programming language should I use?"
-            - Focus: Ask the user to clarify the coding language.
-
-            7. User Code Correction
-            - Meaning: The user provides code with errors and wants it fixed so it runs correctly.
-            - Indicators: "My code gives an error", "This doesn’t compile/run", "Fix my syntax or logic"
-            - Focus: Identify and fix syntax, logic, or runtime errors in the provided code.
-
-            Summary Table:
-            | Category | User Goal | Output |
-            |-----------|------------|--------|
-            | LeetCode Question | Understand question details | Acknowledgment Title of the question |
-            | Question explanation | Understand question meaning | Clarified question |
-            | Solution explanation | Understand solution strategy | Conceptual brute-force + optimized explanation |
-            | User explanation correction | Validate/fix user explanation | Corrected explanation |
-            | User solution correction | Validate user’s code/logic | Feedback on correctness |
-            | Code the solution as per user req/code correction | Get working or modified code | New/fixed code |
-            | Asking user for programming language | Clarify code language | Language clarification question |
-            | User code correction | Fix code errors | Corrected, runnable code |
-            """
-        },{
-            "role": "user",
-            "content": last_message.content
-        }])
+
+        if fast_path_threshold is not None:
+            guess = pre_classify(str(last_message.content))
+            if guess.confidence >= fast_path_threshold:
+                return {"message_type": guess.message_type}
+
+        # The planner only sees the latest message plus the pinned question, never the full history.
+        messages = classifier_messages(last_message.content, planner_context(state), cache_prompt=cache_prompts)
+        result = await classifier_llm.ainvoke(messages)
 
         return {"message_type": result.message_type}
 
-    def router_node(state: State) -> dict:
+    async def router_node(state: State) -> dict:
         message_type = state["message_type"]
         if message_type == "LeetCode Question":
             return {"next": "LeetCode Question"}
@@ -145,13 +203,32 @@ def build_graph(model: str = "claude-3-5-haiku-20241022", system_prompt: str | N
         # Fallback keeps execution safe if an unexpected type slips through.
         return {"next": "assistant"}
 
-    def leetcode_question_node(state: State) -> dict:
-        # Implement the logic for handling LeetCode question here.
-        last_message = state["messages"][-1]
-        print("Last message in LeetCode question node:", last_message.content)
+    async def cached_reply(state: State, node: str, messages: list) -> dict:
+        key = response_cache.key_for(node, model_for(node), state["messages"]) if response_cache else None
+        if key:
+            cached = await response_cache.get(node, key)
+            if cached is not None:
+                return {"messages": [AIMessage(content=cached)]}
+
+        reply = await llm.ainvoke(messages)
+        # The key names the node's primary model, so a fallback model's reply is not stored.
+        if key and not (getattr(reply, "response_metadata", None) or {}).get("fallback"):
+            await response_cache.put(node, key, str(reply.content))
+        return {"messages": [AIMessage(content=reply.content)]}
 
-        messages = [
-            SystemMessage(content="""
+    async def context_node(state: State) -> dict:
+        # Fold turns that slid out of the verbatim window into the rolling summary.
+        if state.get("next") in ("End Task", "assistant"):
+            return {}
+        pending, watermark = unsummarized(state)
+        if not pending:
+            return {"summarized_upto": watermark}
+        reply = await llm.ainvoke(summary_messages(state.get("summary"), pending))
+        return {"summary": str(reply.content), "summarized_upto": watermark}
+
+    async def leetcode_question_node(state: State) -> dict:
+        # Implement the logic for handling LeetCode question here.
+        messages = build_prompt(state, """
                 You are an expert at understanding and processing LeetCode questions.
 
                 Your task is to:
@@ -162,18 +239,14 @@ def build_graph(model: str = "claude-3-5-haiku-20241022", system_prompt: str | N
                 Guidelines:
                 - Do NOT provide any explanations, solutions, or code related to the question at this stage.
                 - Focus solely on confirming that you have understood and stored the question details.
-            """)
-        ] + state["messages"]
-        reply = llm.invoke(messages)
+            """, "LeetCode Question", cache=cache_prompts)
+        return await cached_reply(state, "LeetCode Question", messages)
 
-        return {"messages": [AIMessage(content=reply.content)]}
-
-    def solution_explanation_node(state: State) -> dict:
+    async def solution_explanation_node(state: State) -> dict:
         # Implement the logic for solution explanation here.
         last_message = state["messages"][-1]
 
-        messages = [
-            SystemMessage(content="""
+        messages = build_prompt(state, """
                 You are an expert problem solver and algorithmic reasoning coach.
                 Your task is to **explain the thought process** behind solving the given LeetCode problem — NOT the code implementation.
 
@@ -195,16 +268,13 @@ def build_graph(model: str = "claude-3-5-haiku-20241022", system_prompt: str | N
                 STRICT GUIDELINES:
                 - Do NOT provide any code or pseudocode.
                 - Keep explanations clear, concise, and beginner-friendly.
-            """)
-        ] + state["messages"]
-        reply = llm.invoke(messages)
-        return {"messages": [AIMessage(content=reply.content)]}
+            """, "Solution explanation", cache=cache_prompts)
+        return await cached_reply(state, "Solution explanation", messages)
 
-    def user_explanation_correction_node(state: State) -> dict:
+    async def user_explanation_correction_node(state: State) -> dict:
         last_message = state["messages"][-1]
 
-        messages = [
-            SystemMessage(content="""
+        messages = build_prompt(state, """
                 You are an expert LeetCode mentor focused ONLY on correcting a user's explanation of a problem.
 
                 Your job:
@@ -247,18 +317,16 @@ def build_graph(model: str = "claude-3-5-haiku-20241022", system_prompt: str | N
                 (or mixes multiple problems). Otherwise, do not ask questions.
                 - Do NOT provide any code or pseudocode.
                 - Keep explanations clear, concise, and beginner-friendly.
-            """)
-        ] + state["messages"]
+            """, "User explanation correction", cache=cache_prompts)
 
-        reply = llm.invoke(messages)
+        reply = await llm.ainvoke(messages)
         return {"messages": [AIMessage(content=reply.content)]}
 
-    def question_explanation_node(state: State) -> dict:
+    async def question_explanation_node(state: State) -> dict:
         # Implement the logic for question explanation here.
         last_message = state["messages"][-1]
 
-        messages = [
-            SystemMessage(content="""You are an AI tutor who helps users clearly understand LeetCode or algorithm questions.
+        messages = build_prompt(state, """You are an AI tutor who helps users clearly understand LeetCode or algorithm questions.
 
                 Your ONLY task is to **explain what the question is asking** — in simple, everyday language.
 
@@ -277,18 +345,14 @@ def build_graph(model: str = "claude-3-5-haiku-20241022", system_prompt: str | N
                 STRICT GUIDELINES:
                 - Do NOT provide any code or pseudocode.
                 - Keep explanations clear, concise, and beginner-friendly.
-            """)
-        ] + state["messages"]
-        reply = llm.invoke(messages)
+            """, "Question explanation", cache=cache_prompts)
+        return await cached_reply(state, "Question explanation", messages)
 
-        return {"messages": [AIMessage(content=reply.content)]}
-
-    def code_solution_node(state: State) -> dict:
+    async def code_solution_node(state: State) -> dict:
         # Implement the logic for coding the solution here.
         last_message = state["messages"][-1]
 
-        messages = [
-            SystemMessage(content="""You are an expert LeetCode problem solver and programming tutor.
+        messages = build_prompt(state, """You are an expert LeetCode problem solver and programming tutor.
 
                     Your goal is to fully solve the given LeetCode question by writing both brute-force and optimized solutions, and explaining them clearly.
 
@@ -334,18 +398,138 @@ def build_graph(model: str = "claude-3-5-haiku-20241022", system_prompt: str | N
                     - Always provide **both code versions** — never skip one.
                     - Explanations should be **educational and beginner-friendly**.
                     - Maintain clarity, accuracy, and completeness.
-            """)
-        ] + state["messages"]
-        reply = llm.invoke(messages)
+            """, "Code the solution as per user req/code correction", cache=cache_prompts)
+        reply = await llm.ainvoke(messages)
 
         return {"messages": [AIMessage(content=reply.content)]}
 
-    def asking_language_node(state: State) -> dict:
+    async def brute_force_draft_node(state: State) -> dict:
+        messages = build_prompt(state, """You are an expert LeetCode problem solver and programming tutor.
+
+                    You are writing the FIRST half of a full solution; another writer covers the optimized approach.
+                    Write ONLY the sections below, with exactly these headings:
+
+                    A. 🧩 Problem Understanding
+                    - Restate the problem in 1–2 simple sentences (no extra reasoning).
+                    - Clearly mention what is being asked for (output) and what is given (input).
+
+                    B1. 💻 Brute Force Approach (Baseline)
+                    - Write simple, direct, and readable code that solves the problem correctly but inefficiently.
+                    - Use small inline comments to explain logic flow.
+
+                    C1. 🧠 Brute Force Explanation
+                    - Explain the logic in plain language, block by block.
+                    - State its **Time Complexity** and **Space Complexity**.
+
+                    If no programming language is specified, **default to Python**.
+
+                    Rules:
+                    - Do NOT write the optimized solution or a summary table.
+                    - Explanations should be **educational and beginner-friendly**.
+            """, BRUTE_FORCE_DRAFT, cache=cache_prompts)
+        reply = await llm.ainvoke(messages)
+        return {"drafts": {BRUTE_FORCE_DRAFT: str(reply.content)}}
+
+    async def optimized_draft_node(state: State) -> dict:
+        messages = build_prompt(state, """You are an expert LeetCode problem solver and programming tutor.
+
+                    You are writing the SECOND half of a full solution; another writer covers the problem
+                    restatement and the brute-force approach. Write ONLY the sections below, with exactly these headings:
+
+                    B2. 💻 Optimized Approach (Efficient)
+                    - Write the solution using an improved algorithm or data structure.
+                    - Follow clean coding conventions and ensure correctness.
+                    - Include helpful inline comments for each major step.
+
+                    C2. 🧠 Optimized Explanation
+                    - Explain the logic in plain language, block by block.
+                    - Emphasize how it improves upon the natural brute-force approach (algorithmic idea, data structure, etc.).
+                    - State its **Time Complexity** and **Space Complexity**.
+
+                    D. 📈 Summary
+                    - End with a short summary table comparing brute-force vs optimized versions.
+
+                    If no programming language is specified, **default to Python**.
+
+                    Rules:
+                    - Do NOT restate the problem or write the brute-force code.
+                    - Explanations should be **educational and beginner-friendly**.
+            """, OPTIMIZED_DRAFT, cache=cache_prompts)
+        reply = await llm.ainvoke(messages)
+        return {"drafts": {OPTIMIZED_DRAFT: str(reply.content)}}
+
+    async def merge_code_drafts_node(state: State) -> dict:
+        drafts = state.get("drafts") or {}
+        reply = merge_code_drafts(drafts.get(BRUTE_FORCE_DRAFT, ""), drafts.get(OPTIMIZED_DRAFT, ""))
+        return {"messages": [AIMessage(content=reply)], "drafts": None}
+
+    async def repair(problem: Problem, failing: list[tuple[str, CheckResult]]) -> list[str]:
+        request = [problem.context_statement()]
+        for i, (code, result) in enumerate(failing, 1):
+            request.append(f"Failing solution {i}:\n```python\n{code.rstrip()}\n```\nFailure: {describe_failure(problem, result)}")
+        reply = await llm.ainvoke([SystemMessage(content=REPAIR_PROMPT), HumanMessage(content="\n\n".join(request))])
+        return [code for _, code in extract_python_blocks(str(reply.content))]
+
+    async def verify_code_node(state: State) -> dict:
+        reply = state["messages"][-1]
+        number = pinned_question_number(state["messages"])
+        problem = catalog.by_number(number) if number is not None else None
+        if problem is None or not problem.entry_point or not problem.examples:
+            return {"verification": None}
+        blocks = extract_python_blocks(str(reply.content))
+        if not blocks:
+            return {"verification": None}
+
+        def check(code: str):
+            return sandbox.check(code, problem.entry_point, problem.examples, problem.compare)
+
+        results = list(await asyncio.gather(*(check(code) for _, code in blocks)))
+        repaired = [False] * len(blocks)
+        failing = [i for i, result in enumerate(results) if not result.passed]
+        text, fixes = str(reply.content), []
+        if failing:
+            # One repair call for all failing blocks; whatever still fails is reported as is.
+            for i, code in zip(failing, await repair(problem, [(blocks[i][1], results[i]) for i in failing])):
+                result = await check(code)
+                if result.passed:
+                    text = text.replace(blocks[i][1], code, 1)
+                    results[i], repaired[i] = result, True
+                    fixes.append((blocks[i][0], code))
+                    blocks[i] = (blocks[i][0], code)
+
+        for result, fixed in zip(results, repaired):
+            CODE_CHECKS.inc(node=state.get("next") or "", result="repaired" if fixed else "passed" if result.passed else "failed")
+        summary = verification_summary(problem, [(label, result, fixed) for (label, _), result, fixed in zip(blocks, results, repaired)])
+        benchmarks = None
+        solutions = {label: code for (label, code), result in zip(blocks, results) if result.passed}
+        if benchmark_seconds > 0 and {"Brute force", "Optimized"} <= solutions.keys():
+            # Both run at once, on separate workers.
+            labels = ("Brute force", "Optimized")
+            measured = await asyncio.gather(*(
+                sandbox.benchmark(solutions[label], problem.entry_point, problem.examples, benchmark_seconds) for label in labels
+            ))
+            benchmarks = complexity_report(dict(zip(labels, measured)), text)
+            summary = f"{summary}\n\n{format_report(benchmarks)}"
+        corrections = "".join(f"\n\n**{label} (corrected):**\n```python\n{code.rstrip()}\n```" for label, code in fixes)
+        return {
+            "messages": [AIMessage(content=f"{text.rstrip()}\n\n{summary}", id=reply.id)],
+            "verification": {
+                "problem": problem.number,
+                "blocks": [
+                    {"label": label, "passed": result.passed, "repaired": fixed, "runtime_ms": round(result.runtime_ms, 3)}
+                    for (label, _), result, fixed in zip(blocks, results, repaired)
+                ],
+                "benchmarks": benchmarks,
+                # What a streaming client still needs after the streamed (unverified) reply.
+                "note": f"{corrections}\n\n{summary}",
+            },
+        }
+
+    async def asking_language_node(state: State) -> dict:
         # Implement the logic for asking user for programming language here.
         last_message = state["messages"][-1]
 
-        messages = [
-            SystemMessage(content="""
+        messages = build_prompt(state, """
                 You are an AI coding assistant specialized in LeetCode and algorithmic problem solving.
 
                 Your first task is to **confirm the programming language** that the user wants to use.
@@ -369,18 +553,16 @@ def build_graph(model: str = "claude-3-5-haiku-20241022", system_prompt: str | N
                 - Always confirm the language first — even if the user doesn’t mention it.
                 - If the user says “any language” or “default,” use **Python**.
                 - Keep tone polite and conversational (e.g., “Sure! Which programming language would you like me to use?”)
-            """)
-        ] + state["messages"]
-        reply = llm.invoke(messages)
+            """, "Asking user for programming language", cache=cache_prompts)
+        reply = await llm.ainvoke(messages)
 
         return {"messages": [AIMessage(content=reply.content)]}
 
-    def user_solution_correction_node(state: State) -> dict:
+    async def user_solution_correction_node(state: State) -> dict:
         # Implement the logic for user solution correction here.
         last_message = state["messages"][-1]
 
-        messages = [
-            SystemMessage(content="""
+        messages = build_prompt(state, """
                 You are a strict "user-logic correction" coach for LeetCode-style problems.
 
                 Your ONLY job:
@@ -421,17 +603,15 @@ def build_graph(model: str = "claude-3-5-haiku-20241022", system_prompt: str | N
                 - No pseudocode (no “loop”, “dp[i]”, “two pointers”, code-like steps).
                 - Don’t restate the entire problem unless it’s necessary to correct the user’s misunderstanding.
                 - Don’t add extra topics beyond correcting the user’s logic.
-            """)
-        ] + state["messages"]
-        reply = llm.invoke(messages)
+            """, "User solution correction", cache=cache_prompts)
+        reply = await llm.ainvoke(messages)
         return {"messages": [AIMessage(content=reply.content)]}
 
-    def user_code_correction_node(state: State) -> dict:
+    async def user_code_correction_node(state: State) -> dict:
         # Implement the logic for user solution correction here.
         last_message = state["messages"][-1]
 
-        messages = [
-            SystemMessage(content="""
+        messages = build_prompt(state, """
             You are an expert LeetCode code-review assistant.
 
             Your task:
@@ -465,9 +645,8 @@ def build_graph(model: str = "claude-3-5-haiku-20241022", system_prompt: str | N
             Important:
             - If the user's logic is correct and only syntax was wrong, then sections B/C/D should only mention syntax.
             - If syntax is correct but logic is wrong, still provide corrected code and explain the logic fix.
-            """)
-        ] + state["messages"]
-        reply = llm.invoke(messages)
+            """, "User code correction", cache=cache_prompts)
+        reply = await llm.ainvoke(messages)
 
         return {"messages": [AIMessage(content=reply.content)]}
 
@@ -475,24 +654,44 @@ def build_graph(model: str = "claude-3-5-haiku-20241022", system_prompt: str | N
 
     # --- Add your custom nodes/edges here ---
 
-    builder.add_node("planner", planner_node)
-    builder.add_node("router", router_node)
-    builder.add_node("LeetCode Question", leetcode_question_node)
-    builder.add_node("Question explanation", question_explanation_node)
-    builder.add_node("Solution explanation", solution_explanation_node)
-    builder.add_node("User explanation correction", user_explanation_correction_node)
-    builder.add_node("User solution correction", user_solution_correction_node)
-    builder.add_node("Code the solution as per user req/code correction", code_solution_node)
-    builder.add_node("Asking user for programming language", asking_language_node)
-    builder.add_node("User code correction", user_code_correction_node)
+    builder.add_node("planner", traced_node("planner", planner_node))
+    builder.add_node("router", traced_node("router", router_node))
+    builder.add_node("context", traced_node("context", context_node))
+    builder.add_node("LeetCode Question", traced_node("LeetCode Question", leetcode_question_node))
+    builder.add_node("Question explanation", traced_node("Question explanation", question_explanation_node))
+    builder.add_node("Solution explanation", traced_node("Solution explanation", solution_explanation_node))
+    builder.add_node("User explanation correction", traced_node("User explanation correction", user_explanation_correction_node))
+    builder.add_node("User solution correction", traced_node("User solution correction", user_solution_correction_node))
+    if parallel_code_drafts:
+        builder.add_node(BRUTE_FORCE_DRAFT, traced_node(BRUTE_FORCE_DRAFT, brute_force_draft_node))
+        builder.add_node(OPTIMIZED_DRAFT, traced_node(OPTIMIZED_DRAFT, optimized_draft_node))
+        builder.add_node(CODE_NODE, traced_node(CODE_NODE, merge_code_drafts_node))
+        # CODE_NODE runs once both branches are done.
+        builder.add_edge(list(CODE_DRAFT_NODES), CODE_NODE)
+    else:
+        builder.add_node(CODE_NODE, traced_node(CODE_NODE, code_solution_node))
+    builder.add_node("Asking user for programming language", traced_node("Asking user for programming language", asking_language_node))
+    builder.add_node("User code correction", traced_node("User code correction", user_code_correction_node))
+
+    if sandbox is not None:
+        builder.add_node(VERIFY_NODE, traced_node(VERIFY_NODE, verify_code_node))
+        builder.add_edge(VERIFY_NODE, END)
 
     builder.add_edge(START, "planner")
     builder.add_edge("planner", "router")
+    builder.add_edge("router", "context")
 
+    def respond(state: State):
+        if parallel_code_drafts and state.get("next") == CODE_NODE:
+            return list(CODE_DRAFT_NODES)
+        return state.get("next")
+
+    drafts_map = {node: node for node in CODE_DRAFT_NODES} if parallel_code_drafts else {}
     builder.add_conditional_edges(
-        "router",
-        lambda state: state.get("next"),
+        "context",
+        respond,
         {
+            **drafts_map,
             "LeetCode Question": "LeetCode Question",
             "Question explanation": "Question explanation",
             "Solution explanation": "Solution explanation",
@@ -516,12 +715,36 @@ def build_graph(model: str = "claude-3-5-haiku-20241022", system_prompt: str | N
         "Asking user for programming language",
         "User code correction",
     ]:
-        builder.add_edge(terminal_node, END)
+        builder.add_edge(terminal_node, VERIFY_NODE if sandbox is not None and terminal_node in VERIFIED_NODES else END)
     # ----------------------------------------
 
-    return builder.compile()
+    return builder.compile(checkpointer=checkpointer)
+
+
+# Chat-model clients are created on their first call, so importing this module
+# and building graphs never touches the provider SDK.
+default_registry = ModelRegistry(init_chat_model)
+# Off unless CODE_VERIFICATION=on; its workers start with the API's warm-up task.
+default_sandbox = SandboxPool.from_env()
+response_cache = ResponseCache.from_env()
+if response_cache is not None:
+    metrics.collector(
+        "leetcode_response_cache_lookups_total", "counter", "Response cache lookups by node and result.",
+        lambda: [({"node": node, "result": result}, count) for node, row in response_cache.stats().items() for result, count in row.items()],
+    )
+
+
+def get_graph(**config):
+    """The compiled `build_graph(**config)`, shared by every caller using the same config."""
+    config.setdefault("response_cache", response_cache)
+    config.setdefault("gateway", default_gateway)
+    config.setdefault("sandbox", default_sandbox)
+    config.setdefault("checkpointer", default_checkpointer)
+    return default_registry.graph(build_graph, **config)
 
 
-# Default graph used by the services. Tweak parameters above or
-# call build_graph(...) elsewhere to supply a different graph.
-graph = build_graph()
\ No newline at end of file
+def __getattr__(name: str):
+    # Default graph used by the services, built on first access.
+    if name == "graph":
+        return get_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
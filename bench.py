@@ -0,0 +1,270 @@
+"""
+Offline benchmarks for the LangGraph pipeline.
+
+Benchmarks that run the graph stub `init_chat_model` with a latency-injecting
+fake, so no network or API key is needed. Run from the repo root:
+
+    python bench.py concurrency --conversations 200 --latency 0.2
+    python bench.py conversion --messages 200
+    python bench.py overhead --turns 200
+    python bench.py startup
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+
+class LatencyResult:
+    def __init__(self, *, content: str | None = None, message_type: str | None = None):
+        self.content = content
+        self.message_type = message_type
+
+
+class LatencyLLM:
+    """Fake chat model that sleeps for `latency` seconds per call.
+
+    With `blocking=True` each call parks a thread of `executor` for the whole
+    latency, which is how the graph behaved while its nodes were sync `llm.invoke`
+    calls offloaded by `graph.ainvoke`. With `blocking=False` calls are plain
+    `asyncio.sleep`s, like the async `llm.ainvoke` nodes.
+    """
+
+    def __init__(
+        self,
+        latency: float,
+        *,
+        blocking: bool = False,
+        executor: ThreadPoolExecutor | None = None,
+        message_type: str = "Question explanation",
+    ):
+        self.latency = latency
+        self.blocking = blocking
+        self.executor = executor
+        self.message_type = message_type
+
+    def with_structured_output(self, _schema):
+        return self
+
+    def _result(self) -> LatencyResult:
+        return LatencyResult(content="Here is the explanation.", message_type=self.message_type)
+
+    def invoke(self, *_args, **_kwargs):
+        time.sleep(self.latency)
+        return self._result()
+
+    async def ainvoke(self, *args, **kwargs):
+        if self.blocking:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self.invoke, *args)
+        await asyncio.sleep(self.latency)
+        return self._result()
+
+
+def import_stubbed_ai(llm):
+    """Fresh import of ai.py whose model registry hands out `llm` for every model name."""
+    import langchain.chat_models
+
+    original = langchain.chat_models.init_chat_model
+    langchain.chat_models.init_chat_model = lambda *_args, **_kwargs: llm
+    try:
+        sys.modules.pop("ai", None)
+        return importlib.import_module("ai")
+    finally:
+        langchain.chat_models.init_chat_model = original
+
+
+def build_stub_graph(llm):
+    """Build the real graph from ai.py around `llm` instead of a remote model."""
+    return import_stubbed_ai(llm).build_graph(model="stubbed")
+
+
+async def _drive(graph, conversations: int) -> float:
+    async def one(i: int):
+        state = {"messages": [HumanMessage(content=f"Explain question {i}")], "message_type": None}
+        await graph.ainvoke(state)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(conversations)))
+    return time.perf_counter() - started
+
+
+def bench_concurrency(conversations: int, latency: float, threads: int) -> dict:
+    """Requests/sec for `conversations` concurrent turns, thread-bound vs async LLM calls."""
+    results = {}
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        modes = {
+            "sync_nodes_in_executor": LatencyLLM(latency, blocking=True, executor=executor),
+            "async_nodes": LatencyLLM(latency),
+        }
+        for name, llm in modes.items():
+            graph = build_stub_graph(llm)
+            elapsed = asyncio.run(_drive(graph, conversations))
+            results[name] = {"seconds": round(elapsed, 3), "requests_per_sec": round(conversations / elapsed, 1)}
+    return results
+
+
+def bench_conversion(messages: int, turns: int) -> dict:
+    """Per-turn cost of session <-> graph state conversion for a `messages`-long session.
+
+    `full_rebuild` converts the whole history both ways every turn (the old adapter);
+    `cached` uses state_adapter's per-session cache, converting only the new turn.
+    """
+    from models import SessionData, StoredMessage
+    from state_adapter import lc_to_stored, session_to_state, state_to_session, stored_to_lc
+
+    def make_session() -> SessionData:
+        history = [
+            StoredMessage(role="user" if i % 2 == 0 else "assistant", content=f"message {i} " * 40)
+            for i in range(messages)
+        ]
+        return SessionData(username="bench", auth_token="token", messages=history)
+
+    def full_rebuild(sd: SessionData) -> None:
+        state = {"messages": [stored_to_lc(m) for m in sd.messages]}
+        state["messages"] += [HumanMessage(content="next", id=uuid4().hex), AIMessage(content="reply", id=uuid4().hex)]
+        sd.messages = [lc_to_stored(m) for m in state["messages"]]
+
+    def cached(sd: SessionData, session_id) -> None:
+        state = session_to_state(sd, session_id)
+        state["messages"] = state["messages"] + [HumanMessage(content="next", id=uuid4().hex), AIMessage(content="reply", id=uuid4().hex)]
+        state_to_session(sd, state, session_id)
+
+    results = {}
+    sd = make_session()
+    started = time.perf_counter()
+    for _ in range(turns):
+        full_rebuild(sd)
+    results["full_rebuild"] = (time.perf_counter() - started) / turns
+
+    sd, session_id = make_session(), uuid4()
+    session_to_state(sd, session_id)  # first request of the process fills the cache
+    started = time.perf_counter()
+    for _ in range(turns):
+        cached(sd, session_id)
+    results["cached"] = (time.perf_counter() - started) / turns
+
+    return {name: {"ms_per_turn": round(seconds * 1000, 3)} for name, seconds in results.items()}
+
+
+def bench_overhead(turns: int) -> dict:
+    """Per-turn cost of the graph machinery itself, with a zero-latency model.
+
+    `structured_output_*` compares deriving the planner's structured-output runnable
+    from a real provider client on every call (the old planner) with the registry's
+    cached one; `graph_build_*` compares compiling a graph with a registry hit;
+    `turn` is a whole planner + reply turn through the cached graph.
+    """
+    import os
+
+    from models import MessageClassifier
+    from registry import ModelRegistry
+
+    def per_call(fn, n: int) -> float:
+        started = time.perf_counter()
+        for _ in range(n):
+            fn()
+        return (time.perf_counter() - started) / n
+
+    results = {}
+    try:
+        from langchain.chat_models import init_chat_model
+
+        os.environ.setdefault("ANTHROPIC_API_KEY", "offline-benchmark")
+        client = init_chat_model("claude-3-5-haiku-20241022")
+        results["structured_output_uncached"] = per_call(lambda: client.with_structured_output(MessageClassifier), turns)
+        lazy = ModelRegistry(lambda _name: client).client("claude-3-5-haiku-20241022")
+        results["structured_output_cached"] = per_call(lambda: lazy.with_structured_output(MessageClassifier).runnable, turns)
+    except ImportError:
+        pass  # provider SDK not installed: skip the provider-side numbers
+
+    ai = import_stubbed_ai(LatencyLLM(0))
+    builds = max(1, turns // 10)
+    results["graph_build_uncached"] = per_call(lambda: ai.build_graph(model="stubbed"), builds)
+    results["graph_build_cached"] = per_call(lambda: ai.default_registry.graph(ai.build_graph, model="stubbed"), turns)
+
+    graph = ai.default_registry.graph(ai.build_graph, model="stubbed", fast_path_threshold=None)
+    state = {"messages": [HumanMessage(content="Explain the question")], "message_type": None}
+
+    async def run_turns() -> float:
+        started = time.perf_counter()
+        for _ in range(turns):
+            await graph.ainvoke(state)
+        return (time.perf_counter() - started) / turns
+
+    results["turn"] = asyncio.run(run_turns())
+    return {name: {"ms_per_call": round(seconds * 1000, 4)} for name, seconds in results.items()}
+
+
+def import_profile(module: str) -> dict:
+    """`python -X importtime -c "import <module>"` in a fresh interpreter.
+
+    Returns the module's cumulative import time and the self time spent in each
+    top-level package it pulled in.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True, cwd=Path(__file__).resolve().parent,
+    )
+    packages: Counter[str] = Counter()
+    total_us = 0
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        packages[name.split(".")[0]] += int(self_us) / 1e6
+        if name == module:
+            total_us = int(cumulative_us)
+    return {"total_seconds": total_us / 1e6, "packages": dict(packages.most_common())}
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+
+    concurrency = sub.add_parser("concurrency", help="graph throughput with sync vs async nodes")
+    concurrency.add_argument("--conversations", type=int, default=200)
+    concurrency.add_argument("--latency", type=float, default=0.2, help="seconds per LLM call")
+    concurrency.add_argument("--threads", type=int, default=32, help="executor threads for the sync baseline")
+
+    conversion = sub.add_parser("conversion", help="per-turn session <-> state conversion cost")
+    conversion.add_argument("--messages", type=int, default=200)
+    conversion.add_argument("--turns", type=int, default=50)
+
+    overhead = sub.add_parser("overhead", help="per-turn graph overhead excluding network time")
+    overhead.add_argument("--turns", type=int, default=200)
+
+    startup = sub.add_parser("startup", help="import-time breakdown of the API module")
+    startup.add_argument("--module", default="main")
+    startup.add_argument("--top", type=int, default=15)
+
+    args = parser.parse_args(argv)
+    if args.benchmark == "concurrency":
+        for name, row in bench_concurrency(args.conversations, args.latency, args.threads).items():
+            print(f"{name:<26} {row['requests_per_sec']:>8} req/s  ({row['seconds']}s)")
+    elif args.benchmark == "conversion":
+        for name, row in bench_conversion(args.messages, args.turns).items():
+            print(f"{name:<26} {row['ms_per_turn']:>8} ms/turn")
+    elif args.benchmark == "overhead":
+        for name, row in bench_overhead(args.turns).items():
+            print(f"{name:<26} {row['ms_per_call']:>8} ms")
+    elif args.benchmark == "startup":
+        profile = import_profile(args.module)
+        print(f"import {args.module:<19} {profile['total_seconds'] * 1000:>8.1f} ms")
+        for package, seconds in list(profile["packages"].items())[:args.top]:
+            print(f"  {package:<24} {seconds * 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Local LeetCode problem catalog.
+
+Problems ship in `data/problems.tsv`, one per line:
+
+    <number>\t<slug>\t<title>\t<problem json>
+
+The file is memory-mapped and indexed (number, slug and normalised title ->
+byte offset) on first lookup, so importing the app costs nothing and only the
+problems actually requested are JSON-decoded.
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+
+DEFAULT_CATALOG_PATH = Path(__file__).resolve().parent / "data" / "problems.tsv"
+
+
+@dataclass(frozen=True)
+class Problem:
+    number: int
+    slug: str
+    title: str
+    difficulty: str
+    statement: str
+    constraints: list[str] = field(default_factory=list)
+    tags: list[str] = field(default_factory=list)
+    # Method name on the LeetCode `Solution` class and structured example cases.
+    entry_point: str | None = None
+    examples: list[dict] = field(default_factory=list)
+    # "exact", or "unordered" when any ordering of a list answer is accepted.
+    compare: str = "exact"
+
+    def context_statement(self) -> str:
+        """Full problem text to pin into the conversation."""
+        lines = [f"LeetCode Question #{self.number}: {self.title} ({self.difficulty})", "", self.statement]
+        if self.examples:
+            lines += ["", "Examples:"]
+            for example in self.examples:
+                args = ", ".join(f"{name} = {json.dumps(value)}" for name, value in example["input"].items())
+                lines.append(f"- Input: {args} -> Output: {json.dumps(example['output'])}")
+        if self.constraints:
+            lines += ["", "Constraints:"] + [f"- {c}" for c in self.constraints]
+        if self.tags:
+            lines += ["", f"Topics: {', '.join(self.tags)}"]
+        return "\n".join(lines)
+
+
+def normalize_title(title: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", title.lower()).strip("-")
+
+
+class Catalog:
+    def __init__(self, path: str | Path = DEFAULT_CATALOG_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._map: mmap.mmap | None = None
+        self._by_number: dict[int, int] = {}
+        self._by_title: dict[str, int] = {}
+        self._loaded = False
+
+    def _ensure_index(self) -> None:
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            if not self.path.exists() or self.path.stat().st_size == 0:
+                return
+            with open(self.path, "rb") as handle:
+                self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+            offset = 0
+            size = len(self._map)
+            while offset < size:
+                end = self._map.find(b"\n", offset)
+                end = size if end == -1 else end
+                number, slug, title, _ = self._map[offset:end].split(b"\t", 3)
+                self._by_number[int(number)] = offset
+                self._by_title[slug.decode()] = offset
+                self._by_title[normalize_title(title.decode())] = offset
+                offset = end + 1
+
+    def _load(self, offset: int) -> Problem:
+        end = self._map.find(b"\n", offset)
+        line = self._map[offset:] if end == -1 else self._map[offset:end]
+        return Problem(**json.loads(line.split(b"\t", 3)[3]))
+
+    def by_number(self, number: int) -> Problem | None:
+        self._ensure_index()
+        offset = self._by_number.get(number)
+        return self._load(offset) if offset is not None else None
+
+    def by_title(self, title: str) -> Problem | None:
+        self._ensure_index()
+        offset = self._by_title.get(normalize_title(title))
+        return self._load(offset) if offset is not None else None
+
+    def lookup(self, number: int | None, title: str | None = None) -> Problem | None:
+        """Find a problem by number, falling back to its title or slug."""
+        problem = self.by_number(number) if number is not None else None
+        if problem is None and title:
+            problem = self.by_title(title)
+        return problem
+
+    def __len__(self) -> int:
+        self._ensure_index()
+        return len(self._by_number)
+
+
+catalog = Catalog(os.getenv("LEETCODE_CATALOG_PATH", DEFAULT_CATALOG_PATH))
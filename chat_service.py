@@ -1,37 +1,253 @@
 from __future__ import annotations
 
-from uuid import UUID
+from typing import Any, AsyncIterator
+from uuid import UUID, uuid4
 
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import AIMessageChunk, HumanMessage
 
-from ai import graph
-from models import SessionData
-from state_adapter import session_to_state, state_to_session
+from ai import CODE_DRAFT_NODES, CODE_NODE, VERIFY_NODE, graph
+from checkpoint_store import has_thread
+from models import SessionData, StoredMessage
+from state_adapter import append_turn, session_to_state, state_to_session, stored_to_lc
 from state import State
+from telemetry import record_llm_calls, span
+from usage import UsageRecorder
 
-async def run_graph(state: State) -> State:
+def _config(usage: UsageRecorder | None, session_id: UUID | None = None) -> dict:
+    config: dict = {"callbacks": [usage]} if usage is not None else {}
+    if session_id is not None:
+        # Lets the LLM gateway queue calls fairly per user.
+        config["metadata"] = {"user_id": str(session_id)}
+        # Checkpoints (if the graph has a checkpointer) are kept per session.
+        config["configurable"] = {"thread_id": str(session_id)}
+    return config
+
+
+# Channels that only live for one turn. A checkpointed thread would carry them
+# over from the previous turn, so every turn's input clears them.
+_TURN_RESET = {"next": None, "drafts": None, "verification": None}
+
+
+async def turn_input(session_id: UUID, session_data: SessionData, message: HumanMessage) -> State:
+    """Graph input for the turn that adds `message` to the session.
+
+    On a checkpointed graph the thread already holds the conversation, so the
+    input is just `message` (after any messages logged without running the graph,
+    like catalog answers) and `add_messages` appends it to the persisted state.
+    Otherwise, or if the thread is gone (expired, new store), the whole log is
+    converted; on an existing thread that is harmless, since `add_messages`
+    replaces messages with the same id.
+    """
+    upto = session_data.checkpointed_upto
+    if graph.checkpointer is not None and upto is not None and upto <= len(session_data.messages) \
+            and await has_thread(graph.checkpointer, str(session_id)):
+        logged = [stored_to_lc(m) for m in session_data.messages[upto:]]
+        return {"messages": logged + [message], "message_type": session_data.message_type, **_TURN_RESET}
+
+    with span("session_to_state"):
+        state = session_to_state(session_data, session_id)
+    return {**state, "messages": state["messages"] + [message], **_TURN_RESET}
+
+
+def fold_turn(session_id: UUID, session_data: SessionData, state: State, message: HumanMessage) -> SessionData:
+    """Append the turn that started with `message` to the session's log."""
+    with span("state_to_session"):
+        if graph.checkpointer is not None:
+            return append_turn(session_data, state, message.id)
+        return state_to_session(session_data, state, session_id)
+
+
+async def run_graph(state: State, usage: UsageRecorder | None = None, session_id: UUID | None = None) -> State:
     """Run the compiled LangGraph and return the new conversation state."""
-    return await graph.ainvoke(state)
+    return await graph.ainvoke(state, config=_config(usage, session_id))
+
+
+def last_assistant_reply(session_data: SessionData) -> str:
+    for msg in reversed(session_data.messages):
+        if msg.role == "assistant":
+            return msg.content
+    return ""
+
+
+# Nodes whose LLM output is internal plumbing and must never reach the user as tokens.
+# The verifier's repair call is one of them: only its note is sent (see stream_graph).
+SILENT_NODES = {"planner", "router", "context", VERIFY_NODE}
+
+
+class _DraftStream:
+    """Streams parallel code drafts one section at a time.
+
+    The first draft to produce a token goes out live; tokens of the others are
+    buffered and flushed, in order, as soon as the live one finishes.
+    """
+
+    def __init__(self) -> None:
+        self.live: str | None = None
+        self.buffers: dict[str, list[str]] = {}
+        self.finished_nodes: set[str] = set()
+        self.sections = 0
+
+    def _open(self, node: str) -> list[str]:
+        self.live = node
+        self.sections += 1
+        return ["\n\n"] if self.sections > 1 else []
 
+    def token(self, node: str, text: str) -> list[str]:
+        if self.live is None:
+            return self._open(node) + [text]
+        if node == self.live:
+            return [text]
+        self.buffers.setdefault(node, []).append(text)
+        return []
 
-async def apply_user_message_and_get_reply(session_id: UUID, session_data: SessionData, user_text: str,) -> tuple[SessionData, str]:
-    # session -> graph state
-    state = session_to_state(session_data)
+    def finish(self, node: str, text: str) -> list[str]:
+        """`text` is the whole draft, used if the model did not stream it."""
+        self.finished_nodes.add(node)
+        if node != self.live and node not in self.buffers:
+            self.buffers[node] = [text]
+        if self.live not in (None, node):
+            return []
+        self.live = None
+        out: list[str] = []
+        while self.buffers:
+            other = next(iter(self.buffers))
+            out += self._open(other) + self.buffers.pop(other)
+            if other not in self.finished_nodes:
+                break
+            self.live = None
+        return out
 
-    # add user message into annotated state
-    state["messages"] = state["messages"] + [HumanMessage(content=user_text)]
+
+async def stream_graph(state: State | None, usage: UsageRecorder | None = None, session_id: UUID | None = None) -> AsyncIterator[tuple[str, Any]]:
+    """Run the graph and yield ("message_type" | "token" | "state", payload) events.
+
+    Tokens are piped from the responding node as the model produces them. Models that
+    do not stream (e.g. test stubs) still yield their full reply as a single token.
+    Parallel code drafts are streamed one after the other, whichever starts first.
+    A None `state` resumes the session's checkpointed thread where it stopped.
+    """
+    final_state: State | None = state
+    streamed_nodes: set[str] = set()
+    drafts = _DraftStream()
+
+    async for mode, chunk in graph.astream(state, config=_config(usage, session_id), stream_mode=["updates", "messages", "values"]):
+        if mode == "messages":
+            message, metadata = chunk
+            node = metadata.get("langgraph_node")
+            if node in SILENT_NODES or not isinstance(message, AIMessageChunk):
+                continue
+            if not message.content:
+                continue
+            if node in CODE_DRAFT_NODES:
+                for text in drafts.token(node, message.text):
+                    yield "token", text
+            else:
+                streamed_nodes.add(node)
+                yield "token", message.text
+        elif mode == "updates":
+            for node, update in chunk.items():
+                if not update:
+                    continue
+                if node == "planner" and update.get("message_type"):
+                    yield "message_type", update["message_type"]
+                elif node in CODE_DRAFT_NODES:
+                    for text in drafts.finish(node, (update.get("drafts") or {}).get(node, "")):
+                        yield "token", text
+                elif node == CODE_NODE and drafts.sections:
+                    continue  # the merged reply; its sections were already streamed
+                elif node == VERIFY_NODE:
+                    # The reply itself was streamed; send the corrections and results.
+                    note = (update.get("verification") or {}).get("note")
+                    if note:
+                        yield "token", note
+                elif node not in SILENT_NODES and node not in streamed_nodes:
+                    for message in update.get("messages", []):
+                        if message.content:
+                            yield "token", str(message.content)
+        else:
+            final_state = chunk
+
+    yield "state", final_state
+
+
+async def apply_user_message_and_get_reply(session_id: UUID, session_data: SessionData, user_text: str, usage: UsageRecorder | None = None,) -> tuple[SessionData, str]:
+    usage = usage if usage is not None else UsageRecorder()
+
+    # the new user message (plus whatever the graph has not seen yet)
+    message = HumanMessage(content=user_text, id=uuid4().hex)
+    state = await turn_input(session_id, session_data, message)
 
     # run graph
-    new_state = await run_graph(state)
+    with span("graph"):
+        new_state = await run_graph(state, usage, session_id)
+    record_llm_calls(usage.calls)
 
     # graph state -> session
-    session_data = state_to_session(session_data, new_state)
+    session_data = fold_turn(session_id, session_data, new_state, message)
 
     # get most recent assistant reply (best effort)
-    last_reply = ""
-    for msg in reversed(session_data.messages):
-        if msg.role == "assistant":
-            last_reply = msg.content
-            break
+    return session_data, last_assistant_reply(session_data)
+
+
+async def stream_user_message_reply(session_id: UUID, session_data: SessionData, user_text: str, usage: UsageRecorder | None = None,) -> AsyncIterator[tuple[str, Any]]:
+    """Streaming twin of `apply_user_message_and_get_reply`.
+
+    Yields ("message_type", str) and ("token", str) events while the graph runs and
+    finishes with ("done", (session_data, reply)) once the new state is folded back.
+    """
+    usage = usage if usage is not None else UsageRecorder()
+    message = HumanMessage(content=user_text, id=uuid4().hex)
+    state = await turn_input(session_id, session_data, message)
+
+    new_state = state
+    with span("graph"):
+        async for event, payload in stream_graph(state, usage, session_id):
+            if event == "state":
+                new_state = payload
+            else:
+                yield event, payload
+    record_llm_calls(usage.calls)
+
+    session_data = fold_turn(session_id, session_data, new_state, message)
+    yield "done", (session_data, last_assistant_reply(session_data))
+
+
+async def stream_resumed_reply(session_id: UUID, session_data: SessionData, usage: UsageRecorder | None = None) -> AsyncIterator[tuple[str, Any]]:
+    """Finish a turn whose stream was cut off (client gone, worker restarted).
+
+    The checkpointed thread keeps the steps that completed; the rest run now,
+    with the same events as `stream_user_message_reply` (a step that was cut
+    off runs again from its start). Ends with ("done", None) when the session
+    has no unfinished turn.
+    """
+    usage = usage if usage is not None else UsageRecorder()
+    if graph.checkpointer is None or not await has_thread(graph.checkpointer, str(session_id)):
+        yield "done", None
+        return
+    snapshot = await graph.aget_state(_config(None, session_id))
+    if not snapshot.tasks:  # includes steps that finished but whose checkpoint was not written
+        yield "done", None
+        return
+    message = next(m for m in reversed(snapshot.values["messages"]) if isinstance(m, HumanMessage))
+
+    new_state = snapshot.values
+    with span("graph"):
+        async for event, payload in stream_graph(None, usage, session_id):
+            if event == "state":
+                new_state = payload
+            else:
+                yield event, payload
+    record_llm_calls(usage.calls)
+
+    session_data = fold_turn(session_id, session_data, new_state, message)
+    yield "done", (session_data, last_assistant_reply(session_data))
+
 
-    return session_data, last_reply
+def record_turn(session_data: SessionData, user_text: str, reply: str, message_type: str) -> tuple[SessionData, str]:
+    """Append a turn answered without running the graph (e.g. from the local catalog)."""
+    session_data.messages.extend([
+        StoredMessage(role="user", content=user_text),
+        StoredMessage(role="assistant", content=reply),
+    ])
+    session_data.message_type = message_type
+    return session_data, reply
@@ -0,0 +1,508 @@
+"""
+LangGraph checkpoint savers on the shared stores.
+
+Compiling the graph with a checkpointer persists its state after every step,
+keyed by `thread_id` (the session id), so any worker or instance sharing the
+store can pick a conversation up:
+
+- `SQLiteSaver`: SQLite in WAL mode; shared by the workers on one machine.
+- `RedisSaver`: the Redis protocol via `session_store.RedisClient`, shared
+  across instances. Async only, like the rest of the app.
+
+Each checkpoint is stored whole (channel values included) with its metadata and
+the pending writes of the step in progress. Only the latest `keep` checkpoints
+of a thread are kept: the app resumes from the latest one and never time-travels,
+so older ones would only grow the store with every turn. Threads expire with
+their session (`ttl_seconds`).
+
+`default_checkpointer` is the app's saver, built from the environment by
+`make_checkpointer`; importing it does not load the LLM stack.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import sqlite3
+import struct
+import threading
+import time
+from collections.abc import AsyncIterator, Iterator, Sequence
+from typing import Any, Callable, TypeVar
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+from session_store import DEFAULT_TTL_SECONDS, RedisClient
+
+T = TypeVar("T")
+DEFAULT_KEEP = 3
+
+
+def _config(thread_id: str, checkpoint_ns: str, checkpoint_id: str | None) -> RunnableConfig | None:
+    if checkpoint_id is None:
+        return None
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}}
+
+
+def _matches(metadata: CheckpointMetadata, filter: dict[str, Any] | None) -> bool:
+    return not filter or all(metadata.get(key) == value for key, value in filter.items())
+
+
+class _VersionedSaver(BaseCheckpointSaver[str]):
+    def get_next_version(self, current: str | None, channel: None) -> str:
+        # Same scheme as InMemorySaver: a sortable counter plus a random tie-breaker.
+        number = 0 if current is None else current if isinstance(current, int) else int(current.split(".")[0])
+        return f"{number + 1:032}.{random.random():016}"
+
+    async def ahas_thread(self, thread_id: str) -> bool:
+        return await self.aget_tuple({"configurable": {"thread_id": thread_id}}) is not None
+
+    async def sweep(self) -> int:
+        """Purge expired threads and return how many checkpoints were removed."""
+        return 0
+
+    async def close(self) -> None:
+        pass
+
+
+class SQLiteSaver(_VersionedSaver):
+    def __init__(self, path: str, ttl_seconds: float | None = DEFAULT_TTL_SECONDS, keep: int | None = DEFAULT_KEEP):
+        super().__init__()
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened lazily so importing the graph never touches the disk.
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints ("
+                " thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,"
+                " parent_id TEXT, type TEXT NOT NULL, checkpoint BLOB NOT NULL,"
+                " metadata_type TEXT NOT NULL, metadata BLOB NOT NULL, created_at REAL NOT NULL,"
+                " PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS checkpoints_created_at ON checkpoints(created_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoint_writes ("
+                " thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,"
+                " task_id TEXT NOT NULL, idx INTEGER NOT NULL, channel TEXT NOT NULL,"
+                " type TEXT NOT NULL, value BLOB NOT NULL, task_path TEXT NOT NULL,"
+                " PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx))"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _locked(self, work: Callable[[sqlite3.Connection], T], write: bool = True) -> T:
+        # As in `session_store.SQLiteBackend`: reads are deferred WAL snapshots that
+        # never queue behind another worker's writes.
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                result = work(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return result
+
+    def _tuple(self, conn: sqlite3.Connection, row: tuple) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, kind, checkpoint, metadata_kind, metadata = row
+        writes = conn.execute(
+            "SELECT task_id, channel, type, value FROM checkpoint_writes"
+            " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY rowid",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        )
+        return CheckpointTuple(
+            config=_config(thread_id, checkpoint_ns, checkpoint_id),
+            checkpoint=self.serde.loads_typed((kind, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_kind, metadata)),
+            parent_config=_config(thread_id, checkpoint_ns, parent_id),
+            pending_writes=[(task_id, channel, self.serde.loads_typed((value_kind, value))) for task_id, channel, value_kind, value in writes],
+        )
+
+    _COLUMNS = "thread_id, checkpoint_ns, checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata"
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+
+        def work(conn: sqlite3.Connection) -> CheckpointTuple | None:
+            if checkpoint_id:
+                row = conn.execute(
+                    f"SELECT {self._COLUMNS} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = conn.execute(
+                    f"SELECT {self._COLUMNS} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+                    " ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            return self._tuple(conn, row) if row else None
+
+        return self._locked(work, write=False)
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        clauses, params = [], []
+        if config is not None:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before is not None and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        def work(conn: sqlite3.Connection) -> list[CheckpointTuple]:
+            found = []
+            for row in conn.execute(f"SELECT {self._COLUMNS} FROM checkpoints{where} ORDER BY checkpoint_id DESC", params):
+                if limit is not None and len(found) >= limit:
+                    break
+                item = self._tuple(conn, row)
+                if _matches(item.metadata, filter):
+                    found.append(item)
+            return found
+
+        yield from self._locked(work, write=False)
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        kind, data = self.serde.dumps_typed(checkpoint)
+        metadata_kind, metadata_data = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+
+        def work(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                 kind, data, metadata_kind, metadata_data, time.time()),
+            )
+            if self.keep:
+                oldest = conn.execute(
+                    "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+                    " ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+                    (thread_id, checkpoint_ns, self.keep - 1),
+                ).fetchone()
+                if oldest:
+                    for table in ("checkpoints", "checkpoint_writes"):
+                        conn.execute(
+                            f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                            (thread_id, checkpoint_ns, oldest[0]),
+                        )
+
+        self._locked(work)
+        return _config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for i, (channel, value) in enumerate(writes):
+            kind, data = self.serde.dumps_typed(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, i), channel, kind, data, task_path))
+
+        def work(conn: sqlite3.Connection) -> None:
+            # Regular writes are kept as first recorded; special ones (errors, interrupts) are replaced.
+            for row in rows:
+                verb = "INSERT OR REPLACE" if row[4] < 0 else "INSERT OR IGNORE"
+                conn.execute(f"{verb} INTO checkpoint_writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+
+        self._locked(work)
+
+    def delete_thread(self, thread_id: str) -> None:
+        def work(conn: sqlite3.Connection) -> None:
+            for table in ("checkpoints", "checkpoint_writes"):
+                conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
+        self._locked(work)
+
+    def has_thread(self, thread_id: str) -> bool:
+        return self._locked(
+            lambda conn: conn.execute("SELECT 1 FROM checkpoints WHERE thread_id = ? LIMIT 1", (thread_id,)).fetchone() is not None,
+            write=False,
+        )
+
+    async def ahas_thread(self, thread_id: str) -> bool:
+        return await asyncio.to_thread(self.has_thread, thread_id)
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        for item in await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit))):
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    async def sweep(self) -> int:
+        if not self.ttl_seconds:
+            return 0
+
+        def work(conn: sqlite3.Connection) -> int:
+            # A thread's latest checkpoint is as old as its last turn.
+            expired = conn.execute(
+                "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(created_at) <= ?",
+                (time.time() - self.ttl_seconds,),
+            ).fetchall()
+            removed = 0
+            for (thread_id,) in expired:
+                removed += conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,)).rowcount
+                conn.execute("DELETE FROM checkpoint_writes WHERE thread_id = ?", (thread_id,))
+            return removed
+
+        return await asyncio.to_thread(self._locked, work)
+
+    async def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _pack(*parts: bytes | str | None) -> bytes:
+    out = []
+    for part in parts:
+        if part is None:
+            out.append(struct.pack(">I", 0xFFFFFFFF))
+        else:
+            data = part.encode() if isinstance(part, str) else part
+            out.append(struct.pack(">I", len(data)) + data)
+    return b"".join(out)
+
+
+def _unpack(raw: bytes) -> list[bytes | None]:
+    parts, offset = [], 0
+    while offset < len(raw):
+        (length,) = struct.unpack_from(">I", raw, offset)
+        offset += 4
+        if length == 0xFFFFFFFF:
+            parts.append(None)
+        else:
+            parts.append(raw[offset:offset + length])
+            offset += length
+    return parts
+
+
+class RedisSaver(_VersionedSaver):
+    """Checkpoints of a thread/namespace as a sorted set of ids (equal scores, so
+    ordered by the time-sortable id) plus a hash of records; pending writes in a
+    hash per checkpoint. Expiry is delegated to Redis."""
+
+    def __init__(self, url: str, ttl_seconds: float | None = DEFAULT_TTL_SECONDS, keep: int | None = DEFAULT_KEEP,
+                 prefix: str = "checkpoint:"):
+        super().__init__()
+        self.client = RedisClient(url)
+        self.ttl_seconds = ttl_seconds
+        self.keep = keep
+        self.prefix = prefix
+
+    def _ids_key(self, thread_id: str, checkpoint_ns: str) -> str:
+        return f"{self.prefix}{thread_id}:{checkpoint_ns}"
+
+    def _data_key(self, thread_id: str, checkpoint_ns: str) -> str:
+        return f"{self.prefix}{thread_id}:{checkpoint_ns}:data"
+
+    def _writes_key(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> str:
+        return f"{self.prefix}{thread_id}:{checkpoint_ns}:writes:{checkpoint_id}"
+
+    def _namespaces_key(self, thread_id: str) -> str:
+        return f"{self.prefix}{thread_id}:namespaces"
+
+    def _expire(self, *keys: str) -> list[tuple]:
+        return [("EXPIRE", key, int(self.ttl_seconds)) for key in keys] if self.ttl_seconds else []
+
+    async def _load(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> CheckpointTuple | None:
+        record, writes = await self.client.pipeline(
+            ("HGET", self._data_key(thread_id, checkpoint_ns), checkpoint_id),
+            ("HGETALL", self._writes_key(thread_id, checkpoint_ns, checkpoint_id)),
+        )
+        if record is None:
+            return None
+        parent_id, kind, checkpoint, metadata_kind, metadata = _unpack(record)
+        pending = [(field.decode().split("\x1f"), _unpack(value)) for field, value in zip(writes[::2], writes[1::2])]
+        return CheckpointTuple(
+            config=_config(thread_id, checkpoint_ns, checkpoint_id),
+            checkpoint=self.serde.loads_typed((kind.decode(), checkpoint)),
+            metadata=self.serde.loads_typed((metadata_kind.decode(), metadata)),
+            parent_config=_config(thread_id, checkpoint_ns, parent_id.decode() if parent_id is not None else None),
+            pending_writes=[
+                (task_id, channel.decode(), self.serde.loads_typed((value_kind.decode(), value)))
+                for (task_id, _idx), (channel, value_kind, value, _path) in pending
+            ],
+        )
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        if not checkpoint_id:
+            latest = await self.client.execute("ZREVRANGE", self._ids_key(thread_id, checkpoint_ns), 0, 0)
+            if not latest:
+                return None
+            checkpoint_id = latest[0].decode()
+        return await self._load(thread_id, checkpoint_ns, checkpoint_id)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        if config is None:
+            raise ValueError("RedisSaver can only list the checkpoints of one thread")
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        if checkpoint_id := get_checkpoint_id(config):
+            ids = [checkpoint_id]
+        else:
+            before_id = get_checkpoint_id(before) if before else None
+            upper = f"({before_id}" if before_id else "+"
+            ids = [i.decode() for i in await self.client.execute("ZREVRANGEBYLEX", self._ids_key(thread_id, checkpoint_ns), upper, "-")]
+        found = 0
+        for checkpoint_id in ids:
+            if limit is not None and found >= limit:
+                return
+            item = await self._load(thread_id, checkpoint_ns, checkpoint_id)
+            if item is not None and _matches(item.metadata, filter):
+                found += 1
+                yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        ids_key, data_key = self._ids_key(thread_id, checkpoint_ns), self._data_key(thread_id, checkpoint_ns)
+        kind, data = self.serde.dumps_typed(checkpoint)
+        metadata_kind, metadata_data = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        record = _pack(config["configurable"].get("checkpoint_id"), kind, data, metadata_kind, metadata_data)
+        replies = await self.client.pipeline(
+            ("ZADD", ids_key, 0, checkpoint["id"]),
+            ("HSET", data_key, checkpoint["id"], record),
+            ("SADD", self._namespaces_key(thread_id), checkpoint_ns),
+            *self._expire(ids_key, data_key, self._namespaces_key(thread_id)),
+            *([("ZREVRANGE", ids_key, self.keep, -1)] if self.keep else []),
+        )
+        stale = [i.decode() for i in replies[-1]] if self.keep else []
+        if stale:
+            await self.client.pipeline(
+                ("ZREM", ids_key, *stale),
+                ("HDEL", data_key, *stale),
+                ("DEL", *(self._writes_key(thread_id, checkpoint_ns, i) for i in stale)),
+            )
+        return _config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        key = self._writes_key(thread_id, checkpoint_ns, config["configurable"]["checkpoint_id"])
+        commands = []
+        for i, (channel, value) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, i)
+            kind, data = self.serde.dumps_typed(value)
+            # Regular writes are kept as first recorded; special ones (errors, interrupts) are replaced.
+            commands.append(("HSET" if idx < 0 else "HSETNX", key, f"{task_id}\x1f{idx:04d}", _pack(channel, kind, data, task_path)))
+        if commands:
+            await self.client.pipeline(*commands, *self._expire(key))
+
+    async def ahas_thread(self, thread_id: str) -> bool:
+        return bool(await self.client.execute("EXISTS", self._ids_key(thread_id, "")))
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        namespaces = await self.client.execute("SMEMBERS", self._namespaces_key(thread_id))
+        keys = [self._namespaces_key(thread_id)]
+        for checkpoint_ns in (ns.decode() for ns in namespaces or []):
+            ids = await self.client.execute("ZRANGE", self._ids_key(thread_id, checkpoint_ns), 0, -1)
+            keys += [self._ids_key(thread_id, checkpoint_ns), self._data_key(thread_id, checkpoint_ns)]
+            keys += [self._writes_key(thread_id, checkpoint_ns, i.decode()) for i in ids]
+        await self.client.execute("DEL", *keys)
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+async def has_thread(saver: BaseCheckpointSaver, thread_id: str) -> bool:
+    """Whether `saver` holds a checkpoint of `thread_id`; the stores above answer
+    without loading the checkpoint."""
+    if isinstance(saver, _VersionedSaver):
+        return await saver.ahas_thread(thread_id)
+    return await saver.aget_tuple({"configurable": {"thread_id": thread_id}}) is not None
+
+
+def make_checkpointer() -> BaseCheckpointSaver | None:
+    """Build the graph checkpointer configured through environment variables.
+
+    GRAPH_CHECKPOINTER: off | memory | sqlite | redis (default: redis with the
+    redis session backend, else sqlite)
+    GRAPH_CHECKPOINT_SQLITE_PATH: database file for sqlite (default checkpoints.db)
+    GRAPH_CHECKPOINT_KEEP: checkpoints kept per thread (default 3, 0 = all)
+    REDIS_URL and SESSION_TTL_SECONDS are shared with the session store.
+    """
+    default = "redis" if os.getenv("SESSION_BACKEND", "").lower() == "redis" else "sqlite"
+    kind = os.getenv("GRAPH_CHECKPOINTER", default).lower()
+    ttl = float(os.getenv("SESSION_TTL_SECONDS", DEFAULT_TTL_SECONDS)) or None
+    keep = int(os.getenv("GRAPH_CHECKPOINT_KEEP", DEFAULT_KEEP)) or None
+
+    if kind in {"off", "0", "false"}:
+        return None
+    if kind == "memory":
+        from langgraph.checkpoint.memory import InMemorySaver
+
+        return InMemorySaver()
+    if kind == "sqlite":
+        return SQLiteSaver(os.getenv("GRAPH_CHECKPOINT_SQLITE_PATH", "checkpoints.db"), ttl, keep)
+    if kind == "redis":
+        return RedisSaver(os.getenv("REDIS_URL", "redis://localhost:6379/0"), ttl, keep)
+    raise ValueError(f"Unknown GRAPH_CHECKPOINTER: {kind}")
+
+
+# The app's checkpointer, shared by the graph and the session endpoints.
+# Connections open on first use, so importing this module stays cheap.
+default_checkpointer = make_checkpointer()
@@ -0,0 +1,301 @@
+"""
+Batch intent classification with the planner's `MessageClassifier` prompt.
+
+Routing-quality evaluations re-classify logged messages in bulk. Going through
+`planner_node` one message at a time costs one sequential LLM call each;
+`BatchClassifier` instead:
+
+- answers what the local pre-classifier is confident about without a call, like
+  the planner's fast path;
+- looks every other message up in a cache keyed by a hash of (model, prompt and
+  label set, pinned question, text), and classifies each distinct miss only once;
+- sends the rest through the structured-output runnable's `abatch` with bounded
+  concurrency, retrying transiently failed items in later rounds.
+
+    python classifier.py messages.jsonl --output labels.jsonl --concurrency 16
+
+Each input line is {"text": ..., "question": optional pinned statement}; each
+output line adds "message_type" and "source" (fast_path, cache, llm or error).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Iterable, Sequence, get_args
+
+from intent import DEFAULT_FAST_PATH_THRESHOLD, pre_classify
+from llm_policy import is_transient
+from models import MessageClassifier
+
+CLASSIFIER_PROMPT = """
+You are an expert at classifying user intents based on their messages.
+Classify each message into one of the following categories. Read the detailed meaning of each category carefully before deciding.
+
+0. LeetCode Question
+- Meaning: The user is providing a LeetCode question to be stored/acknowledged for later use (often asking for a simple title of the Question).
+- Indicators: Mentions a LeetCode question number/title and asks to remember/store it; requests only an acknowledgment.
+- Focus: Acknowledge and remember the question context; no explanation or code yet.
+
+1. Question Explanation
+- Meaning: The user wants you to explain the question.
+- Indicators: "What does this question mean?", "Explain this problem statement", "What is being asked here?"
+- Focus: Explain what the question is asking, not how to solve it.
+
+2. Solution Explanation
+- Meaning: The user wants the AI to explain the thought process of solving the problem — including BOTH a brute-force baseline and an optimized approach.
+- Indicators: "Can you explain the thought process of the solution?", "Break down the solution", "Can you walk me through how this solution works?"
+- Focus: Explain reasoning and strategy for BOTH brute-force and optimized approaches (conceptual only). Do NOT provide code unless the user explicitly asked for code.
+
+3. User Explanation Correction
+- Meaning: The user provides their own explanation of a question or solution and wants it corrected or validated.
+- Indicators: "Is my explanation correct?", "Please fix my explanation", "Did I understand this properly?"
+- Focus: Improve or validate the user’s explanation text, not the code or question itself.
+
+4. User Solution Correction
+- Meaning: The user submits their own solution (in code or logic) and asks the AI to check or correct it.
+- Indicators: "Here’s my code — is it correct?", "Review my solution", "What’s wrong with my approach?"
+- Focus: Validate or improve the user’s provided solution, not rewrite it completely.
+
+5. Code the Solution as per User Req / Code Correction
+- Meaning: The user wants new or modified code written to meet specific requirements, or correction of existing code.
+- Indicators: "Write code for this problem", "Modify my code to do X", "Fix this error"
+- Focus: Produce, modify, or debug code — mainly code generation or editing.
+
+6. Asking User for Programming Language
+- Meaning: The AI needs clarification about which programming language to use before coding.
+- Indicators: The user did not specify a language, and the AI asks: "Which programming language should I use?"
+- Focus: Ask the user to clarify the coding language.
+
+7. User Code Correction
+- Meaning: The user provides code with errors and wants it fixed so it runs correctly.
+- Indicators: "My code gives an error", "This doesn’t compile/run", "Fix my syntax or logic"
+- Focus: Identify and fix syntax, logic, or runtime errors in the provided code.
+
+Summary Table:
+| Category | User Goal | Output |
+|-----------|------------|--------|
+| LeetCode Question | Understand question details | Acknowledgment Title of the question |
+| Question explanation | Understand question meaning | Clarified question |
+| Solution explanation | Understand solution strategy | Conceptual brute-force + optimized explanation |
+| User explanation correction | Validate/fix user explanation | Corrected explanation |
+| User solution correction | Validate user’s code/logic | Feedback on correctness |
+| Code the solution as per user req/code correction | Get working or modified code | New/fixed code |
+| Asking user for programming language | Clarify code language | Language clarification question |
+| User code correction | Fix code errors | Corrected, runnable code |
+"""
+
+# Changing the prompt or the labels invalidates cached classifications.
+PROMPT_VERSION = hashlib.sha256(
+    "\x1f".join([CLASSIFIER_PROMPT, *sorted(get_args(MessageClassifier.model_fields["message_type"].annotation))]).encode()
+).hexdigest()[:16]
+
+
+def classifier_messages(text: str, question: str | None = None, cache_prompt: bool = False) -> list[dict[str, Any]]:
+    """Planner classification prompt for `text`, given the pinned question if any."""
+    system: Any = CLASSIFIER_PROMPT
+    if cache_prompt:
+        # The classifier prompt never changes: let the provider cache it.
+        system = [{"type": "text", "text": CLASSIFIER_PROMPT, "cache_control": {"type": "ephemeral"}}]
+    pinned = [{
+        "role": "system",
+        "content": f"The conversation is about this LeetCode question:\n{question}"
+    }] if question else []
+    return [{"role": "system", "content": system}] + pinned + [{"role": "user", "content": text}]
+
+
+@dataclass(frozen=True)
+class Classification:
+    message_type: str | None
+    source: str  # "fast_path", "cache", "llm" or "error"
+    error: str | None = None
+
+
+class ClassificationCache:
+    """SQLite map from message hash to label; ":memory:" keeps it per process."""
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS classifications ("
+                " key TEXT PRIMARY KEY, message_type TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _get_many(self, keys: list[str]) -> dict[str, str]:
+        found: dict[str, str] = {}
+        with self._lock:
+            conn = self._connection()
+            # Stay well under SQLite's bound-parameter limit.
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT key, message_type FROM classifications WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def _put_many(self, labels: dict[str, str]) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection().executemany(
+                "INSERT OR REPLACE INTO classifications (key, message_type, created_at) VALUES (?, ?, ?)",
+                [(key, label, now) for key, label in labels.items()],
+            )
+
+    async def get_many(self, keys: list[str]) -> dict[str, str]:
+        return await asyncio.to_thread(self._get_many, keys) if keys else {}
+
+    async def put_many(self, labels: dict[str, str]) -> None:
+        if labels:
+            await asyncio.to_thread(self._put_many, labels)
+
+
+class BatchClassifier:
+    """Classify many messages with few, concurrent structured-output calls.
+
+    `llm` is a LangChain chat model; `model` names it in the cache key, so labels
+    from different classifier models never mix, nor do labels from an older
+    prompt or label set (`PROMPT_VERSION`). `fast_path_threshold` mirrors the
+    planner's local fast path (None always asks the model).
+    """
+
+    def __init__(
+        self,
+        llm: Any,
+        model: str = "",
+        cache: ClassificationCache | None = None,
+        concurrency: int = 8,
+        retries: int = 2,
+        backoff: float = 1.0,
+        fast_path_threshold: float | None = DEFAULT_FAST_PATH_THRESHOLD,
+        cache_prompt: bool = False,
+    ):
+        self.runnable = llm.with_structured_output(MessageClassifier)
+        self.model = model
+        self.cache = cache
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.fast_path_threshold = fast_path_threshold
+        self.cache_prompt = cache_prompt
+        self.stats: Counter[str] = Counter()
+
+    def key_for(self, text: str, question: str | None = None) -> str:
+        return hashlib.sha256(f"{self.model}\x1f{PROMPT_VERSION}\x1f{question or ''}\x1f{text}".encode()).hexdigest()
+
+    async def classify(self, items: Iterable[str | tuple[str, str | None]]) -> list[Classification]:
+        """Labels for `items` (texts, or (text, pinned question) pairs), in order."""
+        pairs = [(item, None) if isinstance(item, str) else tuple(item) for item in items]
+        results: list[Classification | None] = [None] * len(pairs)
+        # Identical messages are classified once.
+        pending: dict[str, list[int]] = {}
+        for index, (text, question) in enumerate(pairs):
+            if self.fast_path_threshold is not None:
+                guess = pre_classify(text)
+                if guess.confidence >= self.fast_path_threshold:
+                    results[index] = Classification(guess.message_type, "fast_path")
+                    continue
+            pending.setdefault(self.key_for(text, question), []).append(index)
+
+        cached = await self.cache.get_many(list(pending)) if self.cache else {}
+        for key, label in cached.items():
+            for index in pending.pop(key):
+                results[index] = Classification(label, "cache")
+
+        labels = await self._ask(pending, pairs, results)
+        if self.cache:
+            await self.cache.put_many(labels)
+
+        self.stats.update(result.source for result in results)
+        return results
+
+    async def _ask(self, pending: dict[str, list[int]], pairs: Sequence[tuple[str, str | None]], results: list) -> dict[str, str]:
+        labels: dict[str, str] = {}
+        keys = list(pending)
+        config = {"max_concurrency": self.concurrency, "metadata": {"langgraph_node": "planner"}}
+        for attempt in range(self.retries + 1):
+            if not keys:
+                break
+            if attempt:
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            inputs = [classifier_messages(*pairs[pending[key][0]], cache_prompt=self.cache_prompt) for key in keys]
+            outputs = await self.runnable.abatch(inputs, config, return_exceptions=True)
+            retry = []
+            for key, output in zip(keys, outputs):
+                if isinstance(output, Exception):
+                    if is_transient(output) and attempt < self.retries:
+                        retry.append(key)
+                        continue
+                    result = Classification(None, "error", repr(output))
+                else:
+                    labels[key] = output.message_type
+                    result = Classification(output.message_type, "llm")
+                for index in pending[key]:
+                    results[index] = result
+            keys = retry
+        return labels
+
+
+def main(argv: list[str] | None = None) -> int:
+    from model_tiers import FAST_MODEL
+
+    parser = argparse.ArgumentParser(description="Classify logged messages in bulk with the planner prompt.")
+    parser.add_argument("input", help="JSONL file of {\"text\": ..., \"question\": ...}")
+    parser.add_argument("--output", help="JSONL file for the labelled messages (default: stdout)")
+    parser.add_argument("--model", default=FAST_MODEL, help="classifier model (default: the planner's)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--cache", default="classifier_cache.db", help="label cache path, or :memory:")
+    parser.add_argument("--no-fast-path", action="store_true", help="ask the model even when pre_classify is confident")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    from langchain.chat_models import init_chat_model
+
+    load_dotenv()
+    with open(args.input) as handle:
+        rows = [json.loads(line) for line in handle if line.strip()]
+
+    classifier = BatchClassifier(
+        init_chat_model(args.model),
+        model=args.model,
+        cache=ClassificationCache(args.cache),
+        concurrency=args.concurrency,
+        fast_path_threshold=None if args.no_fast_path else DEFAULT_FAST_PATH_THRESHOLD,
+        cache_prompt=args.model.startswith(("claude", "anthropic:")),
+    )
+    started = time.perf_counter()
+    results = asyncio.run(classifier.classify([(row["text"], row.get("question")) for row in rows]))
+    elapsed = time.perf_counter() - started
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for row, result in zip(rows, results):
+            labelled = {**row, "message_type": result.message_type, "source": result.source}
+            if result.error:
+                labelled["error"] = result.error
+            out.write(json.dumps(labelled) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(json.dumps({"messages": len(rows), "seconds": round(elapsed, 2), **classifier.stats}), file=sys.stderr)
+    return 1 if classifier.stats["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
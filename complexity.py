@@ -0,0 +1,215 @@
+"""
+Measured versus claimed complexity of benchmarked solutions.
+
+`SandboxPool.benchmark` times a solution on inputs of doubling size; `fit` picks
+the growth class that best explains those timings (or peak memory): each class
+`f` is fitted as `a + b * f(n)` in log space, so a fixed per-call overhead does
+not pass for O(log n), and the simplest class within a margin of the best one
+wins. `claimed_complexity` reads the time and space
+complexity the model stated for its brute-force and optimized solutions, and
+`complexity_report` puts both side by side and flags an "optimized" solution
+that is not faster, or one whose claimed time complexity the timings contradict.
+
+Standard library only.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from typing import Any, Callable
+
+from sandbox import BenchResult
+
+CLASSES: tuple[tuple[str, Callable[[float], float]], ...] = (
+    ("O(1)", lambda n: 1.0),
+    ("O(log n)", lambda n: math.log2(n)),
+    ("O(n)", lambda n: n),
+    ("O(n log n)", lambda n: n * math.log2(n)),
+    ("O(n^2)", lambda n: n * n),
+    ("O(n^3)", lambda n: n ** 3),
+    ("O(2^n)", lambda n: 2.0 ** n),
+)
+# Neighbours that a few doublings of n cannot reliably tell apart.
+_INDISTINGUISHABLE = ({"O(1)", "O(log n)"}, {"O(n)", "O(n log n)"})
+# Peak memory below this is interpreter noise (a few small objects), not growth.
+CONSTANT_MEMORY_BYTES = 2048
+# A class whose error is within this factor (plus a little) of the best fit's
+# counts as a fit; cache effects make real timings step rather than curve.
+FIT_TOLERANCE = 1.75
+NOT_FASTER_RATIO = 0.9
+
+_BIG_O = re.compile(r"O\((?:[^()]|\([^()]*\))*\)")
+_SOLUTION = re.compile(r"brute|optimi", re.IGNORECASE)
+_CLAIM = re.compile(r"(time|space)(?:\s+complexity)?\W{0,12}(O\((?:[^()]|\([^()]*\))*\))", re.IGNORECASE)
+
+
+def _fit_error(points: list[tuple[float, float]], f: Callable[[float], float]) -> float:
+    """RMS log-error of the best `a + b * f(n)`, a, b >= 0.
+
+    For a fixed ratio c = a / b the best scale is closed-form in log space, so
+    only c is searched, over a log grid below the largest f(n).
+    """
+    xs = [f(n) for n, _ in points]
+    logs = [math.log(y) for _, y in points]
+    top = max(xs)
+    best = math.inf
+    for c in [0.0] + [top * 10 ** (-k / 4) for k in range(49)]:
+        residuals = [ly - math.log(c + x) for x, ly in zip(xs, logs)]
+        mean = sum(residuals) / len(residuals)
+        best = min(best, math.sqrt(sum((r - mean) ** 2 for r in residuals) / len(residuals)))
+    return best
+
+
+def fit(points: list[tuple[float, float]]) -> str | None:
+    """Growth class of (n, value) points, or None with fewer than three sizes.
+
+    O(2^n) is only considered while n stays small enough to be a plausible input.
+    """
+    points = [(n, y) for n, y in points if n >= 1 and y > 0]
+    if len({n for n, _ in points}) < 3:
+        return None
+    largest = max(n for n, _ in points)
+    errors = {
+        label: _fit_error(points, f) for label, f in CLASSES
+        if label != "O(2^n)" or largest <= 64
+    }
+    best = min(errors.values())
+    return next(label for label, error in errors.items() if error <= best * FIT_TOLERANCE + 0.02)
+
+
+def measured_time(bench: BenchResult) -> str | None:
+    return fit([(point["n"], point["seconds"]) for point in bench.points])
+
+
+def measured_space(bench: BenchResult) -> str | None:
+    if len(bench.points) >= 3 and max(point["peak_bytes"] for point in bench.points) < CONSTANT_MEMORY_BYTES:
+        return "O(1)"
+    return fit([(point["n"], point["peak_bytes"]) for point in bench.points])
+
+
+def normalize(claim: str | None) -> str | None:
+    """Canonical `CLASSES` label for a claimed bound like "O(N²)" or "O(n * log(n))";
+    None for anything else (several variables, amortized remarks, ...)."""
+    if not claim:
+        return None
+    inner = claim.strip()[2:-1].lower().translate(str.maketrans({"²": "^2", "³": "^3", "ⁿ": "^n", "₂": ""}))
+    inner = re.sub(r"[\s*·×⋅{}\\]|cdot|_2", "", inner)
+    inner = inner.replace("log(n)", "logn").replace("log2n", "logn").replace("lgn", "logn")
+    inner = {"nn": "n^2", "nnn": "n^3", "n**2": "n^2", "n**3": "n^3", "lognn": "nlogn", "2**n": "2^n"}.get(inner, inner)
+    canonical = {"1": "O(1)", "logn": "O(log n)", "n": "O(n)", "nlogn": "O(n log n)",
+                 "n^2": "O(n^2)", "n^3": "O(n^3)", "2^n": "O(2^n)"}
+    return canonical.get(inner)
+
+
+def _solution_label(text: str) -> str | None:
+    mentions = [m.group().lower() for m in _SOLUTION.finditer(text)]
+    if not mentions:
+        return None
+    return "Brute force" if mentions[-1] == "brute" else "Optimized"
+
+
+def claimed_complexity(text: str) -> dict[str, dict[str, str]]:
+    """{"Brute force" | "Optimized": {"time": "O(...)", "space": "O(...)"}} as stated
+    in the reply. Summary-table rows win over prose; prose claims belong to the
+    nearest preceding brute-force/optimized mention."""
+    claims: dict[str, dict[str, str]] = {}
+    for match in _CLAIM.finditer(text):
+        label = _solution_label(text[:match.start()])
+        if label is not None:
+            claims.setdefault(label, {})[match.group(1).lower()] = match.group(2)
+
+    time_first = True
+    for line in text.splitlines():
+        if not line.lstrip().startswith("|"):
+            continue
+        lowered = line.lower()
+        if "time" in lowered and "space" in lowered:
+            time_first = lowered.index("time") < lowered.index("space")
+            continue
+        bounds = _BIG_O.findall(line)
+        label = _solution_label(line.split("|")[1] if line.count("|") > 1 else line)
+        if label is not None and len(bounds) >= 2:
+            time, space = bounds[:2] if time_first else bounds[1::-1]
+            claims[label] = {"time": time, "space": space}
+    return claims
+
+
+def _seconds(value: float) -> str:
+    if value < 1e-3:
+        return f"{value * 1e6:.1f} µs"
+    if value < 1:
+        return f"{value * 1e3:.2f} ms"
+    return f"{value:.2f} s"
+
+
+def _bytes(value: float) -> str:
+    if value < 1024:
+        return f"{value:.0f} B"
+    if value < 1 << 20:
+        return f"{value / 1024:.1f} KB"
+    return f"{value / (1 << 20):.1f} MB"
+
+
+def complexity_report(benchmarks: dict[str, BenchResult], text: str) -> dict[str, Any]:
+    """Claimed and measured complexity per solution label, timings at the largest
+    input size every solution reached, and warnings."""
+    claims = claimed_complexity(text)
+    sizes = [{point["n"] for point in bench.points} for bench in benchmarks.values()]
+    common = max(set.intersection(*sizes), default=None) if sizes else None
+
+    rows, warnings = [], []
+    for label, bench in benchmarks.items():
+        at = {point["n"]: point for point in bench.points}
+        claim = claims.get(label, {})
+        row = {
+            "label": label,
+            "claimed_time": claim.get("time"),
+            "measured_time": measured_time(bench),
+            "claimed_space": claim.get("space"),
+            "measured_space": measured_space(bench),
+            "largest_n": max(at, default=None),
+            "seconds": at[common]["seconds"] if common in at else None,
+            "peak_bytes": at[common]["peak_bytes"] if common in at else None,
+            "error": bench.error,
+        }
+        rows.append(row)
+        claimed = normalize(row["claimed_time"])
+        if claimed and row["measured_time"] and claimed != row["measured_time"] and \
+                {claimed, row["measured_time"]} not in _INDISTINGUISHABLE:
+            warnings.append(f"{label}: claimed {row['claimed_time']} time, but the timings grow like {row['measured_time']}.")
+
+    by_label = {row["label"]: row for row in rows}
+    brute, optimized = by_label.get("Brute force"), by_label.get("Optimized")
+    if brute and optimized and brute["seconds"] and optimized["seconds"]:
+        if optimized["seconds"] >= NOT_FASTER_RATIO * brute["seconds"]:
+            warnings.append(
+                f"The optimized solution is not faster than the brute force one at n = {common}: "
+                f"{_seconds(optimized['seconds'])} against {_seconds(brute['seconds'])}."
+            )
+    return {"n": common, "rows": rows, "warnings": warnings}
+
+
+def format_report(report: dict[str, Any]) -> str:
+    """Markdown table of `complexity_report`, followed by its warnings."""
+    n = report["n"]
+    lines = [
+        "**Measured complexity (synthetic inputs of doubling size):**",
+        "",
+        f"| Solution | Claimed time | Measured time | Claimed space | Measured space | Largest n | Time at n = {n} | Peak memory at n = {n} |",
+        "|---|---|---|---|---|---|---|---|",
+    ]
+    for row in report["rows"]:
+        cells = [
+            row["label"], row["claimed_time"] or "-", row["measured_time"] or "-",
+            row["claimed_space"] or "-", row["measured_space"] or "-",
+            str(row["largest_n"]) if row["largest_n"] is not None else "-",
+            _seconds(row["seconds"]) if row["seconds"] is not None else "-",
+            _bytes(row["peak_bytes"]) if row["peak_bytes"] is not None else "-",
+        ]
+        lines.append("| " + " | ".join(cells) + " |")
+    for row in report["rows"]:
+        if row["error"]:
+            lines.append(f"\n{row['label']} stopped early: {row['error']}")
+    lines += [f"\n⚠️ {warning}" for warning in report["warnings"]]
+    return "\n".join(lines)
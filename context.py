@@ -0,0 +1,181 @@
+"""
+Context management for node prompts.
+
+Instead of resending the whole conversation on every turn, nodes send:
+
+1. their system prompt,
+2. the pinned LeetCode question turn (the latest /questions statement + its ack),
+3. a rolling summary of older turns (kept in `state["summary"]`),
+4. the last `RECENT_TURNS` turns verbatim,
+
+trimmed to a per-node token budget. `state["summarized_upto"]` records how many
+leading messages are already folded into the summary, so each turn only the
+turns that just slid out of the verbatim window are summarised.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+from intent import QUESTION_STATEMENT
+from state import State
+
+_QUESTION_NUMBER = re.compile(r"\s*LeetCode Question #(\d+)")
+
+RECENT_TURNS = int(os.getenv("CONTEXT_RECENT_TURNS", "4"))
+
+# Rough input-token budgets for the conversation part of each node's prompt.
+DEFAULT_TOKEN_BUDGET = 6000
+NODE_TOKEN_BUDGETS = {
+    "planner": 600,
+    "LeetCode Question": 1500,
+    "Question explanation": 4000,
+    "Solution explanation": 6000,
+    "User explanation correction": 5000,
+    "User solution correction": 6000,
+    "Code the solution as per user req/code correction": 8000,
+    "Code draft - brute force": 8000,
+    "Code draft - optimized": 8000,
+    "Asking user for programming language": 2000,
+    "User code correction": 8000,
+}
+
+SUMMARY_PROMPT = """
+    You maintain a running summary of a tutoring conversation about a LeetCode problem.
+    Merge the new conversation turns into the existing summary.
+
+    Keep: what the user asked for, their chosen programming language, their own
+    explanations/code and the key corrections given, and any decisions or preferences.
+    Drop: greetings, repeated content and full code listings (describe them instead).
+
+    Reply with the updated summary only, at most 200 words.
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) good enough for budgeting."""
+    return len(text) // 4 + 1
+
+
+def _text(message: BaseMessage) -> str:
+    return str(message.content)
+
+
+def turn_starts(messages: list[BaseMessage]) -> list[int]:
+    """Indexes of the human messages that open each turn."""
+    return [i for i, m in enumerate(messages) if m.type == "human"]
+
+
+def pinned_question_span(messages: list[BaseMessage]) -> tuple[int, int] | None:
+    """[start, end) of the latest LeetCode question turn, if the session has one."""
+    starts = turn_starts(messages)
+    for pos in range(len(starts) - 1, -1, -1):
+        start = starts[pos]
+        if QUESTION_STATEMENT.match(_text(messages[start])):
+            end = starts[pos + 1] if pos + 1 < len(starts) else len(messages)
+            return start, end
+    return None
+
+
+def pinned_question_number(messages: list[BaseMessage]) -> int | None:
+    """LeetCode number of the pinned question, if the session has one."""
+    pinned = pinned_question_span(messages)
+    match = _QUESTION_NUMBER.match(_text(messages[pinned[0]])) if pinned else None
+    return int(match.group(1)) if match else None
+
+
+def window_start(messages: list[BaseMessage], recent_turns: int = RECENT_TURNS) -> int:
+    """Index of the first message kept verbatim."""
+    starts = turn_starts(messages)
+    if len(starts) <= recent_turns:
+        return 0
+    return starts[-recent_turns]
+
+
+def unsummarized(state: State, recent_turns: int = RECENT_TURNS) -> tuple[list[BaseMessage], int]:
+    """Messages that left the verbatim window since the last summary, and the new watermark."""
+    messages = state["messages"]
+    start = window_start(messages, recent_turns)
+    done = state.get("summarized_upto") or 0
+    if start <= done:
+        return [], done
+
+    pinned = pinned_question_span(messages)
+    pending = [
+        m for i, m in enumerate(messages[done:start], done)
+        if not (pinned and pinned[0] <= i < pinned[1])
+    ]
+    return pending, start
+
+
+def summary_messages(previous: str | None, pending: list[BaseMessage]) -> list[BaseMessage]:
+    transcript = "\n\n".join(f"{m.type.upper()}: {_text(m)}" for m in pending)
+    return [
+        SystemMessage(content=SUMMARY_PROMPT),
+        HumanMessage(content=f"Existing summary:\n{previous or '(none)'}\n\nNew turns:\n{transcript}"),
+    ]
+
+
+def _truncate(text: str, budget: int) -> str:
+    limit = budget * 4
+    return text if len(text) <= limit else text[:limit] + " …"
+
+
+def cacheable(message: BaseMessage) -> BaseMessage:
+    """Copy of `message` marked as the end of a provider prompt-cache prefix."""
+    blocks = message.content if isinstance(message.content, list) else [{"type": "text", "text": message.content}]
+    blocks = [dict(block) if isinstance(block, dict) else {"type": "text", "text": block} for block in blocks]
+    blocks[-1]["cache_control"] = {"type": "ephemeral"}
+    return message.model_copy(update={"content": blocks})
+
+
+def build_prompt(state: State, system_prompt: str, node: str, cache: bool = False) -> list[BaseMessage]:
+    """Prompt for a response node: system + pinned question + summary + recent turns.
+
+    The order puts what changes least first, so with `cache=True` the system prompt and
+    the pinned question turn form a prefix that stays byte-identical across turns and is
+    marked for provider prompt caching.
+    """
+    messages = state["messages"]
+    budget = NODE_TOKEN_BUDGETS.get(node, DEFAULT_TOKEN_BUDGET)
+
+    system = SystemMessage(content=system_prompt)
+    prompt: list[BaseMessage] = [cacheable(system) if cache else system]
+
+    start = window_start(messages)
+    pinned = pinned_question_span(messages)
+    if pinned and pinned[0] < start:
+        pinned_messages = messages[pinned[0]:min(pinned[1], start)]
+        budget -= sum(estimate_tokens(_text(m)) for m in pinned_messages)
+        if cache:
+            pinned_messages = pinned_messages[:-1] + [cacheable(pinned_messages[-1])]
+        prompt += pinned_messages
+
+    summary = state.get("summary")
+    if summary:
+        prompt.append(HumanMessage(content=f"(Context, not a new request) Summary of the earlier conversation:\n{summary}"))
+        budget -= estimate_tokens(summary)
+
+    # Drop the oldest recent turns until the rest fits, but always keep the newest turn.
+    recent = messages[start:]
+    starts = turn_starts(recent) or [0]
+    for cut in starts:
+        if sum(estimate_tokens(_text(m)) for m in recent[cut:]) <= budget:
+            break
+    else:
+        cut = starts[-1]
+
+    return prompt + recent[cut:]
+
+
+def planner_context(state: State) -> str | None:
+    """The pinned question statement, clipped to the planner budget, if the last
+    message is not itself that statement."""
+    messages = state["messages"]
+    pinned = pinned_question_span(messages)
+    if not pinned or pinned[0] == len(messages) - 1:
+        return None
+    return _truncate(_text(messages[pinned[0]]), NODE_TOKEN_BUDGETS["planner"])
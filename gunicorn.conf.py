@@ -0,0 +1,39 @@
+"""
+Gunicorn settings for running several Uvicorn workers:
+
+    gunicorn -c gunicorn.conf.py main:app
+
+WEB_CONCURRENCY sets the number of workers (default: one per CPU this process
+may run on, at most 4; each worker loads the whole LLM stack). Workers share
+nothing in process, so with more than one the session store must be shared too:
+SESSION_BACKEND defaults to sqlite here (redis for several instances) and the
+in-memory backend is refused, as is the in-memory graph checkpointer.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+# The host's CPU count can be far above a container's share; affinity is closer.
+cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+workers = int(os.getenv("WEB_CONCURRENCY", min(cpus, 4)))
+worker_class = "uvicorn.workers.UvicornWorker"
+# Streamed replies can take a while; the LLM policies time calls out well before this.
+timeout = int(os.getenv("WORKER_TIMEOUT_SECONDS", "180"))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then to bound memory growth, staggered so they don't restart together.
+max_requests = int(os.getenv("WORKER_MAX_REQUESTS", "5000"))
+max_requests_jitter = max_requests // 10
+accesslog = "-"
+
+# Workers split the LLM gateway's limits (llm_gateway.LLMGateway.from_env) between them.
+os.environ["WEB_CONCURRENCY"] = str(workers)
+if workers > 1:
+    os.environ.setdefault("SESSION_BACKEND", "sqlite")
+
+
+def on_starting(server):
+    if workers > 1 and os.environ["SESSION_BACKEND"] == "memory":
+        raise RuntimeError("SESSION_BACKEND=memory cannot be shared by several workers; use sqlite or redis")
+    if workers > 1 and os.getenv("GRAPH_CHECKPOINTER") == "memory":
+        raise RuntimeError("GRAPH_CHECKPOINTER=memory cannot be shared by several workers; use sqlite or redis")
@@ -0,0 +1,188 @@
+"""
+Local, deterministic intent pre-classification for the planner.
+
+`pre_classify` labels a user message with one of the eight planner categories
+using a few hard rules plus a small naive-Bayes model over word n-grams trained
+on seed phrases. It returns a confidence in [0, 1]; the planner only trusts it
+above a configurable threshold and otherwise falls back to the LLM classifier.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass
+
+MESSAGE_TYPES = (
+    "LeetCode Question",
+    "Question explanation",
+    "Solution explanation",
+    "User explanation correction",
+    "User solution correction",
+    "Code the solution as per user req/code correction",
+    "Asking user for programming language",
+    "User code correction",
+)
+
+# Set PLANNER_FAST_PATH_THRESHOLD=off to always use the LLM planner.
+_threshold_env = os.getenv("PLANNER_FAST_PATH_THRESHOLD", "0.9").strip().lower()
+DEFAULT_FAST_PATH_THRESHOLD: float | None = None if _threshold_env in {"", "off", "none"} else float(_threshold_env)
+
+
+@dataclass(frozen=True)
+class IntentGuess:
+    message_type: str
+    confidence: float
+    source: str  # "rule" or "lexical"
+
+
+# Statement built by main.get_questions.
+QUESTION_STATEMENT = re.compile(r"^\s*LeetCode Question #\d+")
+_CODE_BLOCK = re.compile(r"```.*?```", re.DOTALL)
+_FIX_REQUEST = re.compile(
+    r"\b(fix|error|errors|bug|bugs|traceback|exception|crash(es)?|doesn'?t (work|run|compile)|"
+    r"does not (work|run|compile)|wrong answer|failing|fails|broken|syntax)\b",
+    re.IGNORECASE,
+)
+_REVIEW_REQUEST = re.compile(
+    r"\b(is (this|it|my (code|solution)) (correct|right|ok)|review|check my|correct\?|right\?)\b",
+    re.IGNORECASE,
+)
+
+_SEED_PHRASES: dict[str, list[str]] = {
+    "LeetCode Question": [
+        "store this leetcode question",
+        "remember this problem for later",
+        "here is the leetcode question number",
+        "save question two sum",
+        "leetcode problem number title acknowledge",
+    ],
+    "Question explanation": [
+        "what does this question mean",
+        "explain this problem statement",
+        "what is being asked here",
+        "explain the question",
+        "i don't understand the question",
+        "what does the problem want me to return",
+        "explain the example in the question",
+        "what is the input and output of this problem",
+    ],
+    "Solution explanation": [
+        "can you explain the thought process of the solution",
+        "break down the solution",
+        "walk me through how this solution works",
+        "explain the solution",
+        "how should i approach this problem",
+        "what is the intuition behind the optimal approach",
+        "explain the brute force and optimized approach",
+        "give me a hint on how to solve it",
+    ],
+    "User explanation correction": [
+        "is my explanation correct",
+        "please fix my explanation",
+        "did i understand this properly",
+        "my understanding is that the problem asks",
+        "i think the question wants us to",
+        "correct my understanding of the problem",
+    ],
+    "User solution correction": [
+        "is my approach correct",
+        "review my solution",
+        "what is wrong with my approach",
+        "my idea is to sort the array and then use two pointers is that right",
+        "check my logic",
+        "i would use a hashmap to store seen values does that work",
+    ],
+    "Code the solution as per user req/code correction": [
+        "write code for this problem",
+        "write the solution in python",
+        "code the solution in java",
+        "give me the code in c++",
+        "modify my code to use a hashmap",
+        "implement the optimized solution in javascript",
+        "show me the python code",
+        "write a solution using dynamic programming",
+    ],
+    "Asking user for programming language": [
+        "write the code",
+        "give me the code",
+        "can you code it",
+        "code it up",
+        "show me a solution in code",
+    ],
+    "User code correction": [
+        "my code gives an error",
+        "this doesn't compile",
+        "fix my syntax",
+        "my code fails on this test case",
+        "why does my code throw an exception",
+        "fix this code",
+        "my solution gets wrong answer",
+    ],
+}
+
+# "go" and "c" are ordinary words ("let's go through it", "option c"): they only
+# name a language next to "in"/"using"/... or before "code"/"language"/...
+_LANGUAGE = re.compile(
+    r"\b(?:python|java|javascript|typescript|cpp|golang|rust|kotlin|swift|ruby|php|scala)\b"
+    r"|(?<!\w)c(?:\+\+|#)(?![\w+#])"
+    r"|\b(?:in|using|with|into)\s+(?:go|c)\b(?![+#])"
+    r"|\b(?:go|c)\s+(?:code|language|program|solution|version|implementation)\b",
+    re.IGNORECASE,
+)
+
+_TOKEN = re.compile(r"[a-z+#']+")
+
+
+def _features(text: str) -> list[str]:
+    words = _TOKEN.findall(_CODE_BLOCK.sub(" codeblock ", text.lower()))
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class _NaiveBayes:
+    def __init__(self, seeds: dict[str, list[str]]):
+        self.labels = list(seeds)
+        self.counts = {label: Counter(f for phrase in phrases for f in _features(phrase)) for label, phrases in seeds.items()}
+        self.totals = {label: sum(counts.values()) for label, counts in self.counts.items()}
+        self.vocab = set().union(*self.counts.values())
+
+    def predict(self, text: str) -> tuple[str, float]:
+        feats = [f for f in _features(text) if f in self.vocab]
+        if not feats:
+            return self.labels[0], 0.0
+
+        vocab_size = len(self.vocab)
+        scores = {
+            label: sum(math.log((self.counts[label][f] + 1) / (self.totals[label] + vocab_size)) for f in feats)
+            for label in self.labels
+        }
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        posterior = 1.0 / sum(math.exp(score - top) for score in scores.values())
+        # Damp confidence for messages that share little vocabulary with the seeds.
+        coverage = min(1.0, len(feats) / 4)
+        return best, posterior * coverage
+
+
+_model = _NaiveBayes(_SEED_PHRASES)
+
+
+def pre_classify(text: str) -> IntentGuess:
+    """Best local guess at the planner label for `text`, with a confidence score."""
+    if QUESTION_STATEMENT.match(text):
+        return IntentGuess("LeetCode Question", 0.99, "rule")
+
+    if _CODE_BLOCK.search(text):
+        prose = _CODE_BLOCK.sub(" ", text)
+        if _FIX_REQUEST.search(prose):
+            return IntentGuess("User code correction", 0.95, "rule")
+        if _REVIEW_REQUEST.search(prose):
+            return IntentGuess("User solution correction", 0.9, "rule")
+
+    label, confidence = _model.predict(text)
+    if label == "Code the solution as per user req/code correction" and not _LANGUAGE.search(text):
+        # Whether to ask for a language depends on earlier turns; leave it to the LLM.
+        confidence *= 0.5
+    return IntentGuess(label, round(confidence, 3), "lexical")
@@ -0,0 +1,256 @@
+"""
+Gateway in front of the chat model: one place that bounds what the graph asks
+of the provider.
+
+- At most `max_concurrency` calls are in flight across all sessions.
+  Each worker process has its own gateway: `from_env` splits the configured
+  limits evenly over the WEB_CONCURRENCY workers.
+- Token buckets cap requests and tokens per minute below the provider limits,
+  so a spike queues here instead of turning into a wave of provider 429s.
+- Waiting calls are ordered by priority (cheap planner/summary calls before
+  explanations before code generation) and, within a priority, round-robin
+  across users so one chatty session cannot starve the others.
+
+`GatedLLM` wraps the `init_chat_model` client; the node (priority) and user are
+read from the LangGraph run config, so the nodes keep calling `llm.ainvoke`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator
+
+from langchain_core.runnables.config import ensure_config
+
+from context import estimate_tokens
+from telemetry import metrics
+
+# Lower runs first.
+NODE_PRIORITIES = {
+    "planner": 0,
+    "context": 1,
+    "LeetCode Question": 1,
+    "Asking user for programming language": 1,
+    "Question explanation": 2,
+    "Solution explanation": 2,
+    "User explanation correction": 2,
+    "User solution correction": 3,
+    "Code the solution as per user req/code correction": 3,
+    "Code draft - brute force": 3,
+    "Code draft - optimized": 3,
+    "Verify code": 3,
+    "User code correction": 3,
+}
+DEFAULT_PRIORITY = 2
+
+# Output tokens reserved per call until the real usage is known.
+OUTPUT_TOKEN_ESTIMATE = 512
+
+WAIT_SECONDS = metrics.histogram(
+    "leetcode_llm_gateway_wait_seconds", "Time LLM calls waited for a gateway slot and rate budget.", ("priority",))
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute, holding at most one minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.level = per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def take(self, amount: float) -> None:
+        amount = min(amount, self.capacity)
+        while True:
+            self._refill()
+            if self.level >= amount:
+                self.level -= amount
+                return
+            await asyncio.sleep((amount - self.level) / self.rate)
+
+    def adjust(self, amount: float) -> None:
+        """Charge (or refund, if negative) `amount` after the fact; may go into debt."""
+        self._refill()
+        self.level = min(self.capacity, self.level - amount)
+
+
+@dataclass(eq=False)
+class _Waiter:
+    user: str
+    priority: int
+    future: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        # priority -> user -> that user's waiting calls; users are served round-robin.
+        self._queues: dict[int, OrderedDict[str, deque[_Waiter]]] = {}
+        self._in_flight = 0
+        self.calls = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @classmethod
+    def from_env(cls) -> LLMGateway:
+        """LLM_MAX_CONCURRENCY (default 8), LLM_REQUESTS_PER_MINUTE and
+        LLM_TOKENS_PER_MINUTE (default 0, unlimited), as totals for the server:
+        each of the WEB_CONCURRENCY workers (default 1) gets its share, and at
+        least one call in flight."""
+        workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+        return cls(
+            max_concurrency=max(1, int(os.getenv("LLM_MAX_CONCURRENCY", "8")) // workers),
+            requests_per_minute=float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0")) / workers or None,
+            tokens_per_minute=float(os.getenv("LLM_TOKENS_PER_MINUTE", "0")) / workers or None,
+        )
+
+    def _dispatch(self) -> None:
+        while self._in_flight < self.max_concurrency and self._queues:
+            priority = min(self._queues)
+            users = self._queues[priority]
+            user, waiters = next(iter(users.items()))
+            waiter = waiters.popleft()
+            if waiters:
+                users.move_to_end(user)
+            else:
+                del users[user]
+            if not users:
+                del self._queues[priority]
+            self._in_flight += 1
+            waiter.future.set_result(None)
+
+    def _discard(self, waiter: _Waiter) -> None:
+        users = self._queues.get(waiter.priority, {})
+        waiters = users.get(waiter.user)
+        if waiters is None:
+            return
+        waiters.remove(waiter)
+        if not waiters:
+            del users[waiter.user]
+        if not users:
+            self._queues.pop(waiter.priority, None)
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, user: str, priority: int = DEFAULT_PRIORITY, tokens: int = 0) -> AsyncIterator[None]:
+        """Wait for a concurrency slot and rate budget for one call of about `tokens` tokens."""
+        started = time.monotonic()
+        waiter = _Waiter(user, priority)
+        self._queues.setdefault(priority, OrderedDict()).setdefault(user, deque()).append(waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release()
+            else:
+                self._discard(waiter)
+            raise
+
+        try:
+            if self.requests:
+                await self.requests.take(1)
+            if self.tokens:
+                await self.tokens.take(tokens)
+            waited = time.monotonic() - started
+            self.calls += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            WAIT_SECONDS.observe(waited, priority=priority)
+            yield
+        finally:
+            self._release()
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """Correct the token bucket once a call reports its real usage."""
+        if self.tokens:
+            self.tokens.adjust(actual - estimated)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "in_flight": self._in_flight,
+            "queue_depth": sum(len(w) for users in self._queues.values() for w in users.values()),
+            "queue_depth_by_priority": {
+                priority: sum(len(w) for w in users.values()) for priority, users in sorted(self._queues.items())
+            },
+            "calls": self.calls,
+            "wait_seconds_total": self.wait_seconds_total,
+            "wait_seconds_max": self.wait_seconds_max,
+        }
+
+
+def _estimate_input_tokens(messages: Any) -> int:
+    if isinstance(messages, str):
+        return estimate_tokens(messages)
+    total = 0
+    for message in messages:
+        content = message.get("content") if isinstance(message, dict) else getattr(message, "content", message)
+        total += estimate_tokens(str(content))
+    return total
+
+
+class GatedLLM:
+    """Chat model wrapper whose `ainvoke` calls go through an `LLMGateway`.
+
+    The user comes from the run metadata `user_id` (set by `chat_service`) and the
+    priority from the calling graph node.
+    """
+
+    def __init__(self, llm: Any, gateway: LLMGateway):
+        self.llm = llm
+        self.gateway = gateway
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> GatedLLM:
+        return GatedLLM(self.llm.with_structured_output(schema, **kwargs), self.gateway)
+
+    async def ainvoke(self, messages: Any, config: Any = None, **kwargs: Any) -> Any:
+        metadata = ensure_config(config).get("metadata", {})
+        user = str(metadata.get("user_id", "anonymous"))
+        priority = NODE_PRIORITIES.get(metadata.get("langgraph_node"), DEFAULT_PRIORITY)
+        estimated = _estimate_input_tokens(messages) + OUTPUT_TOKEN_ESTIMATE
+
+        async with self.gateway.slot(user, priority, estimated):
+            result = await self.llm.ainvoke(messages, config, **kwargs)
+
+        usage = getattr(result, "usage_metadata", None)
+        if usage:
+            self.gateway.settle(estimated, usage.get("total_tokens", estimated))
+        return result
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.llm, name)
+
+
+gateway = LLMGateway.from_env()
+
+metrics.collector(
+    "leetcode_llm_gateway_in_flight", "gauge", "LLM calls currently holding a gateway slot.",
+    lambda: [({}, gateway.stats()["in_flight"])],
+)
+metrics.collector(
+    "leetcode_llm_gateway_queue_depth", "gauge", "LLM calls waiting for a gateway slot, by priority.",
+    lambda: [
+        ({"priority": str(priority)}, gateway.stats()["queue_depth_by_priority"].get(priority, 0))
+        for priority in sorted(set(NODE_PRIORITIES.values()) | set(gateway.stats()["queue_depth_by_priority"]))
+    ],
+)
@@ -0,0 +1,247 @@
+"""
+Timeouts, retries and hedged requests for LLM calls, configured per graph node.
+
+`ResilientLLM` wraps the chat model (outside the gateway, so every retry or
+hedge waits for its own slot). For each call it looks up the `CallPolicy` of the
+calling node and:
+
+- gives the whole attempt `timeout` seconds;
+- retries transient failures (timeouts, connection errors, 429/5xx/overloaded)
+  with exponential backoff and jitter, up to `retries` times;
+- when `hedge` is on, fires a second identical call if the first has not
+  answered after the node's observed p95 latency (`hedge_after` until enough
+  samples exist) and takes whichever finishes first.
+
+Calls that still fail raise `LLMUnavailable`, which the API maps to a 503.
+Hedging duplicates streamed tokens, so it is only enabled for silent nodes. For
+the same reason an attempt that has already streamed text is never retried
+(nor handed to a fallback model): its tokens reached `/chat/stream` clients, and
+a second answer would be appended to the first.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from functools import cache
+from typing import Any, Awaitable, Callable
+
+from telemetry import metrics
+
+TRANSIENT_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+TRANSIENT_ERROR_NAMES = {"APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError", "OverloadedError"}
+
+
+class LLMUnavailable(Exception):
+    """The model did not answer within the node's timeout and retry budget."""
+
+    def __init__(self, node: str | None, cause: BaseException, streamed: bool = False):
+        super().__init__(f"LLM call for {node or 'unknown node'} failed: {cause!r}")
+        self.node = node
+        self.cause = cause
+        # Part of the answer was already streamed, so it must not be asked for again.
+        self.streamed = streamed
+
+
+@dataclass(frozen=True)
+class CallPolicy:
+    timeout: float | None = 60.0
+    retries: int = 2
+    backoff: float = 0.5
+    max_backoff: float = 8.0
+    hedge: bool = False
+    hedge_after: float = 1.5
+
+
+DEFAULT_POLICY = CallPolicy()
+NODE_POLICIES = {
+    "planner": CallPolicy(timeout=10.0, retries=2, hedge=True, hedge_after=1.5),
+    "context": CallPolicy(timeout=30.0, retries=1),
+    "LeetCode Question": CallPolicy(timeout=30.0),
+    "Asking user for programming language": CallPolicy(timeout=30.0),
+    "Code the solution as per user req/code correction": CallPolicy(timeout=120.0),
+    "Code draft - brute force": CallPolicy(timeout=90.0),
+    "Code draft - optimized": CallPolicy(timeout=90.0),
+    "Verify code": CallPolicy(timeout=60.0, retries=1),
+    "User code correction": CallPolicy(timeout=120.0),
+    "User solution correction": CallPolicy(timeout=120.0),
+}
+
+
+def calling_node(config: Any) -> str | None:
+    """Graph node making the call, from the explicit or the inherited run config."""
+    # Imported here so the API can import this module without loading LangChain.
+    from langchain_core.runnables.config import ensure_config
+
+    return ensure_config(config).get("metadata", {}).get("langgraph_node")
+
+
+@cache
+def _token_watch_class() -> type:
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class TokenWatch(BaseCallbackHandler):
+        """Records whether the model streamed any text during one call."""
+
+        run_inline = True
+        streamed = False
+
+        def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+            if token:
+                self.streamed = True
+
+    return TokenWatch
+
+
+def is_transient(exc: BaseException) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    if getattr(exc, "status_code", None) in TRANSIENT_STATUS_CODES:
+        return True
+    return type(exc).__name__ in TRANSIENT_ERROR_NAMES
+
+
+class CallStats:
+    """Per-node latency samples (for hedging) and retry/timeout/hedge/fallback counters."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._latencies: dict[str | None, deque[float]] = {}
+        self._window = window
+        self.retries: Counter[str | None] = Counter()
+        self.timeouts: Counter[str | None] = Counter()
+        self.hedges: Counter[str | None] = Counter()
+        self.hedge_wins: Counter[str | None] = Counter()
+        self.failures: Counter[str | None] = Counter()
+        self.fallbacks: Counter[str | None] = Counter()
+
+    def observe(self, node: str | None, seconds: float) -> None:
+        self._latencies.setdefault(node, deque(maxlen=self._window)).append(seconds)
+
+    def p95(self, node: str | None) -> float | None:
+        samples = self._latencies.get(node)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def as_dict(self) -> dict[str, dict[str, Any]]:
+        nodes = set(self._latencies) | set(self.retries) | set(self.timeouts) | set(self.hedges) | set(self.failures) | set(self.fallbacks)
+        return {
+            str(node): {
+                "p95_seconds": self.p95(node),
+                "retries": self.retries[node],
+                "timeouts": self.timeouts[node],
+                "hedges": self.hedges[node],
+                "hedge_wins": self.hedge_wins[node],
+                "failures": self.failures[node],
+                "fallbacks": self.fallbacks[node],
+            }
+            for node in sorted(nodes, key=str)
+        }
+
+
+class ResilientLLM:
+    """Chat model wrapper applying the calling node's `CallPolicy` to `ainvoke`."""
+
+    def __init__(self, llm: Any, policies: dict[str, CallPolicy] | None = None, stats: CallStats | None = None,
+                 max_retries: int | None = None):
+        self.llm = llm
+        self.policies = NODE_POLICIES if policies is None else policies
+        self.stats = stats if stats is not None else CallStats()
+        # Caps every policy's `retries`; 0 for a primary model that has a fallback.
+        self.max_retries = max_retries
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> ResilientLLM:
+        return ResilientLLM(self.llm.with_structured_output(schema, **kwargs), self.policies, self.stats, self.max_retries)
+
+    def single_attempt(self) -> ResilientLLM:
+        """The same model without retries (timeout and hedging still apply)."""
+        return ResilientLLM(self.llm, self.policies, self.stats, max_retries=0)
+
+    async def _timed(self, node: str | None, call: Callable[[], Awaitable[Any]]) -> Any:
+        started = time.monotonic()
+        result = await call()
+        self.stats.observe(node, time.monotonic() - started)
+        return result
+
+    async def _hedged(self, node: str | None, delay: float, call: Callable[[], Awaitable[Any]]) -> Any:
+        first = asyncio.ensure_future(self._timed(node, call))
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+            if done:
+                return first.result()
+
+            self.stats.hedges[node] += 1
+            second = asyncio.ensure_future(self._timed(node, call))
+            tasks.append(second)
+            pending = {first, second}
+            error: BaseException | None = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.stats.hedge_wins[node] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Also on timeout or cancellation, so no call outlives this attempt.
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def ainvoke(self, messages: Any, config: Any = None, **kwargs: Any) -> Any:
+        from langchain_core.runnables.config import ensure_config, merge_configs
+
+        node = calling_node(config)
+        policy = self.policies.get(node, DEFAULT_POLICY)
+        watch = _token_watch_class()()
+        config = merge_configs(ensure_config(config), {"callbacks": [watch]})
+
+        def call() -> Awaitable[Any]:
+            return self.llm.ainvoke(messages, config, **kwargs)
+
+        retries = policy.retries if self.max_retries is None else min(policy.retries, self.max_retries)
+        for attempt in range(retries + 1):
+            try:
+                if policy.hedge:
+                    attempt_call = self._hedged(node, self.stats.p95(node) or policy.hedge_after, call)
+                else:
+                    attempt_call = self._timed(node, call)
+                return await asyncio.wait_for(attempt_call, policy.timeout)
+            except Exception as exc:
+                if isinstance(exc, asyncio.TimeoutError):
+                    self.stats.timeouts[node] += 1
+                if not is_transient(exc):
+                    raise
+                if watch.streamed:
+                    self.stats.failures[node] += 1
+                    raise LLMUnavailable(node, exc, streamed=True) from exc
+                if attempt == retries:
+                    self.stats.failures[node] += 1
+                    raise LLMUnavailable(node, exc) from exc
+                self.stats.retries[node] += 1
+                delay = min(policy.max_backoff, policy.backoff * 2 ** attempt)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.llm, name)
+
+
+call_stats = CallStats()
+
+metrics.collector(
+    "leetcode_llm_call_events_total", "counter", "Retries, timeouts, hedges, hedge wins, failures and fallbacks by node.",
+    lambda: [
+        ({"node": node, "event": event}, value)
+        for node, row in call_stats.as_dict().items()
+        for event, value in row.items()
+        if event != "p95_seconds"
+    ],
+)
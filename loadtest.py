@@ -0,0 +1,571 @@
+"""
+Offline end-to-end load test of the FastAPI app.
+
+Drives `main.app` in-process over ASGI (no sockets, no API key) with many
+virtual users, each creating a session, pinning a LeetCode question and
+chatting for several turns through `/chat` and `/chat/stream`. Every LLM call
+goes to `FakeChatModel`, which models time-to-first-token as a log-normal
+distribution, streams tokens at a fixed rate and fails a configurable share of
+calls with a transient provider error, so the real graph, gateway, retry
+policies and session layer are all exercised.
+
+The report (printed, and written as JSON with --output) has p50/p95/p99
+latency per endpoint, time to the first streamed event and token, throughput, errors,
+event-loop lag and memory per session. --max-* options turn it into a CI gate:
+
+    python loadtest.py --users 50 --turns 5 --output loadtest.json --max-p95-ms 4000
+
+--workers runs the same users over HTTP against the production server,
+`gunicorn -c gunicorn.conf.py` with 1..N workers, so the shipped config and its
+store defaults (SQLite sessions and graph checkpoints) are what gets tested.
+Connections are not kept alive, so consecutive requests of a session land on
+different workers (no session affinity); the report has throughput, speedup,
+scaling efficiency and requests served per worker for each count.
+With near-instant model replies the workers are CPU-bound, which is what
+multiple workers help with:
+
+    python loadtest.py --workers 1,2,4 --users 64 --ttft-median 0 --tokens-per-second 1e6 --min-efficiency 0.8
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import json
+import math
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from functools import partial
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+# (text, intended message type); the fake planner answers with the intended type.
+TURNS = [
+    ("What is this question asking exactly?", "Question explanation"),
+    ("Can you walk me through how to think about solving it?", "Solution explanation"),
+    ("I think we can sort the array and use two pointers, is that right?", "User explanation correction"),
+    ("Please write the optimized solution in Python.", "Code the solution as per user req/code correction"),
+    ("Write the code for this.", "Asking user for programming language"),
+    ("```python\ndef solve(nums):\n    return nums[0]\n```\nThis fails on the second example, can you fix it?", "User code correction"),
+    ("```python\ndef solve(nums):\n    return sorted(nums)\n```\nCan you review my solution?", "User solution correction"),
+]
+# Longer replies for nodes that write code or full explanations.
+OUTPUT_TOKENS = {
+    "Code the solution as per user req/code correction": (300, 900),
+    "User code correction": (250, 700),
+    "User solution correction": (200, 600),
+    "Solution explanation": (250, 700),
+}
+DEFAULT_OUTPUT_TOKENS = (60, 300)
+
+
+class OverloadedError(Exception):
+    """Stand-in for the provider's transient 529 error."""
+
+    status_code = 529
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model with modelled latency, streaming and error rate."""
+
+    ttft_median: float = 0.4
+    ttft_sigma: float = 0.5
+    tokens_per_second: float = 80.0
+    error_rate: float = 0.0
+    seed: int = 0
+    labels: dict[str, str] = {}
+
+    def model_post_init(self, _context: Any) -> None:
+        self._rng = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-latency"
+
+    def _ttft(self) -> float:
+        return self.ttft_median * math.exp(self._rng.gauss(0, self.ttft_sigma))
+
+    def _maybe_fail(self) -> None:
+        if self._rng.random() < self.error_rate:
+            raise OverloadedError("overloaded")
+
+    def _usage(self, messages: list[BaseMessage], output_tokens: int) -> dict:
+        input_tokens = sum(len(str(m.content)) for m in messages) // 4 + 1
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def _reply_tokens(self, node: str | None) -> list[str]:
+        low, high = OUTPUT_TOKENS.get(node or "", DEFAULT_OUTPUT_TOKENS)
+        return [f"tok{i} " for i in range(self._rng.randint(low, high))]
+
+    def _result(self, messages: list[BaseMessage], tokens: list[str]) -> ChatResult:
+        message = AIMessage(content="".join(tokens), usage_metadata=self._usage(messages, len(tokens)),
+                            response_metadata={"model_name": "fake"})
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        node = (run_manager.metadata or {}).get("langgraph_node") if run_manager else None
+        tokens = self._reply_tokens(node)
+        time.sleep(self._ttft() + len(tokens) / self.tokens_per_second)
+        self._maybe_fail()
+        return self._result(messages, tokens)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        node = (run_manager.metadata or {}).get("langgraph_node") if run_manager else None
+        tokens = self._reply_tokens(node)
+        await asyncio.sleep(self._ttft() + len(tokens) / self.tokens_per_second)
+        self._maybe_fail()
+        return self._result(messages, tokens)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        node = (run_manager.metadata or {}).get("langgraph_node") if run_manager else None
+        tokens = self._reply_tokens(node)
+        await asyncio.sleep(self._ttft())
+        self._maybe_fail()
+        for token in tokens:
+            await asyncio.sleep(1 / self.tokens_per_second)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content="", usage_metadata=self._usage(messages, len(tokens)), response_metadata={"model_name": "fake"}))
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> RunnableLambda:
+        """Planner classification: short latency, answers with the turn's intended type."""
+
+        async def classify(messages: Any) -> Any:
+            await asyncio.sleep(self._ttft() / 2)
+            self._maybe_fail()
+            last = messages[-1]
+            text = last["content"] if isinstance(last, dict) else str(last.content)
+            return schema(message_type=self.labels.get(text, "Question explanation"))
+
+        return RunnableLambda(classify)
+
+
+@dataclass
+class Response:
+    status: int
+    body: bytes
+    seconds: float
+    first_chunk_seconds: float | None = None
+    first_token_seconds: float | None = None
+
+
+async def asgi_request(app: Any, method: str, path: str, headers: dict[str, str] | None = None, body: Any = None) -> Response:
+    """Minimal in-process ASGI client that timestamps the first body chunk and the first token event."""
+    payload = json.dumps(body).encode() if body is not None else b""
+    raw_headers = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    if body is not None:
+        raw_headers.append((b"content-type", b"application/json"))
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": raw_headers, "client": ("loadtest", 1), "server": ("app", 80),
+    }
+    finished = asyncio.Event()
+    sent_body = False
+    status, chunks, first_chunk, first_token = 500, [], None, None
+    started = time.perf_counter()
+
+    async def receive() -> dict:
+        nonlocal sent_body
+        if not sent_body:
+            sent_body = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict) -> None:
+        nonlocal status, first_chunk, first_token
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            if message.get("body"):
+                if first_chunk is None:
+                    first_chunk = time.perf_counter() - started
+                if first_token is None and b'"event": "token"' in message["body"]:
+                    first_token = time.perf_counter() - started
+                chunks.append(message["body"])
+            if not message.get("more_body"):
+                finished.set()
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        finished.set()
+    return Response(status, b"".join(chunks), time.perf_counter() - started, first_chunk, first_token)
+
+
+def percentiles(samples: list[float]) -> dict[str, float | None]:
+    if not samples:
+        return {"count": 0, "p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+    return {"count": len(ordered), "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "max_ms": round(ordered[-1] * 1000, 2)}
+
+
+@dataclass
+class LoadConfig:
+    users: int = 20
+    turns: int = 5
+    stream_share: float = 0.5
+    ttft_median: float = 0.4
+    ttft_sigma: float = 0.5
+    tokens_per_second: float = 80.0
+    error_rate: float = 0.0
+    llm_concurrency: int = 16
+    memory_sessions: int = 50
+    seed: int = 7
+
+
+@dataclass
+class Collected:
+    latencies: dict[str, list[float]] = field(default_factory=dict)
+    first_event: list[float] = field(default_factory=list)
+    first_token: list[float] = field(default_factory=list)
+    errors: dict[str, int] = field(default_factory=dict)
+
+    def add(self, endpoint: str, response: Response) -> None:
+        self.latencies.setdefault(endpoint, []).append(response.seconds)
+        if response.status >= 400 or b'"event": "error"' in response.body:
+            key = f"{endpoint} {response.status}"
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+
+async def _loop_lag(samples: list[float], stop: asyncio.Event, interval: float = 0.01) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, time.perf_counter() - started - interval))
+
+
+@contextmanager
+def _env_defaults(**defaults: str) -> Iterator[None]:
+    """Environment variables set to `defaults` unless already set, restored on exit."""
+    added = {name: value for name, value in defaults.items() if name not in os.environ}
+    os.environ.update(added)
+    try:
+        yield
+    finally:
+        for name in added:
+            os.environ.pop(name, None)
+
+
+def load_app(config: LoadConfig, model: FakeChatModel) -> Any:
+    """`main`, with a freshly built graph whose every model is `model`."""
+    for module in ("checkpoint_store", "ai", "chat_service"):
+        sys.modules.pop(module, None)
+
+    import ai
+    from llm_gateway import LLMGateway
+    from registry import ModelRegistry
+
+    ai.default_registry = ModelRegistry(lambda _name: model)
+    ai.default_gateway = LLMGateway(max_concurrency=config.llm_concurrency)
+    # Cached replies would hide the modelled latency.
+    ai.response_cache = None
+    import chat_service  # noqa: F401  (builds the graph from the registry above)
+    import main
+
+    # The stack is already loaded; there is nothing to warm up.
+    main.app.state.warm_up = False
+    return main
+
+
+def _fake_model(config: LoadConfig) -> FakeChatModel:
+    return FakeChatModel(
+        ttft_median=config.ttft_median, ttft_sigma=config.ttft_sigma, tokens_per_second=config.tokens_per_second,
+        error_rate=config.error_rate, seed=config.seed, labels={text: label for text, label in TURNS},
+    )
+
+
+def create_app() -> Any:
+    """App factory for `gunicorn "loadtest:create_app()"`: `main.app` on the fake
+    model, configured by LOADTEST_CONFIG (JSON of `LoadConfig` fields). Responses
+    carry the serving worker's pid in `X-Worker-Pid`."""
+    config = LoadConfig(**json.loads(os.getenv("LOADTEST_CONFIG", "{}")))
+    app = load_app(config, _fake_model(config)).app
+
+    @app.middleware("http")
+    async def worker_pid(request: Any, call_next: Callable[[Any], Awaitable[Any]]) -> Any:
+        response = await call_next(request)
+        response.headers["X-Worker-Pid"] = str(os.getpid())
+        return response
+
+    return app
+
+
+Request = Callable[..., Awaitable[Response]]
+
+
+async def _user(request: Request, config: LoadConfig, rng: random.Random, collected: Collected, user: int) -> None:
+    created = await request("POST", f"/create_session/user{user}")
+    collected.add("create_session", created)
+    if created.status != 200:
+        return
+    session = json.loads(created.body)
+    headers = {"X-Session-ID": session["session_id"], "X-Session-Auth": session["auth_token"]}
+
+    # Mostly catalog problems (answered locally); some unknown numbers go to the model.
+    number = rng.choice([1, 3, 20, 53, 121, 217, 704, 4000 + user])
+    collected.add("questions", await request("POST", "/questions", headers, {"lc_question_number": number}))
+
+    for _ in range(config.turns):
+        text, _label = rng.choice(TURNS)
+        if rng.random() < config.stream_share:
+            response = await request("POST", "/chat/stream", headers, {"text": text})
+            collected.add("chat_stream", response)
+            if response.first_chunk_seconds is not None:
+                collected.first_event.append(response.first_chunk_seconds)
+            if response.first_token_seconds is not None:
+                collected.first_token.append(response.first_token_seconds)
+        else:
+            collected.add("chat", await request("POST", "/chat", headers, {"text": text}))
+
+
+async def _memory_per_session(main: Any, sessions: int, turns: int) -> float:
+    """Traced bytes retained per session after `sessions` short conversations."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for user in range(sessions):
+        created = json.loads((await asgi_request(main.app, "POST", f"/create_session/mem{user}")).body)
+        headers = {"X-Session-ID": created["session_id"], "X-Session-Auth": created["auth_token"]}
+        await asgi_request(main.app, "POST", "/questions", headers, {"lc_question_number": 1})
+        for turn in range(turns):
+            await asgi_request(main.app, "POST", "/chat", headers, {"text": TURNS[turn % len(TURNS)][0]})
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / max(1, sessions)
+
+
+async def run_load(config: LoadConfig) -> dict:
+    model = _fake_model(config)
+    with _env_defaults(SESSION_BACKEND="memory", GRAPH_CHECKPOINTER="memory"):
+        main = load_app(config, model)
+    rng = random.Random(config.seed)
+    collected = Collected()
+    lag: list[float] = []
+    stop = asyncio.Event()
+
+    async with main.app.router.lifespan_context(main.app):
+        monitor = asyncio.create_task(_loop_lag(lag, stop))
+        started = time.perf_counter()
+        request = partial(asgi_request, main.app)
+        await asyncio.gather(*(_user(request, config, rng, collected, user) for user in range(config.users)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await monitor
+
+        # Memory is measured separately, with instant model replies, so tracing
+        # doesn't distort the latency numbers above.
+        model.ttft_median, model.tokens_per_second, model.error_rate = 0.0, 1e9, 0.0
+        memory = await _memory_per_session(main, config.memory_sessions, config.turns)
+
+    turns = sum(len(collected.latencies.get(name, [])) for name in ("chat", "chat_stream"))
+    requests = sum(len(samples) for samples in collected.latencies.values())
+    return {
+        "config": asdict(config),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput": {
+            "requests_per_sec": round(requests / elapsed, 2),
+            "turns_per_sec": round(turns / elapsed, 2),
+        },
+        "latency": {endpoint: percentiles(samples) for endpoint, samples in sorted(collected.latencies.items())},
+        # Time to the message_type event (planner done) and to the first reply token.
+        "stream_first_event": percentiles(collected.first_event),
+        "stream_first_token": percentiles(collected.first_token),
+        "errors": collected.errors,
+        "error_rate": round(sum(collected.errors.values()) / max(1, requests), 4),
+        "event_loop_lag": percentiles(lag),
+        "memory_per_session_bytes": round(memory),
+    }
+
+
+class HTTPClient:
+    """Sends requests to one server over HTTP, counting them per serving worker."""
+
+    def __init__(self, client: Any, url: str):
+        self.client = client
+        self.url = url
+        self.served: Counter[str] = Counter()
+
+    async def __call__(self, method: str, path: str, headers: dict[str, str] | None = None, body: Any = None) -> Response:
+        started = time.perf_counter()
+        chunks, first_chunk, first_token = [], None, None
+        async with self.client.stream(method, self.url + path, headers=headers, json=body) as response:
+            self.served[response.headers.get("x-worker-pid", "?")] += 1
+            async for chunk in response.aiter_bytes():
+                if first_chunk is None:
+                    first_chunk = time.perf_counter() - started
+                if first_token is None and b'"event": "token"' in chunk:
+                    first_token = time.perf_counter() - started
+                chunks.append(chunk)
+        return Response(response.status_code, b"".join(chunks), time.perf_counter() - started, first_chunk, first_token)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def _server(config: LoadConfig, workers: int, directory: str) -> Iterator[str]:
+    """The fake-model app under `gunicorn -c gunicorn.conf.py` with `workers` workers.
+
+    Store settings are left to the shipped config and app defaults; relative
+    database paths resolve in `directory`.
+    """
+    repo = os.path.dirname(os.path.abspath(__file__))
+    port = _free_port()
+    stores = {"SESSION_BACKEND", "SESSION_SQLITE_PATH", "GRAPH_CHECKPOINTER", "GRAPH_CHECKPOINT_SQLITE_PATH"}
+    env = {name: value for name, value in os.environ.items() if name not in stores}
+    env.update({
+        "PYTHONPATH": os.pathsep.join(filter(None, [repo, os.getenv("PYTHONPATH")])),
+        "WEB_CONCURRENCY": str(workers),
+        "PORT": str(port),
+        "LOADTEST_CONFIG": json.dumps(asdict(config)),
+        "CODE_VERIFICATION": "off",
+    })
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", os.path.join(repo, "gunicorn.conf.py"), "loadtest:create_app()"],
+        cwd=directory, env=env, stdout=subprocess.DEVNULL,
+    )
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        process.wait()
+
+
+async def _wait_ready(client: Any, url: str, timeout: float = 120.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if (await client.get(url + "/readyz")).status_code == 200:
+                return
+        except Exception:
+            pass
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{url} did not become ready")
+        await asyncio.sleep(0.2)
+
+
+async def run_scaling(config: LoadConfig, worker_counts: list[int]) -> dict:
+    """Throughput of the same load against gunicorn with each number of workers."""
+    import httpx
+
+    rows = []
+    for count in worker_counts:
+        with tempfile.TemporaryDirectory() as directory, _server(config, count, directory) as url:
+            # A new connection per request lets gunicorn hand each one to any worker.
+            limits = httpx.Limits(max_connections=config.users * 2, max_keepalive_connections=0)
+            async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+                await _wait_ready(client, url)
+                request = HTTPClient(client, url)
+                collected = Collected()
+                rng = random.Random(config.seed)
+                started = time.perf_counter()
+                await asyncio.gather(*(_user(request, config, rng, collected, user) for user in range(config.users)))
+                elapsed = time.perf_counter() - started
+        turns = collected.latencies.get("chat", []) + collected.latencies.get("chat_stream", [])
+        rows.append({
+            "workers": count,
+            "elapsed_seconds": round(elapsed, 3),
+            "turns_per_sec": round(len(turns) / elapsed, 2),
+            "turn_latency": percentiles(turns),
+            "errors": collected.errors,
+            "requests_per_worker": sorted(request.served.values()),
+        })
+
+    base = rows[0]
+    for row in rows:
+        row["speedup"] = round(row["turns_per_sec"] / base["turns_per_sec"], 2) if base["turns_per_sec"] else None
+        row["efficiency"] = round(row["speedup"] * base["workers"] / row["workers"], 2) if row["speedup"] else None
+    return {"config": asdict(config), "cpus": os.cpu_count(), "scaling": rows}
+
+
+def check(report: dict, max_p95_ms: float | None, max_error_rate: float | None, max_loop_lag_ms: float | None) -> list[str]:
+    """Budget violations in `report`; empty when it passes."""
+    failures = []
+    if max_p95_ms is not None:
+        for endpoint, row in report["latency"].items():
+            if row["p95_ms"] is not None and row["p95_ms"] > max_p95_ms:
+                failures.append(f"{endpoint} p95 {row['p95_ms']} ms > {max_p95_ms} ms")
+    if max_error_rate is not None and report["error_rate"] > max_error_rate:
+        failures.append(f"error rate {report['error_rate']} > {max_error_rate}")
+    lag_p99 = report["event_loop_lag"]["p99_ms"]
+    if max_loop_lag_ms is not None and lag_p99 is not None and lag_p99 > max_loop_lag_ms:
+        failures.append(f"event loop lag p99 {lag_p99} ms > {max_loop_lag_ms} ms")
+    return failures
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    defaults = LoadConfig()
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument("--turns", type=int, default=defaults.turns, help="chat turns per user")
+    parser.add_argument("--stream-share", type=float, default=defaults.stream_share, help="share of turns sent to /chat/stream")
+    parser.add_argument("--ttft-median", type=float, default=defaults.ttft_median, help="median seconds to first token")
+    parser.add_argument("--ttft-sigma", type=float, default=defaults.ttft_sigma, help="log-normal sigma of time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="share of LLM calls failing with a transient error")
+    parser.add_argument("--llm-concurrency", type=int, default=defaults.llm_concurrency)
+    parser.add_argument("--memory-sessions", type=int, default=defaults.memory_sessions)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--max-p95-ms", type=float)
+    parser.add_argument("--max-error-rate", type=float)
+    parser.add_argument("--max-loop-lag-ms", type=float)
+    parser.add_argument("--workers", help="comma-separated server process counts, e.g. 1,2,4 (HTTP scaling run)")
+    parser.add_argument("--min-efficiency", type=float, help="with --workers: fail below this scaling efficiency")
+    args = parser.parse_args(argv)
+
+    config = LoadConfig(**{name: getattr(args, name) for name in asdict(defaults)})
+    if args.workers:
+        report = asyncio.run(run_scaling(config, [int(count) for count in args.workers.split(",")]))
+        failures = [
+            f"{row['workers']} workers: efficiency {row['efficiency']} < {args.min_efficiency}"
+            for row in report["scaling"]
+            if args.min_efficiency is not None and (row["efficiency"] or 0) < args.min_efficiency
+        ] + [f"{row['workers']} workers: errors {row['errors']}" for row in report["scaling"] if row["errors"]]
+        report["failures"] = failures
+        if args.output:
+            with open(args.output, "w") as handle:
+                json.dump(report, handle, indent=2)
+        print(json.dumps(report["scaling"], indent=2))
+        return 1 if failures else 0
+    report = asyncio.run(run_load(config))
+    failures = check(report, args.max_p95_ms, args.max_error_rate, args.max_loop_lag_ms)
+    report["failures"] = failures
+
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+    print(json.dumps({key: report[key] for key in report if key != "config"}, indent=2))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,117 @@
 from __future__ import annotations
 
+import asyncio
+import json
+import os
+import sys
+import time
+from contextlib import AsyncExitStack, asynccontextmanager, suppress
+from functools import partial
 from uuid import uuid4
 
 from fastapi import Depends, FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 
 from models import ChatIn, QuestionIn, SessionData
-from session_setup import (SessionContext, backend, cookie, get_session_context,)
-from chat_service import apply_user_message_and_get_reply
+from session_setup import (SessionContext, backend, cookie, get_session_context, reload_session, turns,)
+from catalog import catalog
+from llm_policy import LLMUnavailable, call_stats
+from session_store import run_sweeper
+from telemetry import TURNS, metrics, span
 
-app = FastAPI()
+# LangGraph / LangChain and the provider SDK take most of the startup time, so the
+# modules that pull them in (chat_service, ai, state_adapter, usage, llm_gateway)
+# are imported on first use, or ahead of time by the warm-up task below. Keep it
+# that way: test.py enforces an import-time budget for this module.
+
+
+# Reported by /readyz: "pending" until the warm-up task is done, then "ready" or
+# "failed"; "skipped" when STARTUP_WARM_UP=off (the stack loads on first use).
+warm_up_state: dict = {"status": "pending", "seconds": None, "error": None}
+
+
+def _load_llm_stack() -> None:
+    import ai
+    import chat_service  # noqa: F401  (builds the default graph)
+
+    ai.default_registry.warm()
+    if ai.default_sandbox is not None:
+        ai.default_sandbox.start()
+
+
+async def warm_up() -> None:
+    """Load the LLM stack in the background once the server is up."""
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(_load_llm_stack)
+    except Exception as exc:  # the first request will retry the import and report the error
+        print(f"warm-up failed: {exc!r}")
+        warm_up_state.update(status="failed", error=repr(exc))
+    else:
+        warm_up_state.update(status="ready")
+    warm_up_state["seconds"] = round(time.perf_counter() - started, 3)
+
+
+async def sweep_checkpoints(interval: float) -> None:
+    """Purge expired graph checkpoints once the LLM stack has loaded the checkpointer."""
+    while True:
+        await asyncio.sleep(interval)
+        store = sys.modules.get("checkpoint_store")
+        if store is None or store.default_checkpointer is None:
+            continue
+        try:
+            await store.default_checkpointer.sweep()
+        except Exception as exc:  # keep sweeping even if one pass fails
+            print(f"checkpoint sweep failed: {exc!r}")
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    interval = float(os.getenv("SESSION_SWEEP_INTERVAL", "300"))
+    sweepers = [asyncio.create_task(run_sweeper(backend, interval)), asyncio.create_task(sweep_checkpoints(interval))]
+    warming = None
+    # `app.state.warm_up` (set by loadtest) takes precedence over STARTUP_WARM_UP.
+    warm = getattr(_app.state, "warm_up", None)
+    if warm is None:
+        warm = os.getenv("STARTUP_WARM_UP", "on").lower() not in {"off", "0", "false"}
+    if not warm:
+        warm_up_state["status"] = "skipped"
+    else:
+        warm_up_state.update(status="pending", seconds=None, error=None)
+        warming = asyncio.create_task(warm_up())
+    yield
+    for sweeper in sweepers:
+        sweeper.cancel()
+        with suppress(asyncio.CancelledError):
+            await sweeper
+    if warming is not None:
+        await warming
+    ai = sys.modules.get("ai")
+    if ai is not None and ai.default_sandbox is not None:
+        ai.default_sandbox.close()
+    store = sys.modules.get("checkpoint_store")
+    if store is not None and store.default_checkpointer is not None and hasattr(store.default_checkpointer, "close"):
+        await store.default_checkpointer.close()
+    await backend.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.exception_handler(LLMUnavailable)
+async def llm_unavailable(_request, exc: LLMUnavailable):
+    # Nothing was saved for the turn, so the client can simply resend the message.
+    return JSONResponse(status_code=503, content={"detail": "The model is unavailable, please retry", "node": exc.node})
+
+
+async def save_turn(session: SessionContext, updated_session: SessionData, stored_count: int, endpoint: str) -> None:
+    """Persist a finished turn: append its new messages, then refresh the header."""
+    with span("session_save"):
+        await backend.append_messages(session.id, updated_session.messages[stored_count:])
+        await backend.update_header(session.id, updated_session)
+    TURNS.inc(endpoint=endpoint, message_type=updated_session.message_type or "")
 
 # Allow the extension (chrome-extension://*), localhost (common dev host), and any additional
 # origins to reach the backend. Credentials are enabled so the session cookie can flow.
@@ -46,29 +148,50 @@ async def get_questions(payload: QuestionIn | None = None, session: SessionConte
     if question_number is None:
         return {"ok": False, "error": "Missing lc_question_number"}
 
-    title_fragment = f" titled '{question_title}'" if question_title else ""
-    statement = (
-        f"LeetCode Question #{question_number}: {title_fragment}. "
-        f"Please identify and confirm the full title of this question, then gather and store all relevant details about it. "
-        f"In your acknowledgment, respond with: Title of the question and 'How may I assist you further?'"
-    )
+    from chat_service import apply_user_message_and_get_reply, record_turn
+    from usage import UsageRecorder
 
-    # Add the question statement into the chat state so future replies stay contextual.
-    updated_session, reply = await apply_user_message_and_get_reply(
-        session_id=session.id,
-        session_data=session.data,
-        user_text=statement,
-    )
+    async def turn():
+        session_data = await reload_session(session)
+        stored_count = len(session_data.messages)
+        usage = UsageRecorder()
+        problem = catalog.lookup(question_number, question_title)
+        if problem is not None:
+            # Known problem: pin the real statement and acknowledge without an LLM round-trip.
+            updated_session, reply = record_turn(
+                session_data,
+                user_text=problem.context_statement(),
+                reply=f"{problem.number}. {problem.title}\n\nHow may I assist you further?",
+                message_type="LeetCode Question",
+            )
+        else:
+            title_fragment = f" titled '{question_title}'" if question_title else ""
+            statement = (
+                f"LeetCode Question #{question_number}: {title_fragment}. "
+                f"Please identify and confirm the full title of this question, then gather and store all relevant details about it. "
+                f"In your acknowledgment, respond with: Title of the question and 'How may I assist you further?'"
+            )
 
-    await backend.update(session.id, updated_session)
+            # Add the question statement into the chat state so future replies stay contextual.
+            updated_session, reply = await apply_user_message_and_get_reply(
+                session_id=session.id,
+                session_data=session_data,
+                user_text=statement,
+                usage=usage,
+            )
 
-    return {
-        "ok": True,
-        "res": reply,
-        "message_count": len(updated_session.messages),
-        "message_type": updated_session.message_type,
-        "session_id": str(session.id),
-    }
+        await save_turn(session, updated_session, stored_count, "questions")
+
+        return {
+            "ok": True,
+            "res": reply,
+            "message_count": len(updated_session.messages),
+            "message_type": updated_session.message_type,
+            "session_id": str(session.id),
+            "usage": usage.as_dicts(),
+        }
+
+    return await turns.run(session.id, f"questions\x1f{question_number}\x1f{question_title or ''}", turn)
 
 @app.get("/whoami")
 async def whoami(session: SessionContext = Depends(get_session_context)):
@@ -76,25 +199,163 @@ async def whoami(session: SessionContext = Depends(get_session_context)):
 
 @app.post("/chat")
 async def chat(payload: ChatIn, session: SessionContext = Depends(get_session_context)):
-    updated_session, reply = await apply_user_message_and_get_reply(
-        session_id=session.id,
-        session_data=session.data,
-        user_text=payload.text,
-    )
-
-    await backend.update(session.id, updated_session)
-    print(f"message type: {updated_session.message_type}")
-    
-    return {
-        "reply": reply,
-        "username": updated_session.username,
-        "message_count": len(updated_session.messages),
-        "message_type": updated_session.message_type,
-    }
+    from chat_service import apply_user_message_and_get_reply
+    from usage import UsageRecorder
+
+    async def turn():
+        # Re-read under the session lock so a turn queued behind another sees its messages.
+        session_data = await reload_session(session)
+        stored_count = len(session_data.messages)
+        usage = UsageRecorder()
+        updated_session, reply = await apply_user_message_and_get_reply(
+            session_id=session.id,
+            session_data=session_data,
+            user_text=payload.text,
+            usage=usage,
+        )
+
+        await save_turn(session, updated_session, stored_count, "chat")
+
+        return {
+            "reply": reply,
+            "username": updated_session.username,
+            "message_count": len(updated_session.messages),
+            "message_type": updated_session.message_type,
+            "usage": usage.as_dicts(),
+        }
+
+    # Identical text submitted again while the first is still pending (double-click) shares its reply.
+    return await turns.run(session.id, f"chat\x1f{payload.text}", turn)
+
+
+@app.post("/chat/stream")
+async def chat_stream(payload: ChatIn, session: SessionContext = Depends(get_session_context)):
+    """Same as /chat, but streams NDJSON events as the reply is generated.
+
+    Events: {"event": "message_type", ...} as soon as the planner classifies the turn,
+    {"event": "token", ...} per chunk of the reply, and a final {"event": "done", ...}
+    once the turn has been persisted into the session. If the model stays unavailable
+    the stream ends with {"event": "error", "status": 503, ...} and nothing is saved.
+
+    Streams are serialized with other turns of the session but never coalesced.
+    If the stream is cut off before "done", /chat/resume finishes the turn.
+    """
+    from chat_service import stream_user_message_reply
+
+    return await stream_turn(session, "chat_stream", partial(stream_user_message_reply, user_text=payload.text))
+
+
+@app.post("/chat/resume")
+async def chat_resume(session: SessionContext = Depends(get_session_context)):
+    """Finish the session's last turn if its stream was cut off before "done".
+
+    The graph state is checkpointed after every step, so the turn continues from
+    the last completed step, with the same events as /chat/stream. Ends with
+    {"event": "error", "status": 409, ...} if there is no unfinished turn.
+    """
+    from chat_service import stream_resumed_reply
+
+    return await stream_turn(session, "chat_resume", stream_resumed_reply)
+
+
+async def stream_turn(session: SessionContext, endpoint: str, stream) -> StreamingResponse:
+    """NDJSON response for a streamed turn: `stream(session_id=..., session_data=...,
+    usage=...)` runs under the session lock and its "done" result is saved.
+
+    The lock is taken before the response starts, so a full queue (429) or a
+    session busy in another worker (409) is the response status rather than an
+    error inside a 200 stream; it is released once the stream ends or is dropped.
+    """
+    from usage import UsageRecorder
+
+    held = AsyncExitStack()
+    await held.enter_async_context(turns.lock(session.id))
+    try:
+        session_data = await reload_session(session)
+    except BaseException:
+        await held.aclose()
+        raise
+    usage = UsageRecorder()
+
+    async def events():
+        stored_count = len(session_data.messages)
+        try:
+            async for event, data in stream(session_id=session.id, session_data=session_data, usage=usage):
+                if event == "message_type":
+                    yield json.dumps({"event": "message_type", "message_type": data}) + "\n"
+                elif event == "token":
+                    yield json.dumps({"event": "token", "text": data}) + "\n"
+                elif event == "done" and data is None:
+                    yield json.dumps({"event": "error", "status": 409, "detail": "No unfinished turn to resume"}) + "\n"
+                elif event == "done":
+                    updated_session, reply = data
+                    await save_turn(session, updated_session, stored_count, endpoint)
+                    yield json.dumps({
+                        "event": "done",
+                        "reply": reply,
+                        "username": updated_session.username,
+                        "message_count": len(updated_session.messages),
+                        "message_type": updated_session.message_type,
+                        "usage": usage.as_dicts(),
+                    }) + "\n"
+        except LLMUnavailable as exc:
+            yield json.dumps({"event": "error", "status": 503, "detail": "The model is unavailable, please retry", "node": exc.node}) + "\n"
+        finally:
+            await held.aclose()
+
+    # The background task releases the lock if the client left before the stream started.
+    return StreamingResponse(events(), media_type="application/x-ndjson", background=BackgroundTask(held.aclose))
+
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the worker's event loop is serving requests."""
+    return {"ok": True, "pid": os.getpid()}
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: warm-up finished (or skipped) and the session store answers.
+
+    503 until then, so a load balancer only routes to warm workers. With a shared
+    session store (sqlite/redis) any ready worker can take any session's request.
+    """
+    checks = {"warm_up": dict(warm_up_state), "session_backend": "ok"}
+    try:
+        await asyncio.wait_for(backend.ping(), timeout=2.0)
+    except Exception as exc:
+        checks["session_backend"] = repr(exc)
+    ready = warm_up_state["status"] in {"ready", "skipped"} and checks["session_backend"] == "ok"
+    return JSONResponse(status_code=200 if ready else 503, content={"ready": ready, "pid": os.getpid(), **checks})
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint: span and LLM call latency histograms, token and cost
+    counters, turn counts, and gateway / call-policy / response-cache state.
+
+    Metrics are per worker process: under gunicorn each scrape reaches whichever
+    worker accepts it, so scrape every worker (or sum over `pid` from `/stats`)."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/stats")
+async def stats():
+    """LLM gateway load (calls in flight, queue depth, wait time) and per-node
+    latency, retry, timeout and hedging counters of the worker process `pid`."""
+    from llm_gateway import gateway
+
+    return {"pid": os.getpid(), "llm_gateway": gateway.stats(), "llm_calls": call_stats.as_dict()}
 
 
 @app.post("/delete_session")
 async def del_session(response: Response, session: SessionContext = Depends(get_session_context)):
+    from checkpoint_store import default_checkpointer
+    from state_adapter import forget_session
+
     await backend.delete(session.id)
+    forget_session(session.id)
+    if default_checkpointer is not None:
+        await default_checkpointer.adelete_thread(str(session.id))
     cookie.delete_from_response(response)
     return {"ok": True}
@@ -0,0 +1,103 @@
+"""
+Per-node model selection with fallback.
+
+Short, structured work (the 8-way planner label, summaries, question
+acknowledgments, asking for a language) runs on a fast, cheap model; writing
+and reviewing code and explaining solutions run on a stronger one. Each node
+has a `ModelChoice` with a fallback model that takes over as soon as one
+attempt of the primary times out or fails transiently: the primary is not
+retried, so a slow primary costs one timeout rather than timeout × attempts.
+The fallback keeps its full `llm_policy` retries.
+
+LLM_FAST_MODEL / LLM_STRONG_MODEL pick the two tiers; nodes not listed use the
+`model` passed to `build_graph`.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import Any
+
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables.config import ensure_config
+
+from llm_policy import CallStats, LLMUnavailable
+
+FAST_MODEL = os.getenv("LLM_FAST_MODEL", "claude-3-5-haiku-20241022")
+STRONG_MODEL = os.getenv("LLM_STRONG_MODEL", "claude-sonnet-4-20250514")
+
+
+@dataclass(frozen=True)
+class ModelChoice:
+    primary: str
+    fallback: str | None = None
+
+
+def default_node_models() -> dict[str, ModelChoice]:
+    fast = ModelChoice(FAST_MODEL, fallback=STRONG_MODEL)
+    strong = ModelChoice(STRONG_MODEL, fallback=FAST_MODEL)
+    return {
+        "planner": fast,
+        "context": fast,
+        "LeetCode Question": fast,
+        "Asking user for programming language": fast,
+        "Solution explanation": strong,
+        "User solution correction": strong,
+        "Code the solution as per user req/code correction": strong,
+        "Code draft - brute force": strong,
+        "Code draft - optimized": strong,
+        "Verify code": strong,
+        "User code correction": strong,
+    }
+
+
+class FallbackLLM:
+    """Calls `primary`, and `fallback` if the primary raises `LLMUnavailable`.
+
+    `primary` should make a single attempt (`ResilientLLM.single_attempt`).
+    Replies from the fallback carry `response_metadata["fallback"] = True`.
+    """
+
+    def __init__(self, primary: Any, fallback: Any, stats: CallStats | None = None):
+        self.primary = primary
+        self.fallback = fallback
+        self.stats = stats
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> FallbackLLM:
+        return FallbackLLM(
+            self.primary.with_structured_output(schema, **kwargs),
+            self.fallback.with_structured_output(schema, **kwargs),
+            self.stats,
+        )
+
+    async def ainvoke(self, messages: Any, config: Any = None, **kwargs: Any) -> Any:
+        try:
+            return await self.primary.ainvoke(messages, config, **kwargs)
+        except LLMUnavailable as exc:
+            if exc.streamed:  # the primary's partial answer was already sent
+                raise
+            if self.stats is not None:
+                self.stats.fallbacks[exc.node] += 1
+            reply = await self.fallback.ainvoke(messages, config, **kwargs)
+            if isinstance(reply, BaseMessage):
+                reply.response_metadata["fallback"] = True
+            return reply
+
+
+class TieredLLM:
+    """Dispatches each call to the model configured for the calling graph node."""
+
+    def __init__(self, routes: dict[str, Any], default: Any):
+        self.routes = routes
+        self.default = default
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> TieredLLM:
+        return TieredLLM(
+            {node: llm.with_structured_output(schema, **kwargs) for node, llm in self.routes.items()},
+            self.default.with_structured_output(schema, **kwargs),
+        )
+
+    async def ainvoke(self, messages: Any, config: Any = None, **kwargs: Any) -> Any:
+        node = ensure_config(config).get("metadata", {}).get("langgraph_node")
+        return await self.routes.get(node, self.default).ainvoke(messages, config, **kwargs)
@@ -2,8 +2,9 @@ from __future__ import annotations
 
 from datetime import datetime, timezone
 from typing import Literal
+from uuid import uuid4
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 
 Role = Literal["system", "user", "assistant"]
 
@@ -12,6 +13,8 @@ class StoredMessage(BaseModel):
     role: Role
     content: str
     ts: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    # Shared with the LangChain message built from it, so conversions can be cached.
+    id: str = Field(default_factory=lambda: uuid4().hex)
 
 
 class SessionData(BaseModel):
@@ -19,6 +22,11 @@ class SessionData(BaseModel):
     messages: list[StoredMessage] = Field(default_factory=list)
     message_type: str | None = None
     auth_token: str
+    summary: str | None = None
+    summarized_upto: int = 0
+    # Leading messages of the log already in the session's graph checkpoint
+    # (None until a turn has run on a checkpointed graph).
+    checkpointed_upto: int | None = None
 
 class QuestionIn(BaseModel):
     lc_question_number: int
@@ -26,3 +34,42 @@ class QuestionIn(BaseModel):
 
 class ChatIn(BaseModel):
     text: str
+
+
+class MessageClassifier(BaseModel):
+    message_type: Literal[
+        "LeetCode Question",
+        "Question explanation",
+        "Solution explanation",
+        "User explanation correction",
+        "User solution correction",
+        "Code the solution as per user req/code correction",
+        "Asking user for programming language",
+        "User code correction",
+    ] = Field(
+        ...,
+        description="Classify if the message requires based on the user's intent."
+    )
+
+    @field_validator("message_type", mode="before")
+    @classmethod
+    def normalize_message_type(cls, value: str) -> str:
+        """Normalize classifier output to the expected canonical label."""
+        if not isinstance(value, str):
+            raise TypeError("message_type must be a string")
+
+        normalized = value.strip().lower()
+        mapping = {
+            "leetcode question": "LeetCode Question",
+            "question explanation": "Question explanation",
+            "solution explanation": "Solution explanation",
+            "user explanation correction": "User explanation correction",
+            "user solution correction": "User solution correction",
+            "code the solution as per user req/code correction": "Code the solution as per user req/code correction",
+            "asking user for programming language": "Asking user for programming language",
+            "user code correction": "User code correction",
+        }
+        mapped = mapping.get(normalized)
+        if mapped:
+            return mapped
+        raise ValueError(f"Unexpected message_type: {value}")
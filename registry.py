@@ -0,0 +1,114 @@
+"""
+Shared, lazily created chat-model clients and compiled graphs.
+
+`ModelRegistry` hands out one `LazyChatModel` per model name, so every graph
+built from the same registry shares the provider client (and its HTTP
+connection pool). The client is only created on its first call, which keeps
+building a graph — and importing `ai` — free of provider SDK setup.
+
+Structured-output runnables are derived once per (model, schema) instead of on
+every planner call, and `ModelRegistry.graph` caches compiled graphs by their
+build configuration.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable, Hashable
+
+
+def _freeze(value: Any) -> Hashable:
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class _LazyStructured:
+    """`with_structured_output` of a `LazyChatModel`, derived on first call."""
+
+    def __init__(self, parent: LazyChatModel, schema: Any, kwargs: dict[str, Any]):
+        self._parent = parent
+        self._schema = schema
+        self._kwargs = kwargs
+        self._runnable: Any = None
+
+    @property
+    def runnable(self) -> Any:
+        if self._runnable is None:
+            self._runnable = self._parent.model.with_structured_output(self._schema, **self._kwargs)
+        return self._runnable
+
+    async def ainvoke(self, messages: Any, config: Any = None, **kwargs: Any) -> Any:
+        return await self.runnable.ainvoke(messages, config, **kwargs)
+
+
+class LazyChatModel:
+    """Chat model created by `factory(name)` the first time it is used."""
+
+    def __init__(self, name: str, factory: Callable[[str], Any]):
+        self.name = name
+        self._factory = factory
+        self._model: Any = None
+        self._structured: dict[Hashable, _LazyStructured] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def model(self) -> Any:
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._factory(self.name)
+        return self._model
+
+    @property
+    def initialized(self) -> bool:
+        return self._model is not None
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> _LazyStructured:
+        key = (schema, _freeze(kwargs))
+        with self._lock:
+            if key not in self._structured:
+                self._structured[key] = _LazyStructured(self, schema, kwargs)
+            return self._structured[key]
+
+    async def ainvoke(self, messages: Any, config: Any = None, **kwargs: Any) -> Any:
+        return await self.model.ainvoke(messages, config, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+
+class ModelRegistry:
+    def __init__(self, factory: Callable[[str], Any]):
+        self._factory = factory
+        self._clients: dict[str, LazyChatModel] = {}
+        self._graphs: dict[Hashable, Any] = {}
+        self._lock = threading.Lock()
+
+    def client(self, name: str) -> LazyChatModel:
+        with self._lock:
+            if name not in self._clients:
+                self._clients[name] = LazyChatModel(name, self._factory)
+            return self._clients[name]
+
+    def warm(self) -> None:
+        """Create every client handed out so far, e.g. from a startup warm-up task."""
+        with self._lock:
+            clients = list(self._clients.values())
+        for client in clients:
+            client.model
+
+    def graph(self, build: Callable[..., Any], **config: Any) -> Any:
+        """`build(**config)`, compiled once per distinct configuration."""
+        key = _freeze(config)
+        with self._lock:
+            cached = self._graphs.get(key)
+        if cached is not None:
+            return cached
+        compiled = build(registry=self, **config)
+        with self._lock:
+            return self._graphs.setdefault(key, compiled)
@@ -0,0 +1,169 @@
+"""
+Response cache for deterministic, question-level prompts.
+
+Many users open the same popular problems and ask the same first questions.
+When a turn has a *cold context* — the only earlier turn is the pinned LeetCode
+question — the reply depends only on (node, model, question number, user text),
+so it can be served from an on-disk SQLite cache instead of the LLM.
+
+Matching is lexical, not semantic: user text is normalised (case, punctuation,
+filler words) so trivially different phrasings share an entry, but paraphrases
+do not. That is exact for the hottest openers ("explain the question") and needs
+no embedding model or similarity threshold that could serve a wrong answer.
+Entries expire after `ttl_seconds` and the least recently used ones are evicted
+beyond `max_entries`. Replies are stored under the node's primary model; one
+produced by its fallback model is not stored.
+
+The SQLite file is shared by the workers of one machine; `RedisResponseCache`
+shares entries across instances (eviction is left to the server's maxmemory policy).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from langchain_core.messages import BaseMessage
+
+from context import pinned_question_span
+from intent import QUESTION_STATEMENT
+from session_store import RedisClient
+
+_QUESTION_NUMBER = re.compile(r"LeetCode Question #(\d+)")
+_FILLER = re.compile(r"\b(please|pls|can you|could you|would you|kindly|hey|hi|hello|thanks|thank you|me)\b")
+_NON_WORD = re.compile(r"[^a-z0-9#+ ]+")
+
+
+def normalize_text(text: str) -> str:
+    text = _NON_WORD.sub(" ", text.lower())
+    return " ".join(_FILLER.sub(" ", text).split())
+
+
+def cold_context_question(messages: list[BaseMessage]) -> int | None:
+    """Question number if the conversation is just the pinned question plus this turn."""
+    pinned = pinned_question_span(messages)
+    if pinned is None:
+        return None
+
+    humans = [i for i, m in enumerate(messages) if m.type == "human"]
+    last = humans[-1] if humans else None
+    if any(i not in (pinned[0], last) for i in humans):
+        return None
+
+    match = _QUESTION_NUMBER.match(str(messages[pinned[0]].content).strip())
+    return int(match.group(1)) if match else None
+
+
+class ResponseCache:
+    def __init__(self, path: str, ttl_seconds: float = 7 * 24 * 3600, max_entries: int = 10000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits: Counter[str] = Counter()
+        self.misses: Counter[str] = Counter()
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> ResponseCache | None:
+        """RESPONSE_CACHE_PATH (default response_cache.db), RESPONSE_CACHE_TTL_SECONDS,
+        RESPONSE_CACHE_MAX_ENTRIES; RESPONSE_CACHE=off disables caching and
+        RESPONSE_CACHE_URL=redis://... keeps the entries in Redis instead."""
+        if os.getenv("RESPONSE_CACHE", "on").lower() in {"off", "0", "false"}:
+            return None
+        if os.getenv("RESPONSE_CACHE_URL"):
+            return RedisResponseCache(
+                os.environ["RESPONSE_CACHE_URL"],
+                ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 7 * 24 * 3600)),
+            )
+        return cls(
+            os.getenv("RESPONSE_CACHE_PATH", "response_cache.db"),
+            ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 7 * 24 * 3600)),
+            max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000")),
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened lazily so importing the graph never touches the disk.
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, node TEXT NOT NULL, reply TEXT NOT NULL,"
+                " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses(accessed_at)")
+            self._conn = conn
+        return self._conn
+
+    def key_for(self, node: str, model: str, messages: list[BaseMessage]) -> str | None:
+        """Cache key for this turn, or None when its context is not cold."""
+        question = cold_context_question(messages)
+        if question is None:
+            return None
+        text = str(messages[-1].content)
+        # The /questions statement is itself the user text; key it on the number alone.
+        normalized = "" if QUESTION_STATEMENT.match(text) else normalize_text(text)
+        return hashlib.sha256(f"{node}\x1f{model}\x1f{question}\x1f{normalized}".encode()).hexdigest()
+
+    def _get(self, key: str) -> str | None:
+        with self._lock:
+            conn = self._connection()
+            now = time.time()
+            row = conn.execute(
+                "SELECT reply FROM responses WHERE key = ? AND created_at > ?", (key, now - self.ttl_seconds)
+            ).fetchone()
+            if row:
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0] if row else None
+
+    def _put(self, key: str, node: str, reply: str) -> None:
+        with self._lock:
+            conn = self._connection()
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, node, reply, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, node, reply, now, now),
+            )
+            conn.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl_seconds,))
+            conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    async def get(self, node: str, key: str) -> str | None:
+        reply = await asyncio.to_thread(self._get, key)
+        (self.hits if reply is not None else self.misses)[node] += 1
+        return reply
+
+    async def put(self, node: str, key: str, reply: str) -> None:
+        await asyncio.to_thread(self._put, key, node, reply)
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        nodes = set(self.hits) | set(self.misses)
+        return {node: {"hits": self.hits[node], "misses": self.misses[node]} for node in sorted(nodes)}
+
+
+class RedisResponseCache(ResponseCache):
+    """Same keys and stats, with entries kept in Redis under `prefix`."""
+
+    def __init__(self, url: str, ttl_seconds: float = 7 * 24 * 3600, prefix: str = "response:"):
+        super().__init__("", ttl_seconds=ttl_seconds)
+        self.client = RedisClient(url)
+        self.prefix = prefix
+
+    async def get(self, node: str, key: str) -> str | None:
+        reply = await self.client.execute("GET", self.prefix + key)
+        (self.hits if reply is not None else self.misses)[node] += 1
+        return reply.decode() if reply is not None else None
+
+    async def put(self, node: str, key: str, reply: str) -> None:
+        await self.client.execute("SET", self.prefix + key, reply, "EX", int(self.ttl_seconds))
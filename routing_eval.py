@@ -0,0 +1,256 @@
+"""
+Routing-quality evaluation of the planner against a labelled golden set.
+
+`data/routing_golden.jsonl` holds user messages (with the pinned question they
+were asked about) labelled with the expected `MessageClassifier` category. The
+evaluation classifies them the way the planner does — local fast path first,
+then the classifier prompt — and reports accuracy, a confusion matrix,
+per-label precision/recall and per-label classification latency.
+
+Model calls go through `ReplayLLM`, a record/replay cache keyed by a hash of the
+model name and the full prompt: a prompt edit or a model change is a miss and
+gets recorded, everything else replays for free with its recorded latency, so
+repeated runs are deterministic. The cassette is local (it needs a model API
+key to record), so the first run on a machine records every prompt the fast
+path does not answer.
+
+    python routing_eval.py                    # replay, recording misses
+    python routing_eval.py --mode replay      # recorded prompts only, no model calls
+    python routing_eval.py --model claude-haiku-4-5 --no-fast-path --output report.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any
+
+from classifier import BatchClassifier, classifier_messages
+from intent import DEFAULT_FAST_PATH_THRESHOLD, MESSAGE_TYPES, pre_classify
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "routing_golden.jsonl")
+CASSETTE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "routing_cassette.json")
+MODES = ("auto", "replay", "record")
+
+
+class CassetteMiss(Exception):
+    """Replay-only run reached a prompt that was never recorded."""
+
+
+@dataclass(frozen=True)
+class Example:
+    text: str
+    label: str
+    question: str | None = None
+
+
+def load_golden(path: str = GOLDEN_PATH) -> list[Example]:
+    with open(path) as handle:
+        rows = [json.loads(line) for line in handle if line.strip()]
+    examples = [Example(row["text"], row["label"], row.get("question")) for row in rows]
+    unknown = {example.label for example in examples} - set(MESSAGE_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown labels in {path}: {sorted(unknown)}")
+    return examples
+
+
+class ReplayLLM:
+    """Structured-output classifier calls served from a JSON cassette.
+
+    `mode` is "replay" (misses raise `CassetteMiss`), "record" (always call `llm`
+    and overwrite) or "auto" (replay hits, call and record misses).
+    """
+
+    def __init__(self, path: str, model: str, llm: Any = None, mode: str = "auto"):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        self.path = path
+        self.model = model
+        self.llm = llm
+        self.mode = mode
+        self.entries: dict[str, dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path) as handle:
+                self.entries = json.load(handle)
+        self.latencies: dict[str, float] = {}
+        self.stats: Counter[str] = Counter()
+        self._dirty = False
+
+    def key_for(self, messages: Any) -> str:
+        payload = json.dumps({"model": self.model, "messages": messages}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> Any:
+        from langchain_core.runnables import RunnableLambda
+
+        live = self.llm.with_structured_output(schema, **kwargs) if self.llm is not None else None
+
+        async def classify(messages: Any, config: Any = None) -> Any:
+            key = self.key_for(messages)
+            entry = self.entries.get(key)
+            if entry is not None and self.mode != "record":
+                self.stats["replayed"] += 1
+                self.latencies[key] = entry["latency_seconds"]
+                return schema(message_type=entry["message_type"])
+            if self.mode == "replay" or live is None:
+                self.stats["missed"] += 1
+                raise CassetteMiss(f"no recording for prompt {key[:12]}")
+
+            started = time.perf_counter()
+            result = await live.ainvoke(messages, config)
+            latency = time.perf_counter() - started
+            self.entries[key] = {"message_type": result.message_type, "latency_seconds": round(latency, 4)}
+            self.latencies[key] = latency
+            self.stats["recorded"] += 1
+            self._dirty = True
+            return result
+
+        return RunnableLambda(classify)
+
+    def save(self) -> None:
+        if self._dirty:
+            with open(self.path, "w") as handle:
+                json.dump(self.entries, handle, indent=1, sort_keys=True)
+                handle.write("\n")
+            self._dirty = False
+
+
+def _percentile_ms(samples: list[float], q: float) -> float | None:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+
+def _fast_path_seconds(text: str) -> float:
+    started = time.perf_counter()
+    pre_classify(text)
+    return time.perf_counter() - started
+
+
+async def evaluate(
+    examples: list[Example],
+    llm: ReplayLLM,
+    fast_path_threshold: float | None = DEFAULT_FAST_PATH_THRESHOLD,
+    concurrency: int = 8,
+) -> dict[str, Any]:
+    """Classify `examples` like the planner and score them against their labels."""
+    classifier = BatchClassifier(llm, model=llm.model, concurrency=concurrency, fast_path_threshold=fast_path_threshold)
+    results = await classifier.classify([(example.text, example.question) for example in examples])
+
+    confusion = {label: Counter() for label in MESSAGE_TYPES}
+    latencies: dict[str, list[float]] = {label: [] for label in MESSAGE_TYPES}
+    mistakes = []
+    for example, result in zip(examples, results):
+        predicted = result.message_type or "error"
+        confusion[example.label][predicted] += 1
+        if result.source == "fast_path":
+            latencies[example.label].append(_fast_path_seconds(example.text))
+        elif result.source == "llm":
+            latencies[example.label].append(llm.latencies[llm.key_for(classifier_messages(example.text, example.question))])
+        if predicted != example.label:
+            mistakes.append({"text": example.text[:120], "label": example.label, "predicted": predicted, "source": result.source})
+
+    correct = sum(confusion[label][label] for label in MESSAGE_TYPES)
+    predicted_totals = Counter()
+    for row in confusion.values():
+        predicted_totals.update(row)
+    per_label = {}
+    for label in MESSAGE_TYPES:
+        support = sum(confusion[label].values())
+        hits = confusion[label][label]
+        per_label[label] = {
+            "support": support,
+            "precision": round(hits / predicted_totals[label], 3) if predicted_totals[label] else None,
+            "recall": round(hits / support, 3) if support else None,
+            "p50_ms": _percentile_ms(latencies[label], 0.5),
+            "p95_ms": _percentile_ms(latencies[label], 0.95),
+        }
+
+    fast = [(example, result) for example, result in zip(examples, results) if result.source == "fast_path"]
+    return {
+        "examples": len(examples),
+        "accuracy": round(correct / len(examples), 4) if examples else None,
+        "fast_path": {
+            "threshold": fast_path_threshold,
+            "coverage": round(len(fast) / len(examples), 4) if examples else None,
+            "accuracy": round(sum(e.label == r.message_type for e, r in fast) / len(fast), 4) if fast else None,
+        },
+        "llm_calls": dict(llm.stats),
+        "errors": classifier.stats["error"],
+        "per_label": per_label,
+        "confusion": {label: dict(row) for label, row in confusion.items()},
+        "mistakes": mistakes,
+    }
+
+
+def format_report(report: dict[str, Any]) -> str:
+    labels = list(MESSAGE_TYPES)
+    columns = [str(i) for i in range(len(labels))] + ["err"]
+    lines = [
+        f"accuracy {report['accuracy']}  examples {report['examples']}  errors {report['errors']}",
+        f"fast path: coverage {report['fast_path']['coverage']}  accuracy {report['fast_path']['accuracy']}",
+        f"llm calls: {report['llm_calls']}",
+        "",
+        "confusion (rows: expected, columns: predicted)",
+        " " * 4 + "".join(f"{column:>5}" for column in columns),
+    ]
+    for i, label in enumerate(labels):
+        row = report["confusion"][label]
+        counts = [row.get(predicted, 0) for predicted in labels] + [row.get("error", 0)]
+        lines.append(f"{i:>4}" + "".join(f"{count:>5}" for count in counts))
+    lines += ["", f"{'':4}  {'label':50}{'n':>4}{'prec':>7}{'rec':>7}{'p50 ms':>10}{'p95 ms':>10}"]
+    for i, label in enumerate(labels):
+        row = report["per_label"][label]
+        lines.append(
+            f"{i:>4}  {label:50}{row['support']:>4}{row['precision'] if row['precision'] is not None else '-':>7}"
+            f"{row['recall'] if row['recall'] is not None else '-':>7}"
+            f"{row['p50_ms'] if row['p50_ms'] is not None else '-':>10}{row['p95_ms'] if row['p95_ms'] is not None else '-':>10}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    from model_tiers import FAST_MODEL
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--golden", default=GOLDEN_PATH)
+    parser.add_argument("--cassette", default=CASSETTE_PATH)
+    parser.add_argument("--mode", choices=MODES, default="auto")
+    parser.add_argument("--model", default=FAST_MODEL, help="classifier model (default: the planner's)")
+    parser.add_argument("--no-fast-path", action="store_true", help="evaluate the LLM classifier alone")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args(argv)
+
+    llm = None
+    if args.mode != "replay":
+        from dotenv import load_dotenv
+        from langchain.chat_models import init_chat_model
+
+        load_dotenv()
+        llm = init_chat_model(args.model)
+
+    replay = ReplayLLM(args.cassette, args.model, llm, args.mode)
+    threshold = None if args.no_fast_path else DEFAULT_FAST_PATH_THRESHOLD
+    try:
+        report = asyncio.run(evaluate(load_golden(args.golden), replay, threshold, args.concurrency))
+    finally:
+        replay.save()
+
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+    print(format_report(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
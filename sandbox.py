@@ -0,0 +1,431 @@
+"""
+Sandboxed execution of generated Python solutions against problem examples.
+
+`SandboxPool` keeps a few long-lived worker interpreters running (started with
+`-I`, an empty environment and an empty working directory, so no user
+site-packages, secrets from the server's environment or project files leak in). A
+check is sent to an idle worker, which forks a child for it: the child drops
+to hard resource limits (CPU seconds, address space, no file writes, no new
+processes), loses network access (a fresh network namespace where permitted,
+and an audit hook blocking sockets, subprocesses and writes in any case),
+runs the code against the examples and reports back through a pipe. Forking a
+warm worker takes a few milliseconds, against hundreds for a fresh interpreter
+per check; a crash, hang or memory blow-up only takes down the child.
+
+The same workers benchmark solutions: `benchmark` times one on synthetic inputs
+of doubling size, shaped like the examples, within a wall-clock budget.
+
+Standard library only: workers run this file directly.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import queue
+import re
+import select
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+_CODE_BLOCK = re.compile(r"```[ \t]*(python3?|py)?[ \t]*\n(.*?)```", re.DOTALL | re.IGNORECASE)
+_OTHER_LANGUAGE = re.compile(r"\b(public|private|func|fn|let|const|var|#include|std::)\b|;\s*$", re.MULTILINE)
+
+
+def extract_python_blocks(text: str) -> list[tuple[str, str]]:
+    """(label, code) for each fenced Python block; the label is the nearest
+    preceding "brute force"/"optimized" mention, if any."""
+    blocks = []
+    for match in _CODE_BLOCK.finditer(text):
+        code = match.group(2)
+        if not match.group(1) and ("def " not in code or _OTHER_LANGUAGE.search(code)):
+            continue  # unlabelled block that does not look like Python
+        before = text[max(0, match.start() - 300):match.start()].lower()
+        positions = {"Brute force": before.rfind("brute"), "Optimized": before.rfind("optimi")}
+        label = max(positions, key=positions.get) if max(positions.values()) >= 0 else f"Block {len(blocks) + 1}"
+        blocks.append((label, code))
+    return blocks
+
+
+@dataclass
+class CaseResult:
+    ok: bool
+    seconds: float = 0.0
+    got: str | None = None
+    error: str | None = None
+
+
+@dataclass
+class CheckResult:
+    passed: bool
+    cases: list[CaseResult] = field(default_factory=list)
+    error: str | None = None
+
+    @property
+    def runtime_ms(self) -> float:
+        return sum(case.seconds for case in self.cases) * 1000
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> CheckResult:
+        return cls(data["passed"], [CaseResult(**case) for case in data.get("cases", [])], data.get("error"))
+
+
+@dataclass
+class BenchResult:
+    """Best-of-three seconds per call and peak traced bytes at each input size."""
+
+    points: list[dict[str, float]] = field(default_factory=list)
+    stopped: str | None = None
+    error: str | None = None
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> BenchResult:
+        return cls(data.get("points", []), data.get("stopped"), data.get("error"))
+
+
+# ---- worker side -----------------------------------------------------------------
+
+_PRELUDE = (
+    "from typing import *\n"
+    "import collections, heapq, bisect, itertools, functools, math, string, re\n"
+    "from collections import Counter, defaultdict, deque, OrderedDict\n"
+    "from functools import lru_cache, cache\n"
+    "from heapq import heappush, heappop, heapify\n"
+    "from bisect import bisect_left, bisect_right\n"
+    "from math import inf\n"
+)
+_BLOCKED_EVENTS = ("socket.", "subprocess.", "os.system", "os.exec", "os.posix_spawn", "os.spawn", "os.fork",
+                   "os.kill", "os.remove", "os.rename", "os.rmdir", "os.unlink", "os.truncate", "os.chmod",
+                   "os.chown", "os.chflags", "os.link", "os.symlink", "os.mkdir", "os.mkfifo", "os.mknod",
+                   "os.utime", "os.setxattr", "os.removexattr", "shutil.", "ctypes.")
+# `open` and `os.open` both report their os-level flags; any of these means a write.
+_WRITE_FLAGS = os.O_WRONLY | os.O_RDWR | os.O_APPEND | os.O_CREAT | os.O_TRUNC
+
+
+def _audit(event: str, args: tuple) -> None:
+    if event.startswith(_BLOCKED_EVENTS):
+        raise PermissionError(f"{event} is not allowed in the sandbox")
+    if event == "open" and (
+        (len(args) > 1 and isinstance(args[1], str) and set(args[1]) & set("wax+"))
+        or (len(args) > 2 and isinstance(args[2], int) and args[2] & _WRITE_FLAGS)
+    ):
+        raise PermissionError("writing files is not allowed in the sandbox")
+
+
+def _limit(cpu_seconds: int, memory_mb: int) -> None:
+    import resource
+
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+    resource.setrlimit(resource.RLIMIT_AS, (memory_mb << 20, memory_mb << 20))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+    try:
+        os.unshare(os.CLONE_NEWNET)  # no interfaces at all, if we may create a namespace
+    except (AttributeError, OSError):
+        pass
+
+
+def _same(got: Any, expected: Any, compare: str) -> bool:
+    if compare == "unordered" and isinstance(got, (list, tuple)) and isinstance(expected, list):
+        return sorted(map(repr, got)) == sorted(map(repr, expected))
+    if isinstance(got, tuple):
+        got = list(got)
+    return got == expected
+
+
+def _load_target(job: dict[str, Any]) -> Any:
+    """The solution's entry point; raises on compile errors and missing definitions."""
+    namespace: dict[str, Any] = {"__name__": "solution"}
+    exec(compile(_PRELUDE, "<prelude>", "exec"), namespace)
+    exec(compile(job["code"], "<solution>", "exec"), namespace)
+    solution = namespace.get("Solution")
+    target = getattr(solution(), job["entry_point"], None) if isinstance(solution, type) else namespace.get(job["entry_point"])
+    if not callable(target):
+        raise LookupError(f"no Solution.{job['entry_point']} or {job['entry_point']}() defined")
+    return target
+
+
+def _run_job(job: dict[str, Any]) -> dict[str, Any]:
+    try:
+        target = _load_target(job)
+    except BaseException as exc:
+        return {"passed": False, "error": f"{type(exc).__name__}: {exc}"}
+
+    cases = []
+    for example in job["examples"]:
+        # Fresh copies: solutions may mutate their input.
+        arguments = json.loads(json.dumps(example["input"]))
+        started = time.perf_counter()
+        try:
+            try:
+                got = target(**arguments)
+            except TypeError:
+                got = target(*json.loads(json.dumps(list(example["input"].values()))))
+        except BaseException as exc:
+            cases.append({"ok": False, "seconds": time.perf_counter() - started, "error": f"{type(exc).__name__}: {exc}"[:300]})
+            continue
+        seconds = time.perf_counter() - started
+        cases.append({"ok": _same(got, example["output"], job.get("compare", "exact")), "seconds": seconds, "got": repr(got)[:300]})
+    return {"passed": all(case["ok"] for case in cases), "cases": cases}
+
+
+class _OutOfBudget(Exception):
+    pass
+
+
+def _synthetic_input(examples: list[dict], n: int) -> dict[str, Any]:
+    """Input of size `n` shaped like the examples: fresh unique ints for int lists
+    (sorted if every example is), the reference example's strings repeated, an
+    out-of-range value for ints next to a list, and `n` itself for a lone int."""
+    import random
+
+    rng = random.Random(n)
+    # Prefer an example with a True answer, so repeated strings keep the property
+    # (valid brackets, palindrome, anagram) and the solution has to read all of it.
+    reference = next((e for e in examples if e["output"] is True), examples[0])["input"]
+    has_sequence = any(isinstance(value, (list, str)) for value in reference.values())
+    values: dict[str, Any] = {}
+    for name, value in reference.items():
+        if isinstance(value, str):
+            values[name] = (value * (n // max(1, len(value)) + 1))[:n] if value else "a" * n
+        elif isinstance(value, list):
+            numbers = rng.sample(range(-2 * n, 2 * n), n)
+            if all(e["input"][name] == sorted(e["input"][name]) for e in examples):
+                numbers.sort()
+            values[name] = numbers
+        elif isinstance(value, bool) or not isinstance(value, int):
+            values[name] = value
+        else:
+            values[name] = 10 * n + 7 if has_sequence else n
+    return values
+
+
+def _bench_job(job: dict[str, Any]) -> dict[str, Any]:
+    """Time and trace memory of the solution on growing input sizes until the budget runs out."""
+    import tracemalloc
+
+    try:
+        target = _load_target(job)
+    except BaseException as exc:
+        return {"points": [], "error": f"{type(exc).__name__}: {exc}"}
+
+    def out_of_budget(*_args: Any) -> None:
+        raise _OutOfBudget()
+
+    budget = job["budget"]
+    started = time.perf_counter()
+    signal.signal(signal.SIGALRM, out_of_budget)
+    signal.setitimer(signal.ITIMER_REAL, budget)
+    points, stopped = [], "max_size"
+    lone_int = not any(isinstance(v, (list, str)) for v in job["examples"][0]["input"].values())
+    n = 2 if lone_int else 8
+    try:
+        while n <= job["max_size"]:
+            arguments = _synthetic_input(job["examples"], n)
+            # Best of three, each averaged over enough calls to last a millisecond.
+            # Copying is kept out of the timing, so calls within a round share one
+            # copy of the input (an in-place sort sees sorted data after the first).
+            best = None
+            for _ in range(3):
+                fresh = _fresh(arguments)
+                calls, begin = 0, time.perf_counter()
+                while True:
+                    target(**fresh)
+                    calls += 1
+                    elapsed = time.perf_counter() - begin
+                    if elapsed >= 0.001:
+                        break
+                best = elapsed / calls if best is None else min(best, elapsed / calls)
+            fresh = _fresh(arguments)
+            tracemalloc.start()
+            target(**fresh)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            points.append({"n": n, "seconds": best, "peak_bytes": peak})
+            # The next size takes at least twice as long; stop if it cannot fit.
+            if (time.perf_counter() - started) + best * 3 * 2 * 2 > budget:
+                stopped = "budget"
+                break
+            # Lone integers (n-th term, count up to n) are often exponential; smaller
+            # steps give the fit enough points before the budget runs out.
+            n = max(n + 1, n * 3 // 2) if lone_int else n * 2
+    except _OutOfBudget:
+        stopped = "budget"
+    except BaseException as exc:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        return {"points": points, "error": f"{type(exc).__name__} at n = {n}: {exc}"[:300]}
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    return {"points": points, "stopped": stopped}
+
+
+def _fresh(arguments: dict[str, Any]) -> dict[str, Any]:
+    # Solutions may mutate their input (e.g. sort in place).
+    return {name: list(value) if isinstance(value, list) else value for name, value in arguments.items()}
+
+
+def _fork_and_run(job: dict[str, Any]) -> dict[str, Any]:
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # child
+        try:
+            os.close(read_end)
+            devnull = os.open(os.devnull, os.O_RDWR)
+            for fd in (0, 1, 2):
+                os.dup2(devnull, fd)
+            _limit(job["cpu_seconds"], job["memory_mb"])
+            sys.addaudithook(_audit)
+            result = _bench_job(job) if job.get("kind") == "bench" else _run_job(job)
+        except BaseException as exc:
+            result = {"passed": False, "error": f"{type(exc).__name__}: {exc}"}
+        payload = json.dumps(result).encode()
+        while payload:
+            payload = payload[os.write(write_end, payload):]
+        os._exit(0)
+
+    os.close(write_end)
+    chunks, deadline = [], time.monotonic() + job["timeout"]
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([read_end], [], [], remaining)[0]:
+                os.kill(pid, signal.SIGKILL)
+                return {"passed": False, "error": f"timed out after {job['timeout']}s"}
+            chunk = os.read(read_end, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        os.close(read_end)
+        _, status = os.waitpid(pid, 0)
+    if not chunks:
+        if os.WIFSIGNALED(status) and os.WTERMSIG(status) in (signal.SIGXCPU, signal.SIGKILL):
+            return {"passed": False, "error": "CPU time limit exceeded"}
+        return {"passed": False, "error": "sandbox crashed (memory limit?)"}
+    return json.loads(b"".join(chunks))
+
+
+def _worker_main() -> None:
+    # Warm the modules the prelude imports once; every forked child inherits them.
+    exec(compile(_PRELUDE, "<prelude>", "exec"), {})
+    for line in sys.stdin:
+        try:
+            result = _fork_and_run(json.loads(line))
+        except Exception as exc:
+            result = {"passed": False, "error": f"sandbox error: {exc!r}"}
+        sys.stdout.write(json.dumps(result) + "\n")
+        sys.stdout.flush()
+
+
+# ---- pool side -------------------------------------------------------------------
+
+
+class SandboxPool:
+    """Pre-forked worker interpreters that run `check` and `benchmark` jobs."""
+
+    def __init__(self, workers: int = 2, cpu_seconds: int = 2, memory_mb: int = 256, timeout: float = 5.0):
+        self.size = workers
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.timeout = timeout
+        self._idle: queue.Queue[subprocess.Popen] = queue.Queue()
+        self._workers: list[subprocess.Popen] = []
+        self._lock = threading.Lock()
+        self._cwd: str | None = None
+
+    @classmethod
+    def from_env(cls) -> SandboxPool | None:
+        """CODE_VERIFICATION=on enables it; SANDBOX_WORKERS, SANDBOX_CPU_SECONDS,
+        SANDBOX_MEMORY_MB and SANDBOX_TIMEOUT_SECONDS tune it."""
+        if os.getenv("CODE_VERIFICATION", "off").lower() not in {"on", "1", "true"}:
+            return None
+        return cls(
+            workers=int(os.getenv("SANDBOX_WORKERS", "2")),
+            cpu_seconds=int(os.getenv("SANDBOX_CPU_SECONDS", "2")),
+            memory_mb=int(os.getenv("SANDBOX_MEMORY_MB", "256")),
+            timeout=float(os.getenv("SANDBOX_TIMEOUT_SECONDS", "5")),
+        )
+
+    def _spawn(self) -> subprocess.Popen:
+        if self._cwd is None:
+            self._cwd = tempfile.mkdtemp(prefix="sandbox-")
+        return subprocess.Popen(
+            [sys.executable, "-I", os.path.abspath(__file__), "--worker"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, bufsize=1,
+            env={"PATH": os.defpath}, cwd=self._cwd,
+        )
+
+    def start(self) -> None:
+        """Start the workers (idempotent); also done on the first check."""
+        with self._lock:
+            while len(self._workers) < self.size:
+                worker = self._spawn()
+                self._workers.append(worker)
+                self._idle.put(worker)
+
+    def close(self) -> None:
+        with self._lock:
+            workers, self._workers = self._workers, []
+            self._idle = queue.Queue()
+        for worker in workers:
+            worker.kill()
+            worker.wait()
+        if self._cwd is not None:
+            shutil.rmtree(self._cwd, ignore_errors=True)
+            self._cwd = None
+
+    @property
+    def started(self) -> bool:
+        return bool(self._workers)
+
+    def _call(self, job: dict[str, Any]) -> dict[str, Any]:
+        self.start()
+        worker = self._idle.get()
+        try:
+            worker.stdin.write(json.dumps(job) + "\n")
+            worker.stdin.flush()
+            line = worker.stdout.readline()
+        except (BrokenPipeError, OSError):
+            line = ""
+        if not line:
+            # The worker itself died; replace it.
+            worker.kill()
+            with self._lock:
+                if worker in self._workers:
+                    self._workers.remove(worker)
+            self.start()
+            return {"passed": False, "error": "sandbox worker died"}
+        self._idle.put(worker)
+        return json.loads(line)
+
+    async def check(self, code: str, entry_point: str, examples: list[dict], compare: str = "exact") -> CheckResult:
+        """Run `code` against `examples`, calling `Solution().<entry_point>` (or a
+        top-level function of that name) with each example's input."""
+        job = {
+            "code": code, "entry_point": entry_point, "examples": examples, "compare": compare,
+            "cpu_seconds": self.cpu_seconds, "memory_mb": self.memory_mb, "timeout": self.timeout,
+        }
+        return CheckResult.from_dict(await asyncio.to_thread(self._call, job))
+
+    async def benchmark(self, code: str, entry_point: str, examples: list[dict], budget: float = 2.0, max_size: int = 1 << 20) -> BenchResult:
+        """Time `code` on synthetic inputs shaped like `examples`, doubling the size
+        from 8 (growing a lone integer argument by half from 2) until `budget`
+        seconds are spent."""
+        job = {
+            "kind": "bench", "code": code, "entry_point": entry_point, "examples": examples,
+            "budget": budget, "max_size": max_size,
+            "cpu_seconds": int(budget * 2) + 2, "memory_mb": self.memory_mb, "timeout": budget * 2 + 2,
+        }
+        return BenchResult.from_dict(await asyncio.to_thread(self._call, job))
+
+
+if __name__ == "__main__" and sys.argv[1:] == ["--worker"]:
+    _worker_main()
@@ -0,0 +1,113 @@
+"""
+Per-session serialization and request coalescing for chat turns.
+
+Two concurrent turns for the same session would both read the same history,
+both run the graph and the last write would drop the other turn. `TurnCoordinator`
+runs at most one turn per session at a time:
+
+- an in-process `asyncio.Lock` per session, with a bounded number of waiters
+  (extra requests get 429 instead of piling up behind a slow LLM call);
+- a lease in the session backend (`acquire_lock` / `release_lock`) so workers
+  sharing a SQLite or Redis store also serialize. A heartbeat renews it every
+  third of `lease_seconds` while the turn runs, so a turn that outlives the
+  lease (retries, fallback models, sandbox runs) never loses it, while a
+  crashed worker's lease still expires;
+- identical submissions that arrive while one is pending (double-clicks) are
+  coalesced into one run whose result is returned to every caller.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import time
+from contextlib import asynccontextmanager, suppress
+from typing import Any, AsyncIterator, Awaitable, Callable
+from uuid import UUID, uuid4
+
+from fastapi import HTTPException
+
+from session_store import TTLBackend
+
+
+class TurnCoordinator:
+    def __init__(
+        self,
+        backend: TTLBackend,
+        max_waiters: int = 4,
+        lease_seconds: float = 300.0,
+        acquire_timeout: float = 120.0,
+    ):
+        self.backend = backend
+        self.max_waiters = max_waiters
+        self.lease_seconds = lease_seconds
+        self.acquire_timeout = acquire_timeout
+        self._locks: dict[UUID, asyncio.Lock] = {}
+        self._waiters: dict[UUID, int] = {}
+        self._inflight: dict[tuple[UUID, str], asyncio.Task] = {}
+
+    def check_capacity(self, session_id: UUID) -> None:
+        """Reject the request up front if the session already has a full queue."""
+        if self._waiters.get(session_id, 0) > self.max_waiters:
+            raise HTTPException(status_code=429, detail="Too many pending requests for this session")
+
+    @asynccontextmanager
+    async def lock(self, session_id: UUID) -> AsyncIterator[None]:
+        """Hold the session exclusively, locally and across workers sharing the store."""
+        self.check_capacity(session_id)
+        self._waiters[session_id] = self._waiters.get(session_id, 0) + 1
+        local = self._locks.setdefault(session_id, asyncio.Lock())
+        try:
+            async with local:
+                token = await self._acquire_lease(session_id)
+                heartbeat = asyncio.create_task(self._renew_lease(session_id, token))
+                try:
+                    yield
+                finally:
+                    heartbeat.cancel()
+                    with suppress(asyncio.CancelledError):
+                        await heartbeat
+                    await self.backend.release_lock(session_id, token)
+        finally:
+            self._waiters[session_id] -= 1
+            if not self._waiters[session_id]:
+                del self._waiters[session_id]
+                self._locks.pop(session_id, None)
+
+    async def _renew_lease(self, session_id: UUID, token: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                if not await self.backend.renew_lock(session_id, token, self.lease_seconds):
+                    print(f"turn lease for session {session_id} was lost")
+                    return
+            except Exception as exc:  # keep trying; the lease has two more intervals to run
+                print(f"turn lease renewal failed: {exc!r}")
+
+    async def _acquire_lease(self, session_id: UUID) -> str:
+        token = uuid4().hex
+        deadline = time.monotonic() + self.acquire_timeout
+        delay = 0.05
+        while not await self.backend.acquire_lock(session_id, token, self.lease_seconds):
+            if time.monotonic() >= deadline:
+                raise HTTPException(status_code=409, detail="Session is busy in another worker")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+        return token
+
+    async def run(self, session_id: UUID, request_key: str, turn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run `turn` under the session lock; concurrent identical requests share one run."""
+        key = (session_id, hashlib.sha256(request_key.encode()).hexdigest())
+        task = self._inflight.get(key)
+        if task is None:
+            async def locked_turn():
+                try:
+                    async with self.lock(session_id):
+                        return await turn()
+                finally:
+                    self._inflight.pop(key, None)
+
+            task = asyncio.ensure_future(locked_turn())
+            self._inflight[key] = task
+        # Shielded so one caller disconnecting doesn't cancel the run for the others.
+        return await asyncio.shield(task)
@@ -1,14 +1,18 @@
 from __future__ import annotations
 
+import os
 from dataclasses import dataclass
 from uuid import UUID
 
 from fastapi import Depends, Header, HTTPException, Query, Request
-from fastapi_sessions.backends.implementations import InMemoryBackend
+from fastapi_sessions.backends.session_backend import SessionBackend
 from fastapi_sessions.frontends.implementations import SessionCookie, CookieParameters
 from fastapi_sessions.session_verifier import SessionVerifier
 
 from models import SessionData
+from session_locks import TurnCoordinator
+from session_store import make_backend
+from telemetry import span
 
 cookie_params = CookieParameters()
 
@@ -20,7 +24,11 @@ cookie = SessionCookie(
     cookie_params=cookie_params,
 )
 
-backend = InMemoryBackend[UUID, SessionData]()
+# Storage is chosen via SESSION_BACKEND (memory | sqlite | redis); see session_store.make_backend.
+backend = make_backend()
+
+# One chat turn per session at a time; SESSION_MAX_PENDING more may queue before 429s.
+turns = TurnCoordinator(backend, max_waiters=int(os.getenv("SESSION_MAX_PENDING", "4")))
 
 
 class BasicVerifier(SessionVerifier[UUID, SessionData]):
@@ -29,7 +37,7 @@ class BasicVerifier(SessionVerifier[UUID, SessionData]):
         *,
         identifier: str,
         auto_error: bool,
-        backend: InMemoryBackend[UUID, SessionData],
+        backend: SessionBackend[UUID, SessionData],
         auth_http_exception: HTTPException,
     ):
         self._identifier = identifier
@@ -119,3 +127,12 @@ async def get_session_context(
         raise HTTPException(status_code=403, detail="Invalid session auth token")
 
     return SessionContext(id=session_id, data=session)
+
+
+async def reload_session(session: SessionContext) -> SessionData:
+    """Fresh copy of the session, for use while holding its turn lock."""
+    with span("session_load"):
+        data = await backend.reload(session.id)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return data
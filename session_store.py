@@ -0,0 +1,637 @@
+"""
+Session storage backends with TTL expiry.
+
+All backends implement the fastapi-sessions `SessionBackend` interface so they
+plug straight into the verifier in `session_setup`:
+
+- `MemoryBackend`: process-local dict, for local development and tests.
+- `SQLiteBackend`: single-file SQLite in WAL mode; survives restarts and can be
+  shared by several workers on one machine.
+- `RedisBackend`: speaks the Redis protocol (RESP) directly, so any Redis-
+  compatible server can back sessions shared across instances.
+
+`CachedBackend` adds an in-process LRU read-through cache in front of any of
+them, and `run_sweeper` periodically purges expired sessions.
+
+Messages are stored as an append-only log next to a small session header
+(everything in `SessionData` except `messages`): a chat turn calls
+`append_messages` with just the new messages and `update_header`, so the
+write per turn stays constant no matter how long the session gets.
+
+`acquire_lock` / `renew_lock` / `release_lock` hold a short, renewed lease on a
+session so workers sharing a store run one chat turn per session at a time
+(see `session_locks`).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, TypeVar
+from urllib.parse import urlparse
+from uuid import UUID
+
+from fastapi_sessions.backends.session_backend import BackendError, SessionBackend
+
+from models import SessionData, StoredMessage
+
+DEFAULT_TTL_SECONDS = 60 * 60 * 24
+
+T = TypeVar("T")
+
+
+def _header_json(data: SessionData) -> str:
+    return data.model_dump_json(exclude={"messages"})
+
+
+def _load(header: str | bytes, messages: list[str] | list[bytes]) -> SessionData:
+    data = SessionData.model_validate_json(header)
+    data.messages = [StoredMessage.model_validate_json(m) for m in messages]
+    return data
+
+
+class TTLBackend(SessionBackend[UUID, SessionData], ABC):
+    """Session backend whose entries expire `ttl_seconds` after their last write.
+
+    Subclasses implement `create`, `read`, `update`, `delete`, `append_messages`
+    and `update_header`; one missing fails at construction, not mid-request.
+    """
+
+    def __init__(self, ttl_seconds: float | None = DEFAULT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+
+    def _expires_at(self) -> float | None:
+        return time.time() + self.ttl_seconds if self.ttl_seconds else None
+
+    @abstractmethod
+    async def append_messages(self, session_id: UUID, messages: list[StoredMessage]) -> None:
+        """Append `messages` to the session's message log."""
+
+    @abstractmethod
+    async def update_header(self, session_id: UUID, data: SessionData) -> None:
+        """Store every field of `data` except `messages`."""
+
+    async def reload(self, session_id: UUID) -> SessionData | None:
+        """Read the session bypassing any local cache."""
+        return await self.read(session_id)
+
+    async def acquire_lock(self, session_id: UUID, token: str, lease_seconds: float) -> bool:
+        """Try to take the session's turn lock for `lease_seconds`; False if someone holds it.
+
+        Process-local backends return True: the in-process lock already serializes turns.
+        """
+        return True
+
+    async def renew_lock(self, session_id: UUID, token: str, lease_seconds: float) -> bool:
+        """Extend the lease to `lease_seconds` from now if `token` still holds it."""
+        return True
+
+    async def release_lock(self, session_id: UUID, token: str) -> None:
+        """Release the lock if `token` still holds it."""
+
+    async def sweep(self) -> int:
+        """Purge expired sessions and return how many were removed."""
+        return 0
+
+    async def ping(self) -> None:
+        """Raise if the store cannot be reached (readiness checks)."""
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryBackend(TTLBackend):
+    def __init__(self, ttl_seconds: float | None = DEFAULT_TTL_SECONDS):
+        super().__init__(ttl_seconds)
+        # session id -> [expires_at, header json, message log as json strings]
+        self._data: dict[UUID, list] = {}
+
+    def _live(self, session_id: UUID) -> list | None:
+        entry = self._data.get(session_id)
+        if entry is None:
+            return None
+        if entry[0] is not None and entry[0] <= time.time():
+            del self._data[session_id]
+            return None
+        return entry
+
+    def _require(self, session_id: UUID) -> list:
+        entry = self._live(session_id)
+        if entry is None:
+            raise BackendError("session does not exist, cannot update")
+        entry[0] = self._expires_at()
+        return entry
+
+    async def create(self, session_id: UUID, data: SessionData) -> None:
+        if self._live(session_id) is not None:
+            raise BackendError("create can't overwrite an existing session")
+        self._data[session_id] = [self._expires_at(), _header_json(data), [m.model_dump_json() for m in data.messages]]
+
+    async def read(self, session_id: UUID) -> SessionData | None:
+        entry = self._live(session_id)
+        return _load(entry[1], entry[2]) if entry is not None else None
+
+    async def update(self, session_id: UUID, data: SessionData) -> None:
+        entry = self._require(session_id)
+        entry[1] = _header_json(data)
+        entry[2] = [m.model_dump_json() for m in data.messages]
+
+    async def append_messages(self, session_id: UUID, messages: list[StoredMessage]) -> None:
+        self._require(session_id)[2].extend(m.model_dump_json() for m in messages)
+
+    async def update_header(self, session_id: UUID, data: SessionData) -> None:
+        self._require(session_id)[1] = _header_json(data)
+
+    async def delete(self, session_id: UUID) -> None:
+        self._data.pop(session_id, None)
+
+    async def sweep(self) -> int:
+        now = time.time()
+        expired = [sid for sid, entry in self._data.items() if entry[0] is not None and entry[0] <= now]
+        for sid in expired:
+            del self._data[sid]
+        return len(expired)
+
+
+class SQLiteBackend(TTLBackend):
+    """Session headers and message logs in SQLite (WAL mode, so readers never block the writer)."""
+
+    def __init__(self, path: str, ttl_seconds: float | None = DEFAULT_TTL_SECONDS):
+        super().__init__(ttl_seconds)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions(expires_at)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            " session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,"
+            " seq INTEGER NOT NULL, data TEXT NOT NULL, PRIMARY KEY (session_id, seq))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_locks ("
+            " session_id TEXT PRIMARY KEY, token TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def _locked(self, work: Callable[[sqlite3.Connection], T], write: bool = True) -> T:
+        # Writes take the write lock up front (IMMEDIATE), so a read-modify-write never
+        # fails to upgrade; reads use a deferred transaction, a WAL snapshot that
+        # neither waits for nor blocks writers in other workers.
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                result = work(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    async def _transaction(self, work: Callable[[sqlite3.Connection], T], write: bool = True) -> T:
+        return await asyncio.to_thread(self._locked, work, write)
+
+    def _touch(self, conn: sqlite3.Connection, session_id: UUID) -> None:
+        cursor = conn.execute(
+            "UPDATE sessions SET expires_at = ? WHERE id = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (self._expires_at(), str(session_id), time.time()),
+        )
+        if cursor.rowcount == 0:
+            raise BackendError("session does not exist, cannot update")
+
+    @staticmethod
+    def _insert_messages(conn: sqlite3.Connection, session_id: UUID, messages: list[StoredMessage]) -> None:
+        (last,) = conn.execute("SELECT COALESCE(MAX(seq), -1) FROM messages WHERE session_id = ?", (str(session_id),)).fetchone()
+        conn.executemany(
+            "INSERT INTO messages (session_id, seq, data) VALUES (?, ?, ?)",
+            [(str(session_id), last + 1 + i, m.model_dump_json()) for i, m in enumerate(messages)],
+        )
+
+    @staticmethod
+    def _set_header(conn: sqlite3.Connection, session_id: UUID, data: SessionData) -> None:
+        conn.execute("UPDATE sessions SET data = ? WHERE id = ?", (_header_json(data), str(session_id)))
+
+    async def create(self, session_id: UUID, data: SessionData) -> None:
+        def work(conn: sqlite3.Connection) -> None:
+            conn.execute("DELETE FROM sessions WHERE id = ? AND expires_at <= ?", (str(session_id), time.time()))
+            conn.execute(
+                "INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?)",
+                (str(session_id), _header_json(data), self._expires_at()),
+            )
+            self._insert_messages(conn, session_id, data.messages)
+
+        try:
+            await self._transaction(work)
+        except sqlite3.IntegrityError as exc:
+            raise BackendError("create can't overwrite an existing session") from exc
+
+    async def read(self, session_id: UUID) -> SessionData | None:
+        def work(conn: sqlite3.Connection) -> SessionData | None:
+            header = conn.execute(
+                "SELECT data FROM sessions WHERE id = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (str(session_id), time.time()),
+            ).fetchone()
+            if header is None:
+                return None
+            rows = conn.execute("SELECT data FROM messages WHERE session_id = ? ORDER BY seq", (str(session_id),))
+            return _load(header[0], [row[0] for row in rows])
+
+        return await self._transaction(work, write=False)
+
+    async def update(self, session_id: UUID, data: SessionData) -> None:
+        def work(conn: sqlite3.Connection) -> None:
+            self._touch(conn, session_id)
+            self._set_header(conn, session_id, data)
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (str(session_id),))
+            self._insert_messages(conn, session_id, data.messages)
+
+        await self._transaction(work)
+
+    async def append_messages(self, session_id: UUID, messages: list[StoredMessage]) -> None:
+        def work(conn: sqlite3.Connection) -> None:
+            self._touch(conn, session_id)
+            self._insert_messages(conn, session_id, messages)
+
+        await self._transaction(work)
+
+    async def update_header(self, session_id: UUID, data: SessionData) -> None:
+        def work(conn: sqlite3.Connection) -> None:
+            self._touch(conn, session_id)
+            self._set_header(conn, session_id, data)
+
+        await self._transaction(work)
+
+    async def delete(self, session_id: UUID) -> None:
+        await self._transaction(lambda conn: conn.execute("DELETE FROM sessions WHERE id = ?", (str(session_id),)))
+
+    async def acquire_lock(self, session_id: UUID, token: str, lease_seconds: float) -> bool:
+        def work(conn: sqlite3.Connection) -> bool:
+            now = time.time()
+            conn.execute("DELETE FROM session_locks WHERE session_id = ? AND expires_at <= ?", (str(session_id), now))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO session_locks (session_id, token, expires_at) VALUES (?, ?, ?)",
+                (str(session_id), token, now + lease_seconds),
+            )
+            return cursor.rowcount == 1
+
+        return await self._transaction(work)
+
+    async def renew_lock(self, session_id: UUID, token: str, lease_seconds: float) -> bool:
+        return await self._transaction(lambda conn: conn.execute(
+            "UPDATE session_locks SET expires_at = ? WHERE session_id = ? AND token = ?",
+            (time.time() + lease_seconds, str(session_id), token),
+        ).rowcount == 1)
+
+    async def release_lock(self, session_id: UUID, token: str) -> None:
+        await self._transaction(lambda conn: conn.execute(
+            "DELETE FROM session_locks WHERE session_id = ? AND token = ?", (str(session_id), token)
+        ))
+
+    async def ping(self) -> None:
+        await self._transaction(lambda conn: conn.execute("SELECT 1").fetchone(), write=False)
+
+    async def sweep(self) -> int:
+        def work(conn: sqlite3.Connection) -> int:
+            now = time.time()
+            conn.execute("DELETE FROM session_locks WHERE expires_at <= ?", (now,))
+            return conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,)).rowcount
+
+        return await self._transaction(work)
+
+    async def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class RedisError(BackendError):
+    """Error reply from a Redis-protocol server."""
+
+
+class RedisClient:
+    """Minimal asyncio client for the Redis serialization protocol (RESP2).
+
+    One connection, one command in flight at a time; enough for session reads and
+    writes without pulling in a Redis dependency.
+    """
+
+    def __init__(self, url: str):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._lock = asyncio.Lock()
+
+    async def _connect(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            await self._send("AUTH", self.password)
+        if self.db:
+            await self._send("SELECT", self.db)
+
+    @staticmethod
+    def _encode(args: tuple) -> bytes:
+        out = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            out.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        return b"".join(out)
+
+    async def _read_reply(self):
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length == -1:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(rest)
+            if length == -1:
+                return None
+            return [await self._read_reply() for _ in range(length)]
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+    async def _send(self, *args):
+        self._writer.write(self._encode(args))
+        await self._writer.drain()
+        return await self._read_reply()
+
+    async def pipeline(self, *commands: tuple) -> list:
+        """Send several commands in one round trip and return their replies in order."""
+        async with self._lock:
+            try:
+                if self._writer is None or self._writer.is_closing():
+                    await self._connect()
+                self._writer.write(b"".join(self._encode(args) for args in commands))
+                await self._writer.drain()
+                replies = []
+                for _ in commands:
+                    try:
+                        replies.append(await self._read_reply())
+                    except RedisError as exc:
+                        replies.append(exc)
+            except BaseException:
+                # Broken, or cancelled with replies still unread (which the next
+                # command would take for its own): drop the connection; the next
+                # command reconnects.
+                if self._writer is not None:
+                    self._writer.close()
+                self._writer = None
+                raise
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    async def execute(self, *args):
+        (reply,) = await self.pipeline(args)
+        return reply
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+# Delete the lock key only if it still holds our token, atomically.
+_RELEASE_LOCK = "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end return 0"
+# Same for extending its lease.
+_RENEW_LOCK = "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('PEXPIRE', KEYS[1], ARGV[2]) end return 0"
+
+
+class RedisBackend(TTLBackend):
+    """Session header as a JSON string plus the message log as a Redis list.
+
+    Expiry is delegated to Redis (EX / EXPIRE on both keys).
+    """
+
+    def __init__(self, url: str, ttl_seconds: float | None = DEFAULT_TTL_SECONDS, prefix: str = "session:"):
+        super().__init__(ttl_seconds)
+        self.client = RedisClient(url)
+        self.prefix = prefix
+
+    def _key(self, session_id: UUID) -> str:
+        return f"{self.prefix}{session_id}"
+
+    def _log_key(self, session_id: UUID) -> str:
+        return f"{self.prefix}{session_id}:messages"
+
+    def _lock_key(self, session_id: UUID) -> str:
+        return f"{self.prefix}{session_id}:lock"
+
+    def _expiry_args(self) -> tuple:
+        return ("EX", int(self.ttl_seconds)) if self.ttl_seconds else ()
+
+    def _push(self, session_id: UUID, messages: list[StoredMessage]) -> list[tuple]:
+        if not messages:
+            return []
+        commands = [("RPUSH", self._log_key(session_id), *(m.model_dump_json() for m in messages))]
+        if self.ttl_seconds:
+            commands.append(("EXPIRE", self._log_key(session_id), int(self.ttl_seconds)))
+        return commands
+
+    async def create(self, session_id: UUID, data: SessionData) -> None:
+        ok = await self.client.execute("SET", self._key(session_id), _header_json(data), "NX", *self._expiry_args())
+        if ok is None:
+            raise BackendError("create can't overwrite an existing session")
+        await self.client.pipeline(("DEL", self._log_key(session_id)), *self._push(session_id, data.messages))
+
+    async def read(self, session_id: UUID) -> SessionData | None:
+        header, messages = await self.client.pipeline(
+            ("GET", self._key(session_id)),
+            ("LRANGE", self._log_key(session_id), 0, -1),
+        )
+        return _load(header, messages) if header is not None else None
+
+    async def update(self, session_id: UUID, data: SessionData) -> None:
+        await self.update_header(session_id, data)
+        await self.client.pipeline(("DEL", self._log_key(session_id)), *self._push(session_id, data.messages))
+
+    async def append_messages(self, session_id: UUID, messages: list[StoredMessage]) -> None:
+        if self.ttl_seconds:
+            exists = await self.client.execute("EXPIRE", self._key(session_id), int(self.ttl_seconds))
+        else:
+            exists = await self.client.execute("EXISTS", self._key(session_id))
+        if not exists:
+            raise BackendError("session does not exist, cannot update")
+        if messages:
+            await self.client.pipeline(*self._push(session_id, messages))
+
+    async def update_header(self, session_id: UUID, data: SessionData) -> None:
+        ok = await self.client.execute("SET", self._key(session_id), _header_json(data), "XX", *self._expiry_args())
+        if ok is None:
+            raise BackendError("session does not exist, cannot update")
+
+    async def delete(self, session_id: UUID) -> None:
+        await self.client.execute("DEL", self._key(session_id), self._log_key(session_id))
+
+    async def acquire_lock(self, session_id: UUID, token: str, lease_seconds: float) -> bool:
+        ok = await self.client.execute("SET", self._lock_key(session_id), token, "NX", "PX", int(lease_seconds * 1000))
+        return ok is not None
+
+    async def renew_lock(self, session_id: UUID, token: str, lease_seconds: float) -> bool:
+        return bool(await self.client.execute("EVAL", _RENEW_LOCK, 1, self._lock_key(session_id), token, int(lease_seconds * 1000)))
+
+    async def release_lock(self, session_id: UUID, token: str) -> None:
+        await self.client.execute("EVAL", _RELEASE_LOCK, 1, self._lock_key(session_id), token)
+
+    async def ping(self) -> None:
+        await self.client.execute("PING")
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+class CachedBackend(TTLBackend):
+    """LRU read-through cache in front of another backend.
+
+    Entries are trusted for `max_age` seconds so that other workers' writes to a
+    shared store become visible quickly; this worker's own writes go through the
+    cache and are visible immediately.
+    """
+
+    def __init__(self, inner: TTLBackend, maxsize: int = 1024, max_age: float = 5.0):
+        super().__init__(inner.ttl_seconds)
+        self.inner = inner
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self._entries: OrderedDict[UUID, tuple[float, SessionData]] = OrderedDict()
+
+    def _store(self, session_id: UUID, data: SessionData) -> None:
+        self._entries[session_id] = (time.monotonic(), data.model_copy(deep=True))
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def create(self, session_id: UUID, data: SessionData) -> None:
+        await self.inner.create(session_id, data)
+        self._store(session_id, data)
+
+    async def read(self, session_id: UUID) -> SessionData | None:
+        entry = self._entries.get(session_id)
+        if entry is not None and time.monotonic() - entry[0] < self.max_age:
+            self._entries.move_to_end(session_id)
+            return entry[1].model_copy(deep=True)
+
+        data = await self.inner.read(session_id)
+        if data is None:
+            self._entries.pop(session_id, None)
+        else:
+            self._store(session_id, data)
+        return data
+
+    async def update(self, session_id: UUID, data: SessionData) -> None:
+        try:
+            await self.inner.update(session_id, data)
+        except BackendError:
+            self._entries.pop(session_id, None)
+            raise
+        self._store(session_id, data)
+
+    async def append_messages(self, session_id: UUID, messages: list[StoredMessage]) -> None:
+        try:
+            await self.inner.append_messages(session_id, messages)
+        except BackendError:
+            self._entries.pop(session_id, None)
+            raise
+        entry = self._entries.get(session_id)
+        if entry is not None:
+            entry[1].messages.extend(m.model_copy() for m in messages)
+
+    async def update_header(self, session_id: UUID, data: SessionData) -> None:
+        try:
+            await self.inner.update_header(session_id, data)
+        except BackendError:
+            self._entries.pop(session_id, None)
+            raise
+        entry = self._entries.get(session_id)
+        if entry is not None:
+            header = data.model_copy(update={"messages": entry[1].messages})
+            self._entries[session_id] = (entry[0], header)
+
+    async def delete(self, session_id: UUID) -> None:
+        self._entries.pop(session_id, None)
+        await self.inner.delete(session_id)
+
+    async def reload(self, session_id: UUID) -> SessionData | None:
+        self._entries.pop(session_id, None)
+        return await self.read(session_id)
+
+    async def acquire_lock(self, session_id: UUID, token: str, lease_seconds: float) -> bool:
+        return await self.inner.acquire_lock(session_id, token, lease_seconds)
+
+    async def renew_lock(self, session_id: UUID, token: str, lease_seconds: float) -> bool:
+        return await self.inner.renew_lock(session_id, token, lease_seconds)
+
+    async def release_lock(self, session_id: UUID, token: str) -> None:
+        await self.inner.release_lock(session_id, token)
+
+    async def sweep(self) -> int:
+        return await self.inner.sweep()
+
+    async def ping(self) -> None:
+        await self.inner.ping()
+
+    async def close(self) -> None:
+        self._entries.clear()
+        await self.inner.close()
+
+
+def make_backend() -> TTLBackend:
+    """Build the session backend configured through environment variables.
+
+    SESSION_BACKEND: memory (default) | sqlite | redis
+    SESSION_TTL_SECONDS: idle lifetime of a session (default one day, 0 = never)
+    SESSION_SQLITE_PATH: database file for the sqlite backend (default sessions.db)
+    REDIS_URL: server for the redis backend (default redis://localhost:6379/0)
+    SESSION_CACHE_SIZE / SESSION_CACHE_MAX_AGE: LRU cache in front of sqlite/redis
+    """
+    kind = os.getenv("SESSION_BACKEND", "memory").lower()
+    ttl = float(os.getenv("SESSION_TTL_SECONDS", DEFAULT_TTL_SECONDS)) or None
+
+    if kind == "memory":
+        return MemoryBackend(ttl)
+    if kind == "sqlite":
+        inner: TTLBackend = SQLiteBackend(os.getenv("SESSION_SQLITE_PATH", "sessions.db"), ttl)
+    elif kind == "redis":
+        inner = RedisBackend(os.getenv("REDIS_URL", "redis://localhost:6379/0"), ttl)
+    else:
+        raise ValueError(f"Unknown SESSION_BACKEND: {kind}")
+
+    return CachedBackend(
+        inner,
+        maxsize=int(os.getenv("SESSION_CACHE_SIZE", "1024")),
+        max_age=float(os.getenv("SESSION_CACHE_MAX_AGE", "5")),
+    )
+
+
+async def run_sweeper(backend: TTLBackend, interval: float) -> None:
+    """Purge expired sessions every `interval` seconds until cancelled."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await backend.sweep()
+        except Exception as exc:  # keep sweeping even if one pass fails
+            print(f"session sweep failed: {exc!r}")
@@ -7,6 +7,21 @@ from langgraph.graph.message import add_messages
 from langchain_core.messages import BaseMessage
 
 
+def merge_drafts(current: dict[str, str] | None, update: dict[str, str] | None) -> dict[str, str]:
+    """Combine sections written by parallel branches; None clears them."""
+    if update is None:
+        return {}
+    return {**(current or {}), **update}
+
+
 class State(TypedDict):
     messages: Annotated[list[BaseMessage], add_messages]
     message_type: str | None
+    next: str | None
+    # Rolling summary of turns older than the verbatim context window (see context.py).
+    summary: str | None
+    summarized_upto: int
+    # Sections drafted by parallel code branches, merged into one reply (see ai.py).
+    drafts: Annotated[dict[str, str], merge_drafts]
+    # Sandbox results for the code in the last reply (see sandbox.py).
+    verification: dict | None
@@ -1,16 +1,26 @@
 from __future__ import annotations
 
+import os
+from collections import OrderedDict
+from uuid import UUID
+
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, BaseMessage
 
 from models import SessionData, StoredMessage
 from state import State
 
+# session id -> LangChain messages already built for that session's stored log.
+# Entries are validated by message id, so a log extended elsewhere (another
+# worker, another turn) only costs converting the messages added since.
+MESSAGE_CACHE_SIZE = int(os.getenv("MESSAGE_CACHE_SIZE", "512"))
+_lc_cache: OrderedDict[UUID, list[BaseMessage]] = OrderedDict()
+
 def stored_to_lc(msg: StoredMessage) -> BaseMessage:
     if msg.role == "user":
-        return HumanMessage(content=msg.content)
+        return HumanMessage(content=msg.content, id=msg.id)
     if msg.role == "assistant":
-        return AIMessage(content=msg.content)
-    return SystemMessage(content=msg.content)
+        return AIMessage(content=msg.content, id=msg.id)
+    return SystemMessage(content=msg.content, id=msg.id)
 
 def lc_to_stored(msg: BaseMessage) -> StoredMessage:
     msg_type = getattr(msg, "type", None)  # "human" / "ai" / "system"
@@ -21,15 +31,67 @@ def lc_to_stored(msg: BaseMessage) -> StoredMessage:
     else:
         role = "system"
 
+    if msg.id:
+        return StoredMessage(role=role, content=str(msg.content), id=msg.id)
     return StoredMessage(role=role, content=str(msg.content))
 
-def session_to_state(sd: SessionData) -> State:
+def _cached_messages(session_id: UUID, stored: list[StoredMessage]) -> list[BaseMessage]:
+    cached = _lc_cache.get(session_id)
+    if cached is None or len(cached) > len(stored) or (cached and cached[-1].id != stored[len(cached) - 1].id):
+        cached = []
+    messages = cached + [stored_to_lc(m) for m in stored[len(cached):]]
+    _remember(session_id, messages)
+    return messages
+
+def _remember(session_id: UUID, messages: list[BaseMessage]) -> None:
+    _lc_cache[session_id] = list(messages)
+    _lc_cache.move_to_end(session_id)
+    while len(_lc_cache) > MESSAGE_CACHE_SIZE:
+        _lc_cache.popitem(last=False)
+
+def forget_session(session_id: UUID) -> None:
+    _lc_cache.pop(session_id, None)
+
+def session_to_state(sd: SessionData, session_id: UUID | None = None) -> State:
+    if session_id is None:
+        messages = [stored_to_lc(m) for m in sd.messages]
+    else:
+        messages = _cached_messages(session_id, sd.messages)
     return {
-        "messages": [stored_to_lc(m) for m in sd.messages],
+        "messages": messages,
         "message_type": sd.message_type,
+        "summary": sd.summary,
+        "summarized_upto": sd.summarized_upto,
     }
 
-def state_to_session(sd: SessionData, state: State) -> SessionData:
-    sd.messages = [lc_to_stored(m) for m in state["messages"]]
+def state_to_session(sd: SessionData, state: State, session_id: UUID | None = None) -> SessionData:
+    """Fold the graph state back into `sd`.
+
+    The graph only ever appends to the history it was given, so only messages past
+    the ones already stored are converted; earlier messages (and their timestamps)
+    are left untouched.
+    """
+    sd.messages.extend(lc_to_stored(m) for m in state["messages"][len(sd.messages):])
+    sd.message_type = state.get("message_type")
+    sd.summary = state.get("summary")
+    sd.summarized_upto = state.get("summarized_upto") or 0
+    if session_id is not None:
+        _remember(session_id, state["messages"])
+    return sd
+
+def append_turn(sd: SessionData, state: State, first_id: str) -> SessionData:
+    """Fold a turn run on a checkpointed thread back into `sd`.
+
+    The thread's history need not line up with the log (it may hold the user
+    message of an interrupted turn), so the turn's messages are found by the id
+    of its first one, searching from the end: only the turn is converted.
+    """
+    messages = state["messages"]
+    start = next(i for i in range(len(messages) - 1, -1, -1) if messages[i].id == first_id)
+    known = {m.id for m in sd.messages[-(len(messages) - start):]}
+    sd.messages.extend(lc_to_stored(m) for m in messages[start:] if m.id not in known)
     sd.message_type = state.get("message_type")
-    return sd
\ No newline at end of file
+    sd.summary = state.get("summary")
+    sd.summarized_upto = state.get("summarized_upto") or 0
+    sd.checkpointed_upto = len(sd.messages)
+    return sd
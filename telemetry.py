@@ -0,0 +1,237 @@
+"""
+Metrics and tracing for chat turns.
+
+Spans cover each stage of a turn (session load, state conversion, graph run,
+every graph node, session save); each span feeds a latency histogram and, when
+OpenTelemetry is installed and `OTEL_TRACES=on` (or an OTLP endpoint is
+configured), an OTel span as well. Per-call LLM token counts, latency and
+estimated cost come from `usage.UsageRecorder`.
+
+Metrics are rendered in the Prometheus text format by `GET /metrics`, without
+a client-library dependency. Modules owning live state (the LLM gateway, call
+policies, response cache) register collectors that are read at scrape time.
+
+Pure Python on purpose: `main` imports it, and must stay fast to import.
+"""
+
+from __future__ import annotations
+
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Iterable, Iterator
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# USD per million tokens: (input, output). Cache writes cost 1.25x input, cache reads 0.1x.
+MODEL_PRICES = {
+    "claude-3-5-haiku": (0.80, 4.00),
+    "claude-haiku-4-5": (1.00, 5.00),
+    "claude-sonnet-4": (3.00, 15.00),
+    "claude-3-7-sonnet": (3.00, 15.00),
+    "claude-3-5-sonnet": (3.00, 15.00),
+    "claude-opus-4": (15.00, 75.00),
+}
+
+Sample = tuple[str, dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(name: str, labels: dict[str, str], value: float) -> str:
+    if labels:
+        rendered = ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels.items())
+        return f"{name}{{{rendered}}} {value:g}"
+    return f"{name} {value:g}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.type = "counter"
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames), 0.0)
+
+    def samples(self) -> Iterator[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames, self.buckets = name, help, labelnames, buckets
+        self.type = "histogram"
+        # labels -> [per-bucket counts, sum, count]
+        self._values: dict[tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            entry = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels: Any) -> int:
+        entry = self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames))
+        return entry[2] if entry else 0
+
+    def samples(self) -> Iterator[Sample]:
+        with self._lock:
+            items = [(key, (list(entry[0]), entry[1], entry[2])) for key, entry in self._values.items()]
+        for key, (counts, total, count) in items:
+            labels = dict(zip(self.labelnames, key))
+            for bound, bucket_count in zip(self.buckets, counts):
+                yield f"{self.name}_bucket", {**labels, "le": f"{bound:g}"}, bucket_count
+            yield f"{self.name}_bucket", {**labels, "le": "+Inf"}, count
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: list[Counter | Histogram] = []
+        # name -> (type, help, sample source) read at scrape time
+        self._collectors: dict[str, tuple[str, str, Callable[[], Iterable[tuple[dict[str, str], float]]]]] = {}
+
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, name: str, type: str, help: str, samples: Callable[[], Iterable[tuple[dict[str, str], float]]]) -> None:
+        """Register a gauge/counter whose (labels, value) samples are computed at scrape time."""
+        self._collectors[name] = (type, help, samples)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics:
+            lines += [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} {metric.type}"]
+            lines += [_format(name, labels, value) for name, labels, value in metric.samples()]
+        for name, (type, help, samples) in self._collectors.items():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {type}"]
+            lines += [_format(name, labels, value) for labels, value in samples()]
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+SPAN_SECONDS = metrics.histogram(
+    "leetcode_span_seconds", "Duration of each stage of a chat turn.", ("span", "node"))
+LLM_CALL_SECONDS = metrics.histogram(
+    "leetcode_llm_call_seconds", "Latency of LLM calls.", ("node", "model"))
+LLM_TOKENS = metrics.counter(
+    "leetcode_llm_tokens_total", "LLM tokens by kind (input, output, cache_read, cache_write).", ("node", "model", "kind"))
+LLM_COST = metrics.counter(
+    "leetcode_llm_cost_usd_total", "Estimated LLM spend in USD.", ("node", "model"))
+TURNS = metrics.counter(
+    "leetcode_chat_turns_total", "Finished turns by endpoint and message type.", ("endpoint", "message_type"))
+CODE_CHECKS = metrics.counter(
+    "leetcode_code_checks_total", "Sandboxed checks of generated code blocks (passed, repaired, failed).", ("node", "result"))
+
+
+_tracer: Any = None
+_tracer_loaded = False
+
+
+def _otel_tracer() -> Any:
+    global _tracer, _tracer_loaded
+    if not _tracer_loaded:
+        _tracer_loaded = True
+        enabled = os.getenv("OTEL_TRACES", "").lower() in {"on", "1", "true"} or os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+        if enabled:
+            try:
+                from opentelemetry import trace
+            except ImportError:
+                print("OTEL_TRACES is set but opentelemetry is not installed; tracing disabled")
+            else:
+                _tracer = trace.get_tracer("leetcode-assistant")
+    return _tracer
+
+
+@contextmanager
+def span(name: str, node: str = "", **attributes: Any) -> Iterator[None]:
+    """Time a stage of the turn, as a histogram sample and (optionally) an OTel span."""
+    tracer = _otel_tracer()
+    started = time.perf_counter()
+    try:
+        if tracer is None:
+            yield
+        else:
+            attrs = {key: value for key, value in {"node": node, **attributes}.items() if value not in (None, "")}
+            with tracer.start_as_current_span(name, attributes=attrs):
+                yield
+    finally:
+        SPAN_SECONDS.observe(time.perf_counter() - started, span=name, node=node)
+
+
+def traced_node(node: str, fn: Callable[[Any], Awaitable[Any]]) -> Callable[[Any], Awaitable[Any]]:
+    """Wrap an async graph node so each run is recorded as a `node` span."""
+
+    @functools.wraps(fn)
+    async def run(state: Any) -> Any:
+        with span("node", node=node):
+            return await fn(state)
+
+    return run
+
+
+def estimate_cost(model: str | None, input_tokens: int, output_tokens: int, cache_read: int = 0, cache_write: int = 0) -> float | None:
+    """USD for one call, or None for models without a known price."""
+    name = (model or "").removeprefix("anthropic:")
+    price = next((p for prefix, p in MODEL_PRICES.items() if name.startswith(prefix)), None)
+    if price is None:
+        return None
+    input_price, output_price = price
+    # LangChain's input_tokens already include the cache reads and writes.
+    uncached = max(0, input_tokens - cache_read - cache_write)
+    return (
+        uncached * input_price
+        + cache_write * input_price * 1.25
+        + cache_read * input_price * 0.1
+        + output_tokens * output_price
+    ) / 1_000_000
+
+
+def record_llm_calls(calls: Iterable[Any]) -> float:
+    """Export `usage.CallUsage` records; returns their total estimated cost."""
+    total = 0.0
+    for call in calls:
+        labels = {"node": call.node or "", "model": call.model or ""}
+        if call.latency_seconds is not None:
+            LLM_CALL_SECONDS.observe(call.latency_seconds, **labels)
+        for kind, amount in (
+            ("input", call.input_tokens),
+            ("output", call.output_tokens),
+            ("cache_read", call.cache_read_tokens),
+            ("cache_write", call.cache_write_tokens),
+        ):
+            if amount:
+                LLM_TOKENS.inc(amount, kind=kind, **labels)
+        cost = estimate_cost(call.model, call.input_tokens, call.output_tokens, call.cache_read_tokens, call.cache_write_tokens)
+        if cost is not None:
+            LLM_COST.inc(cost, **labels)
+            total += cost
+    return total
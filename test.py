@@ -7,7 +7,9 @@ we stub out `init_chat_model` so the graph uses deterministic responses.
 
 from __future__ import annotations
 
+import asyncio
 import importlib
+import os
 import sys
 
 from langchain_core.messages import HumanMessage
@@ -20,7 +22,7 @@ class StubResult:
 
 
 class StubLLM:
-    """LLM stub that returns queued responses for `.invoke` calls."""
+    """LLM stub that returns queued responses for `.invoke` / `.ainvoke` calls."""
 
     def __init__(self, responses: list[StubResult]):
         self._responses = list(responses)
@@ -33,6 +35,9 @@ class StubLLM:
             raise AssertionError("StubLLM invoked more times than responses provided")
         return self._responses.pop(0)
 
+    async def ainvoke(self, *args, **kwargs):
+        return self.invoke(*args, **kwargs)
+
 
 def test_question_explanation_path(monkeypatch):
     """Graph should classify and reply with a question explanation."""
@@ -48,10 +53,10 @@ def test_question_explanation_path(monkeypatch):
     monkeypatch.setattr("langchain.chat_models.init_chat_model", lambda *_args, **_kwargs: stub)
     ai = importlib.import_module("ai")
 
-    graph = ai.build_graph(model="stubbed")
+    graph = ai.build_graph(model="stubbed", fast_path_threshold=None)
     initial_state = {"messages": [HumanMessage(content="What does this problem ask?")], "message_type": None}
 
-    result_state = graph.invoke(initial_state)
+    result_state = asyncio.run(graph.ainvoke(initial_state))
 
     assert result_state["message_type"] == "Question explanation"
     assert result_state["messages"][-1].content == "Here is the plain-English explanation."
@@ -70,10 +75,1299 @@ def test_code_solution_path(monkeypatch):
     monkeypatch.setattr("langchain.chat_models.init_chat_model", lambda *_args, **_kwargs: stub)
     ai = importlib.import_module("ai")
 
-    graph = ai.build_graph(model="stubbed")
+    graph = ai.build_graph(model="stubbed", fast_path_threshold=None)
     initial_state = {"messages": [HumanMessage(content="Write code for two sum in Python")], "message_type": None}
 
-    result_state = graph.invoke(initial_state)
+    result_state = asyncio.run(graph.ainvoke(initial_state))
 
     assert result_state["message_type"] == "Code the solution as per user req/code correction"
     assert "def solve" in result_state["messages"][-1].content
+
+
+def test_stream_graph_emits_message_type_then_tokens(monkeypatch):
+    """Streaming run should surface the classification before the reply tokens."""
+    stub = StubLLM(
+        [
+            StubResult(message_type="Question explanation"),
+            StubResult(content="Streamed explanation."),
+        ]
+    )
+
+    sys.modules.pop("ai", None)
+    sys.modules.pop("chat_service", None)
+    monkeypatch.setattr("langchain.chat_models.init_chat_model", lambda *_args, **_kwargs: stub)
+    chat_service = importlib.import_module("chat_service")
+    ai = importlib.import_module("ai")
+    monkeypatch.setattr(chat_service, "graph", ai.build_graph(model="stubbed", fast_path_threshold=None))
+
+    initial_state = {"messages": [HumanMessage(content="What does this problem ask?")], "message_type": None}
+
+    async def collect():
+        return [event async for event in chat_service.stream_graph(initial_state)]
+
+    events = asyncio.run(collect())
+
+    assert [name for name, _ in events] == ["message_type", "token", "state"]
+    assert events[0][1] == "Question explanation"
+    assert events[1][1] == "Streamed explanation."
+    assert events[2][1]["messages"][-1].content == "Streamed explanation."
+
+
+def test_planner_fast_path_skips_llm_for_question_statement(monkeypatch):
+    """The synthetic /questions statement is classified locally without a planner call."""
+    stub = StubLLM([StubResult(content="Two Sum. How may I assist you further?")])
+
+    sys.modules.pop("ai", None)
+    monkeypatch.setattr("langchain.chat_models.init_chat_model", lambda *_args, **_kwargs: stub)
+    ai = importlib.import_module("ai")
+
+    graph = ai.build_graph(model="stubbed", fast_path_threshold=0.9)
+    statement = "LeetCode Question #1:  titled 'Two Sum'. Please identify and confirm the full title of this question."
+    initial_state = {"messages": [HumanMessage(content=statement)], "message_type": None}
+
+    result_state = asyncio.run(graph.ainvoke(initial_state))
+
+    assert result_state["message_type"] == "LeetCode Question"
+    assert result_state["messages"][-1].content == "Two Sum. How may I assist you further?"
+
+
+def test_pre_classifier_defers_low_confidence_messages():
+    """Messages the local model barely recognises must fall back to the LLM planner."""
+    from intent import pre_classify
+
+    assert pre_classify("```python\nreturn x +\n```\nfix this, it throws a syntax error").message_type == "User code correction"
+    assert pre_classify("why is this O(n)?").confidence < 0.9
+
+
+def test_language_mentions_need_a_code_context():
+    from intent import _LANGUAGE
+
+    for text in ("write it in Go", "golang please", "a C++ version", "use c#", "solve it in c", "show the C code", "python"):
+        assert _LANGUAGE.search(text), text
+    for text in ("let's go through it", "option c", "go ahead and write the code", "part c is wrong", "I want to go faster"):
+        assert not _LANGUAGE.search(text), text
+
+
+def _long_history(turns: int) -> list:
+    from langchain_core.messages import AIMessage
+
+    history = [
+        HumanMessage(content="LeetCode Question #1:  titled 'Two Sum'. Please identify and confirm the full title."),
+        AIMessage(content="Two Sum. How may I assist you further?"),
+    ]
+    for i in range(turns):
+        history += [HumanMessage(content=f"follow-up {i}"), AIMessage(content=f"answer {i}")]
+    return history
+
+
+def test_build_prompt_keeps_pinned_question_summary_and_recent_turns():
+    """Node prompts carry the pinned question, the summary and only the last turns verbatim."""
+    from context import RECENT_TURNS, build_prompt
+
+    state = {"messages": _long_history(10), "message_type": None, "summary": "User prefers Python."}
+
+    prompt = build_prompt(state, "system prompt", "Question explanation")
+    contents = [m.content for m in prompt]
+
+    assert contents[0] == "system prompt"
+    assert contents[1].startswith("LeetCode Question #1")
+    assert "User prefers Python." in contents[3]
+    assert contents[-1] == "answer 9"
+    assert "follow-up 0" not in contents
+    assert len(prompt) == 2 + 2 + 2 * RECENT_TURNS
+
+    cached = build_prompt(state, "system prompt", "Question explanation", cache=True)
+    assert cached[0].content[0]["cache_control"] == {"type": "ephemeral"}
+    assert cached[2].content[0]["cache_control"] == {"type": "ephemeral"}
+    assert state["messages"][1].content == "Two Sum. How may I assist you further?"
+
+    tight = build_prompt({**state, "summary": None}, "system prompt", "planner")
+    assert [m.content for m in tight[-2:]] == ["follow-up 9", "answer 9"]
+
+
+def test_build_prompt_trims_the_oldest_recent_turns_to_the_budget():
+    """Over budget, whole recent turns are dropped oldest first, keeping as many as fit."""
+    from langchain_core.messages import AIMessage
+
+    from context import NODE_TOKEN_BUDGETS, RECENT_TURNS, build_prompt
+
+    # Each turn costs about a third of the budget, so only the last three fit.
+    answer = "x" * (NODE_TOKEN_BUDGETS["Solution explanation"] * 4 // 3 - 400)
+    messages = []
+    for i in range(RECENT_TURNS + 2):
+        messages += [HumanMessage(content=f"follow-up {i}"), AIMessage(content=answer)]
+
+    prompt = build_prompt({"messages": messages, "message_type": None}, "system prompt", "Solution explanation")
+    kept = [m.content for m in prompt if m.type == "human"]
+    assert kept == [f"follow-up {i}" for i in range(RECENT_TURNS - 1, RECENT_TURNS + 2)]
+
+
+def test_context_node_summarises_only_new_old_turns(monkeypatch):
+    """Turns leaving the verbatim window are summarised once, then the watermark advances."""
+    from context import RECENT_TURNS
+
+    stub = StubLLM(
+        [
+            StubResult(message_type="Question explanation"),
+            StubResult(content="Summary: user asked 7 follow-ups."),
+            StubResult(content="Explanation."),
+        ]
+    )
+
+    sys.modules.pop("ai", None)
+    monkeypatch.setattr("langchain.chat_models.init_chat_model", lambda *_args, **_kwargs: stub)
+    ai = importlib.import_module("ai")
+
+    graph = ai.build_graph(model="stubbed", fast_path_threshold=None)
+    messages = _long_history(7) + [HumanMessage(content="What does this problem ask?")]
+    state = {"messages": messages, "message_type": None, "summary": None, "summarized_upto": 0}
+
+    result_state = asyncio.run(graph.ainvoke(state))
+
+    assert result_state["summary"] == "Summary: user asked 7 follow-ups."
+    assert result_state["summarized_upto"] == len(messages) - 2 * (RECENT_TURNS - 1) - 1
+    assert result_state["messages"][-1].content == "Explanation."
+
+
+def _session(name: str = "alice"):
+    from models import SessionData
+
+    return SessionData(username=name, auth_token="token")
+
+
+def test_sqlite_backend_expires_and_sweeps(tmp_path):
+    """SQLite sessions survive reopening the file and disappear after their TTL."""
+    from uuid import uuid4
+
+    from session_store import SQLiteBackend
+
+    async def scenario():
+        path = str(tmp_path / "sessions.db")
+        sid, stale = uuid4(), uuid4()
+
+        backend = SQLiteBackend(path, ttl_seconds=60)
+        await backend.create(sid, _session())
+        await backend.close()
+
+        reopened = SQLiteBackend(path, ttl_seconds=60)
+        assert (await reopened.read(sid)).username == "alice"
+
+        reopened.ttl_seconds = -1  # written already expired
+        await reopened.create(stale, _session("bob"))
+        assert await reopened.read(stale) is None
+        assert await reopened.sweep() == 1
+        await reopened.close()
+
+    asyncio.run(scenario())
+
+
+class FakeRedisServer:
+    """Local stand-in speaking just enough RESP for RedisBackend."""
+
+    def __init__(self):
+        self.data: dict[bytes, bytes] = {}
+        self.lists: dict[bytes, list[bytes]] = {}
+        self.expiries: dict[bytes, int] = {}
+        self.delay = 0.0  # seconds before each reply
+
+    async def _handle(self, reader, writer):
+        while line := await reader.readline():
+            args = []
+            for _ in range(int(line[1:])):
+                length = int((await reader.readline())[1:])
+                args.append((await reader.readexactly(length + 2))[:-2])
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            writer.write(self._dispatch(args))
+            await writer.drain()
+        writer.close()
+
+    @staticmethod
+    def _bulk(value: bytes | None) -> bytes:
+        return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def _dispatch(self, args: list[bytes]) -> bytes:
+        command, key = args[0].upper(), args[1] if len(args) > 1 else b""
+        if command == b"GET":
+            return self._bulk(self.data.get(key))
+        if command == b"SET":
+            flags = [a.upper() for a in args[3:]]
+            if (b"NX" in flags and key in self.data) or (b"XX" in flags and key not in self.data):
+                return b"$-1\r\n"
+            self.data[key] = args[2]
+            if b"EX" in flags:
+                self.expiries[key] = int(args[3 + flags.index(b"EX") + 1])
+            return b"+OK\r\n"
+        if command == b"DEL":
+            removed = sum((self.data.pop(k, None) or self.lists.pop(k, None)) is not None for k in args[1:])
+            return b":%d\r\n" % removed
+        if command == b"EXISTS":
+            return b":%d\r\n" % int(key in self.data or key in self.lists)
+        if command == b"EXPIRE":
+            found = key in self.data or key in self.lists
+            if found:
+                self.expiries[key] = int(args[2])
+            return b":%d\r\n" % int(found)
+        if command == b"RPUSH":
+            self.lists.setdefault(key, []).extend(args[2:])
+            return b":%d\r\n" % len(self.lists[key])
+        if command == b"LRANGE":
+            items = self.lists.get(key, [])
+            return b"*%d\r\n" % len(items) + b"".join(self._bulk(item) for item in items)
+        return b"-ERR unknown command\r\n"
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+
+def test_redis_backend_round_trip_against_stand_in():
+    """RedisBackend speaks RESP: create/read/update/delete with EX-based expiry."""
+    from uuid import uuid4
+
+    from fastapi_sessions.backends.session_backend import BackendError
+
+    from session_store import RedisBackend
+
+    async def scenario():
+        fake = FakeRedisServer()
+        port = await fake.start()
+        backend = RedisBackend(f"redis://127.0.0.1:{port}/0", ttl_seconds=120)
+        sid = uuid4()
+
+        await backend.create(sid, _session())
+        data = await backend.read(sid)
+        data.message_type = "Question explanation"
+        await backend.update(sid, data)
+        assert (await backend.read(sid)).message_type == "Question explanation"
+        assert fake.expiries[f"session:{sid}".encode()] == 120
+
+        # A command cancelled before its reply arrived must not hand that reply
+        # to the next command on the client.
+        fake.delay = 0.2
+        try:
+            await asyncio.wait_for(backend.client.execute("GET", "other"), 0.05)
+        except asyncio.TimeoutError:
+            pass
+        else:
+            raise AssertionError("expected a timeout")
+        fake.delay = 0.0
+        assert (await backend.read(sid)).message_type == "Question explanation"
+
+        await backend.delete(sid)
+        assert await backend.read(sid) is None
+        try:
+            await backend.update(sid, data)
+        except BackendError:
+            pass
+        else:
+            raise AssertionError("update of a deleted session should fail")
+
+        await backend.close()
+        fake.server.close()
+
+    asyncio.run(scenario())
+
+
+def test_cached_backend_serves_reads_from_lru():
+    """Fresh cache entries are served without touching storage; LRU evicts the oldest."""
+    from uuid import uuid4
+
+    from session_store import CachedBackend, MemoryBackend
+
+    class CountingBackend(MemoryBackend):
+        reads = 0
+
+        async def read(self, session_id):
+            CountingBackend.reads += 1
+            return await super().read(session_id)
+
+    async def scenario():
+        cached = CachedBackend(CountingBackend(), maxsize=1, max_age=60)
+        first, second = uuid4(), uuid4()
+        await cached.create(first, _session())
+        await cached.read(first)
+        await cached.read(first)
+        assert CountingBackend.reads == 0
+
+        await cached.create(second, _session("bob"))  # evicts `first`
+        assert (await cached.read(first)).username == "alice"
+        assert CountingBackend.reads == 1
+
+    asyncio.run(scenario())
+
+
+def test_backends_append_messages_without_rewriting_history(tmp_path):
+    """A turn only appends its new messages; the header is written separately."""
+    from uuid import uuid4
+
+    from models import StoredMessage
+    from session_store import MemoryBackend, RedisBackend, SQLiteBackend, TTLBackend
+
+    class Incomplete(TTLBackend):  # no append_messages / update_header
+        create = read = update = delete = MemoryBackend.create
+
+    try:
+        Incomplete()
+    except TypeError as exc:
+        assert "append_messages" in str(exc)
+    else:
+        raise AssertionError("expected TypeError")
+
+    async def exercise(backend):
+        sid = uuid4()
+        first = StoredMessage(role="user", content="hi")
+        await backend.create(sid, _session().model_copy(update={"messages": [first]}))
+
+        data = await backend.read(sid)
+        data.message_type = "Question explanation"
+        await backend.append_messages(sid, [StoredMessage(role="assistant", content="hello"), StoredMessage(role="user", content="more")])
+        await backend.update_header(sid, data)
+
+        stored = await backend.read(sid)
+        assert [m.content for m in stored.messages] == ["hi", "hello", "more"]
+        assert stored.messages[0].ts == first.ts
+        assert stored.message_type == "Question explanation"
+        await backend.close()
+
+    async def scenario():
+        fake = FakeRedisServer()
+        port = await fake.start()
+        await exercise(MemoryBackend())
+        await exercise(SQLiteBackend(str(tmp_path / "sessions.db")))
+        await exercise(RedisBackend(f"redis://127.0.0.1:{port}/0"))
+        fake.server.close()
+
+    asyncio.run(scenario())
+
+
+def test_turn_coordinator_serializes_sessions_and_coalesces_duplicates(tmp_path):
+    """One turn per session at a time, across two workers sharing a SQLite store;
+    a duplicate submission shares the pending run and a full queue is rejected."""
+    from uuid import uuid4
+
+    from fastapi import HTTPException
+
+    from session_locks import TurnCoordinator
+    from session_store import SQLiteBackend
+
+    async def scenario():
+        path = str(tmp_path / "sessions.db")
+        sid = uuid4()
+        store_a, store_b = SQLiteBackend(path), SQLiteBackend(path)
+        await store_a.create(sid, _session())
+        worker_a = TurnCoordinator(store_a, max_waiters=1)
+        worker_b = TurnCoordinator(store_b, max_waiters=1)
+
+        running, peak, calls = 0, 0, []
+
+        def turn(label):
+            async def run():
+                nonlocal running, peak
+                calls.append(label)
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.05)
+                running -= 1
+                return label
+            return run
+
+        results = await asyncio.gather(
+            worker_a.run(sid, "hi", turn("first")),
+            worker_a.run(sid, "hi", turn("duplicate")),
+            worker_b.run(sid, "other", turn("other worker")),
+        )
+        assert results == ["first", "first", "other worker"]
+        assert sorted(calls) == ["first", "other worker"]
+        assert peak == 1
+
+        pending = [asyncio.ensure_future(worker_a.run(sid, f"msg {i}", turn(i))) for i in range(2)]
+        await asyncio.sleep(0)
+        try:
+            await worker_a.run(sid, "one too many", turn("rejected"))
+        except HTTPException as exc:
+            assert exc.status_code == 429
+        else:
+            raise AssertionError("expected 429")
+        assert await asyncio.gather(*pending) == [0, 1]
+
+        # A turn longer than the lease keeps it: the heartbeat renews it.
+        short = TurnCoordinator(store_a, lease_seconds=0.15)
+
+        async def slow():
+            await asyncio.sleep(0.4)
+            return await store_b.acquire_lock(sid, "intruder", 1.0)
+
+        assert await short.run(sid, "slow", slow) is False
+
+        await store_a.close()
+        await store_b.close()
+
+    asyncio.run(scenario())
+
+
+def test_llm_gateway_caps_concurrency_and_schedules_by_priority_then_user(monkeypatch):
+    """With one slot, waiting calls run cheapest priority first, round-robin across users."""
+    from llm_gateway import LLMGateway
+
+    async def scenario():
+        gateway = LLMGateway(max_concurrency=1)
+        order = []
+
+        async def call(user, priority, label):
+            async with gateway.slot(user, priority):
+                order.append(label)
+                await asyncio.sleep(0)
+
+        blocker = asyncio.Event()
+
+        async def hold():
+            async with gateway.slot("x", 0):
+                await blocker.wait()
+
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        calls = [
+            asyncio.ensure_future(call("alice", 3, "alice code 1")),
+            asyncio.ensure_future(call("alice", 3, "alice code 2")),
+            asyncio.ensure_future(call("alice", 3, "alice code 3")),
+            asyncio.ensure_future(call("bob", 3, "bob code")),
+            asyncio.ensure_future(call("carol", 0, "carol planner")),
+        ]
+        await asyncio.sleep(0)
+        assert gateway.stats()["queue_depth"] == 5
+        assert gateway.stats()["queue_depth_by_priority"] == {0: 1, 3: 4}
+
+        blocker.set()
+        await asyncio.gather(holder, *calls)
+        assert order == ["carol planner", "alice code 1", "bob code", "alice code 2", "alice code 3"]
+        stats = gateway.stats()
+        assert stats["calls"] == 6 and stats["in_flight"] == 0 and stats["queue_depth"] == 0
+
+    asyncio.run(scenario())
+
+    # Configured limits are totals, split between the server's workers.
+    monkeypatch.setenv("LLM_MAX_CONCURRENCY", "10")
+    monkeypatch.setenv("LLM_REQUESTS_PER_MINUTE", "600")
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    split = LLMGateway.from_env()
+    assert split.max_concurrency == 2 and split.requests.capacity == 150 and split.tokens is None
+    monkeypatch.setenv("WEB_CONCURRENCY", "16")
+    assert LLMGateway.from_env().max_concurrency == 1
+
+
+def test_gated_llm_reads_node_and_user_from_the_graph_run(monkeypatch):
+    """Graph calls go through the gateway tagged with the session user and node priority."""
+    from llm_gateway import LLMGateway
+
+    stub = StubLLM([StubResult(message_type="Question explanation"), StubResult(content="Explained.")])
+    sys.modules.pop("ai", None)
+    monkeypatch.setattr("langchain.chat_models.init_chat_model", lambda *_args, **_kwargs: stub)
+    ai = importlib.import_module("ai")
+
+    seen = []
+
+    class RecordingGateway(LLMGateway):
+        def slot(self, user, priority=2, tokens=0):
+            seen.append((user, priority))
+            return super().slot(user, priority, tokens)
+
+    gateway = RecordingGateway(max_concurrency=2)
+    graph = ai.build_graph(model="stubbed", fast_path_threshold=None, gateway=gateway)
+    state = {"messages": [HumanMessage(content="What does this problem ask?")], "message_type": None}
+    result = asyncio.run(graph.ainvoke(state, config={"metadata": {"user_id": "session-1"}}))
+
+    assert result["messages"][-1].content == "Explained."
+    assert seen == [("session-1", 0), ("session-1", 2)]
+    assert gateway.stats()["calls"] == 2
+
+
+class FlakyLLM(StubLLM):
+    """StubLLM whose calls can be delayed or fail: `script` holds (delay, error) per call."""
+
+    def __init__(self, responses, script):
+        super().__init__(responses)
+        self.script = list(script)
+        self.calls = 0
+
+    async def ainvoke(self, *args, **kwargs):
+        delay, error = self.script.pop(0) if self.script else (0, None)
+        self.calls += 1
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return self.invoke(*args, **kwargs)
+
+
+def test_resilient_llm_retries_times_out_and_hedges():
+    from llm_policy import CallPolicy, CallStats, LLMUnavailable, ResilientLLM
+    from model_tiers import FallbackLLM
+
+    planner = {"metadata": {"langgraph_node": "planner"}}
+    coder = {"metadata": {"langgraph_node": "User code correction"}}
+
+    async def scenario():
+        stats = CallStats()
+        policies = {
+            "planner": CallPolicy(timeout=1.0, retries=0, hedge=True, hedge_after=0.05),
+            "User code correction": CallPolicy(timeout=0.1, retries=1, backoff=0.01),
+            "context": CallPolicy(timeout=0.05, retries=0, hedge=True, hedge_after=1.0),
+        }
+
+        # A transient error is retried with backoff.
+        flaky = FlakyLLM([StubResult(content="fixed")], [(0, ConnectionError("reset"))])
+        result = await ResilientLLM(flaky, policies, stats).ainvoke("fix it", coder)
+        assert result.content == "fixed" and flaky.calls == 2
+
+        # Non-transient errors surface unchanged, without retrying.
+        broken = FlakyLLM([], [(0, ValueError("bad request"))])
+        try:
+            await ResilientLLM(broken, policies, stats).ainvoke("fix it", coder)
+        except ValueError:
+            assert broken.calls == 1
+        else:
+            raise AssertionError("expected ValueError")
+
+        # Every attempt timing out ends in LLMUnavailable.
+        slow = FlakyLLM([StubResult(content="late")] * 2, [(1, None), (1, None)])
+        try:
+            await ResilientLLM(slow, policies, stats).ainvoke("fix it", coder)
+        except LLMUnavailable as exc:
+            assert exc.node == "User code correction"
+        else:
+            raise AssertionError("expected LLMUnavailable")
+
+        # A stalled planner call is hedged and the second call's answer wins.
+        stalled = FlakyLLM([StubResult(message_type="Question explanation")], [(0.5, None), (0, None)])
+        result = await ResilientLLM(stalled, policies, stats).ainvoke("classify", planner)
+        assert result.message_type == "Question explanation" and stalled.calls == 2
+
+        # A timeout before the hedge starts cancels the first call rather than orphaning it.
+        hung = FlakyLLM([StubResult(content="late")], [(0.2, None)])
+        try:
+            await ResilientLLM(hung, policies, stats).ainvoke("summarize", {"metadata": {"langgraph_node": "context"}})
+        except LLMUnavailable:
+            await asyncio.sleep(0.3)
+            assert hung._responses  # never answered
+        else:
+            raise AssertionError("expected LLMUnavailable")
+
+        counters = stats.as_dict()
+        assert counters["User code correction"]["retries"] == 2
+        assert counters["User code correction"]["timeouts"] == 2
+        assert counters["User code correction"]["failures"] == 1
+        assert counters["planner"]["hedges"] == 1 and counters["planner"]["hedge_wins"] == 1
+
+        # An attempt that already streamed text is neither retried nor handed to a fallback.
+        class CutOff(FlakyLLM):
+            async def ainvoke(self, messages, config=None, **kwargs):
+                for handler in config["callbacks"]:
+                    handler.on_llm_new_token("Here is the")
+                return await super().ainvoke(messages, config, **kwargs)
+
+        cut = CutOff([StubResult(content="again")], [(0, ConnectionError("reset"))])
+        backup = StubLLM([StubResult(content="backup")])
+        try:
+            await FallbackLLM(ResilientLLM(cut, policies, stats), backup).ainvoke("fix it", coder)
+        except LLMUnavailable as exc:
+            assert exc.streamed and cut.calls == 1 and backup._responses
+        else:
+            raise AssertionError("expected LLMUnavailable")
+
+    asyncio.run(scenario())
+
+
+def test_nodes_use_their_model_tier_and_fall_back_when_it_is_down(monkeypatch):
+    from llm_policy import CallPolicy
+    from model_tiers import ModelChoice
+
+    fast = StubLLM([StubResult(message_type="User code correction")])
+    strong = FlakyLLM([], [(0, ConnectionError("overloaded"))])
+    backup = StubLLM([StubResult(content="Fixed code from the backup model.")])
+    models = {"fast": fast, "strong": strong, "backup": backup, "default": StubLLM([])}
+
+    sys.modules.pop("ai", None)
+    monkeypatch.setattr("langchain.chat_models.init_chat_model", lambda name, **_kwargs: models.get(name, models["default"]))
+    ai = importlib.import_module("ai")
+
+    graph = ai.build_graph(
+        model="default",
+        fast_path_threshold=None,
+        call_policies={"User code correction": CallPolicy(retries=2, backoff=5.0)},
+        node_models={
+            "planner": ModelChoice("fast"),
+            "User code correction": ModelChoice("strong", fallback="backup"),
+        },
+    )
+    state = {"messages": [HumanMessage(content="my code crashes, can you fix it?")], "message_type": None}
+    result = asyncio.run(graph.ainvoke(state))
+
+    assert result["message_type"] == "User code correction"
+    assert result["messages"][-1].content == "Fixed code from the backup model."
+    # The primary is not retried (no 5 s backoff): the fallback answers after one failure.
+    assert strong.calls == 1 and not fast._responses and not backup._responses
+
+
+def test_registry_creates_clients_lazily_and_shares_them_across_graphs(monkeypatch):
+    created = []
+
+    class CountingStub(StubLLM):
+        def with_structured_output(self, _schema):
+            created.append("structured")
+            return self
+
+    stub = CountingStub([StubResult(message_type="Question explanation"), StubResult(content="Explained.")])
+
+    def factory(name, **_kwargs):
+        created.append(name)
+        return stub
+
+    for module in ("checkpoint_store", "ai"):
+        sys.modules.pop(module, None)
+    monkeypatch.setenv("GRAPH_CHECKPOINTER", "memory")
+    monkeypatch.setattr("langchain.chat_models.init_chat_model", factory)
+    ai = importlib.import_module("ai")
+
+    graph = ai.get_graph(model="stubbed", fast_path_threshold=None, node_models={})
+    assert created == []  # building (and importing) never creates a client
+    assert ai.get_graph(model="stubbed", fast_path_threshold=None, node_models={}) is graph
+    assert ai.get_graph(model="stubbed", node_models={}) is not graph
+
+    state = {"messages": [HumanMessage(content="What does this problem ask?")], "message_type": None}
+    thread = {"configurable": {"thread_id": "t1"}}
+    assert asyncio.run(graph.ainvoke(state, thread))["messages"][-1].content == "Explained."
+    assert created == ["stubbed", "structured"]
+
+    ai.build_graph(model="stubbed", node_models={})
+    assert ai.default_registry.client("stubbed").initialized and created == ["stubbed", "structured"]
+
+
+def test_state_adapter_converts_only_new_messages_and_keeps_timestamps(monkeypatch):
+    """Cached LangChain messages are reused; stored timestamps survive a round trip."""
+    from uuid import uuid4
+
+    from langchain_core.messages import AIMessage
+
+    import state_adapter
+    from models import SessionData, StoredMessage
+
+    converted = []
+    original = state_adapter.stored_to_lc
+    monkeypatch.setattr(state_adapter, "stored_to_lc", lambda m: converted.append(m.id) or original(m))
+
+    sid = uuid4()
+    sd = SessionData(username="alice", auth_token="token", messages=[StoredMessage(role="user", content="hi")])
+    first_ts = sd.messages[0].ts
+
+    state = state_adapter.session_to_state(sd, sid)
+    state["messages"] = state["messages"] + [HumanMessage(content="again", id="h2"), AIMessage(content="reply", id="a2")]
+    state_adapter.state_to_session(sd, state, sid)
+    assert sd.messages[0].ts == first_ts
+    assert [m.id for m in sd.messages[1:]] == ["h2", "a2"]
+
+    sd.messages.append(StoredMessage(role="user", content="from another worker"))
+    state = state_adapter.session_to_state(sd, sid)
+
+    assert converted == [sd.messages[0].id, sd.messages[3].id]
+    assert [m.content for m in state["messages"]] == ["hi", "again", "reply", "from another worker"]
+
+
+def test_response_cache_serves_repeat_cold_context_questions(monkeypatch, tmp_path):
+    """A second user asking the same first question on the same problem skips the node LLM call."""
+    from langchain_core.messages import AIMessage
+
+    from model_tiers import ModelChoice
+    from response_cache import ResponseCache
+
+    stub = StubLLM(
+        [
+            StubResult(message_type="Question explanation"),
+            StubResult(content="It asks for two indices."),
+            StubResult(message_type="Question explanation"),  # second run: planner only
+        ]
+    )
+
+    down = FlakyLLM([], [(0, ConnectionError("overloaded"))])
+    backup = StubLLM([AIMessage(content="Backup explanation.")])
+    models = {"primary": down, "backup": backup}
+
+    sys.modules.pop("ai", None)
+    monkeypatch.setattr("langchain.chat_models.init_chat_model", lambda name, **_kwargs: models.get(name, stub))
+    ai = importlib.import_module("ai")
+
+    cache = ResponseCache(str(tmp_path / "responses.db"))
+    graph = ai.build_graph(model="stubbed", fast_path_threshold=None, response_cache=cache)
+    pinned = [
+        HumanMessage(content="LeetCode Question #1:  titled 'Two Sum'. Please identify and confirm the full title."),
+        AIMessage(content="Two Sum. How may I assist you further?"),
+    ]
+
+    for text in ["Explain the question", "Can you please explain the question?"]:
+        state = {"messages": pinned + [HumanMessage(content=text)], "message_type": None}
+        result_state = asyncio.run(graph.ainvoke(state))
+        assert result_state["messages"][-1].content == "It asks for two indices."
+
+    assert cache.stats() == {"Question explanation": {"hits": 1, "misses": 1}}
+
+    # A reply from the node's fallback model is not stored under the primary's key.
+    stub._responses = [StubResult(message_type="Solution explanation")]
+    graph = ai.build_graph(
+        model="stubbed", fast_path_threshold=None, response_cache=cache,
+        node_models={"Solution explanation": ModelChoice("primary", fallback="backup")},
+    )
+    state = {"messages": pinned + [HumanMessage(content="Explain the solution")], "message_type": None}
+    assert asyncio.run(graph.ainvoke(state))["messages"][-1].content == "Backup explanation."
+    key = cache.key_for("Solution explanation", "primary", state["messages"])
+    assert asyncio.run(cache.get("Solution explanation", key)) is None
+
+
+def test_catalog_indexes_lazily_by_number_and_title(tmp_path):
+    """The catalog is only read on first lookup and resolves numbers, titles and slugs."""
+    from catalog import Catalog
+
+    catalog = Catalog()
+    assert catalog._loaded is False
+
+    two_sum = catalog.lookup(1)
+    assert two_sum.title == "Two Sum" and two_sum.entry_point == "twoSum"
+    assert catalog.lookup(None, "two sum") == two_sum
+    assert catalog.lookup(999999, "Best Time to Buy and Sell Stock").number == 121
+    assert catalog.lookup(999999) is None
+    assert two_sum.context_statement().startswith("LeetCode Question #1: Two Sum")
+    assert len(Catalog(tmp_path / "missing.tsv")) == 0
+
+
+def test_questions_endpoint_answers_known_problem_without_llm(monkeypatch, tmp_path):
+    """/questions acknowledges catalog problems locally and pins the real statement;
+    a busy session's /chat/stream is refused with an HTTP status."""
+    from uuid import UUID
+
+    from fastapi.testclient import TestClient
+
+    from session_store import SQLiteBackend
+
+    stub = StubLLM([])  # any LLM call would fail the test
+
+    for module in ("ai", "chat_service", "main"):
+        sys.modules.pop(module, None)
+    monkeypatch.setenv("RESPONSE_CACHE", "off")
+    monkeypatch.setattr("langchain.chat_models.init_chat_model", lambda *_args, **_kwargs: stub)
+    main = importlib.import_module("main")
+
+    with TestClient(main.app) as client:
+        created = client.post("/create_session/alice").json()
+        headers = {"X-Session-ID": created["session_id"], "X-Session-Auth": created["auth_token"]}
+
+        body = client.post("/questions", json={"lc_question_number": 1}, headers=headers).json()
+        assert body["res"] == "1. Two Sum\n\nHow may I assist you further?"
+        assert body["message_type"] == "LeetCode Question"
+
+        messages = client.get("/whoami", headers=headers).json()["messages"]
+        assert "Exactly one valid pair exists" in messages[0]["content"]
+
+        # A session busy in another worker is refused before the stream starts.
+        session_id = UUID(created["session_id"])
+        leases = SQLiteBackend(str(tmp_path / "leases.db"))
+        monkeypatch.setattr(main.turns, "backend", leases)
+        monkeypatch.setattr(main.turns, "acquire_timeout", 0.0)
+        assert client.portal.call(leases.acquire_lock, session_id, "other worker", 60.0)
+        busy = client.post("/chat/stream", json={"text": "explain it"}, headers=headers)
+        assert busy.status_code == 409 and busy.json()["detail"] == "Session is busy in another worker"
+        assert session_id not in main.turns._waiters
+
+
+def test_usage_recorder_reports_prompt_cache_tokens_per_call():
+    """Each chat-model call is recorded with its node and cache read/write token counts."""
+    from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+    from langchain_core.messages import AIMessage
+
+    from usage import UsageRecorder
+
+    reply = AIMessage(
+        content="ok",
+        usage_metadata={
+            "input_tokens": 1200,
+            "output_tokens": 10,
+            "total_tokens": 1210,
+            "input_token_details": {"cache_read": 1024, "cache_creation": 0},
+        },
+        response_metadata={"model_name": "claude-test"},
+    )
+    llm = GenericFakeChatModel(messages=iter([reply]))
+    recorder = UsageRecorder()
+
+    asyncio.run(llm.ainvoke("hi", config={"callbacks": [recorder], "metadata": {"langgraph_node": "Question explanation"}}))
+
+    (call,) = recorder.as_dicts()
+    assert call.pop("latency_seconds") >= 0
+    assert [call] == [{
+        "node": "Question explanation",
+        "model": "claude-test",
+        "input_tokens": 1200,
+        "output_tokens": 10,
+        "cache_read_tokens": 1024,
+        "cache_write_tokens": 0,
+    }]
+
+
+def test_metrics_cover_nodes_llm_tokens_and_cost(monkeypatch):
+    """Graph nodes are timed as spans, LLM usage becomes token/cost counters, and
+    everything renders in the Prometheus text format."""
+    import telemetry
+    from usage import CallUsage
+
+    stub = StubLLM([StubResult(message_type="Question explanation"), StubResult(content="Explained.")])
+    sys.modules.pop("ai", None)
+    monkeypatch.setattr("langchain.chat_models.init_chat_model", lambda *_args, **_kwargs: stub)
+    ai = importlib.import_module("ai")
+
+    before = telemetry.SPAN_SECONDS.count(span="node", node="Question explanation")
+    graph = ai.build_graph(model="stubbed", fast_path_threshold=None)
+    asyncio.run(graph.ainvoke({"messages": [HumanMessage(content="What does this problem ask?")], "message_type": None}))
+    assert telemetry.SPAN_SECONDS.count(span="node", node="Question explanation") == before + 1
+
+    cost = telemetry.record_llm_calls([CallUsage(
+        node="planner", model="claude-3-5-haiku-20241022", input_tokens=3000, output_tokens=100,
+        cache_read_tokens=2000, cache_write_tokens=0, latency_seconds=0.3,
+    )])
+    # 1000 uncached + 2000 cached input tokens at $0.80/M (reads at 10%), 100 output at $4/M.
+    assert abs(cost - (1000 * 0.8 + 2000 * 0.08 + 100 * 4.0) / 1e6) < 1e-12
+    assert telemetry.estimate_cost("some-local-model", 10, 10) is None
+
+    text = telemetry.metrics.render()
+    assert '# TYPE leetcode_llm_call_seconds histogram' in text
+    assert 'leetcode_llm_tokens_total{node="planner",model="claude-3-5-haiku-20241022",kind="cache_read"}' in text
+    assert 'leetcode_span_seconds_count{span="node",node="Question explanation"}' in text
+
+
+# Cold-start budget for `import main` (the API without the LLM stack), in seconds.
+STARTUP_IMPORT_BUDGET = float(os.getenv("STARTUP_IMPORT_BUDGET", "1.5"))
+
+
+def test_api_imports_within_budget_without_the_llm_stack():
+    """Importing the app must not load LangGraph/LangChain or the provider SDK."""
+    from bench import import_profile
+
+    profile = import_profile("main")
+    heavy = {"langgraph", "langchain", "langchain_core", "langchain_anthropic", "anthropic", "langsmith"}
+    assert not heavy & set(profile["packages"]), sorted(heavy & set(profile["packages"]))
+    assert profile["total_seconds"] < STARTUP_IMPORT_BUDGET, profile
+
+
+def test_load_test_drives_the_api_and_reports_percentiles(monkeypatch):
+    import loadtest
+
+    monkeypatch.setenv("SESSION_BACKEND", "memory")
+    for name in ("GRAPH_CHECKPOINTER", "STARTUP_WARM_UP"):
+        monkeypatch.delenv(name, raising=False)
+    saved = {name: sys.modules.get(name) for name in ("checkpoint_store", "ai", "chat_service")}
+    config = loadtest.LoadConfig(users=4, turns=2, ttft_median=0.01, tokens_per_second=5000, memory_sessions=2)
+    try:
+        report = asyncio.run(loadtest.run_load(config))
+    finally:
+        for name, module in saved.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+
+    assert report["errors"] == {} and report["error_rate"] == 0
+    assert report["latency"]["create_session"]["count"] == 4
+    turns = sum(report["latency"].get(name, {"count": 0})["count"] for name in ("chat", "chat_stream"))
+    assert turns == 8
+    assert report["latency"]["questions"]["p95_ms"] >= report["latency"]["questions"]["p50_ms"]
+    assert report["memory_per_session_bytes"] > 0
+    assert loadtest.check(report, max_p95_ms=0.001, max_error_rate=None, max_loop_lag_ms=None)
+    # The run leaves the process environment as it found it.
+    assert "GRAPH_CHECKPOINTER" not in os.environ and "STARTUP_WARM_UP" not in os.environ
+
+    fake = loadtest.FakeChatModel(ttft_median=0.0, tokens_per_second=1e6)
+    assert fake.invoke("hi").content.startswith("tok0 ")
+
+
+def test_workers_share_sessions_and_checkpoints(tmp_path):
+    import loadtest
+    from checkpoint_store import SQLiteSaver
+    from langgraph.graph import MessagesState, StateGraph
+
+    # Two workers under the shipped gunicorn config: without keep-alive a
+    # session's requests are spread over both workers.
+    config = loadtest.LoadConfig(users=4, turns=2, ttft_median=0.0, tokens_per_second=1e6)
+    report = asyncio.run(loadtest.run_scaling(config, [2]))
+    (row,) = report["scaling"]
+    assert row["errors"] == {} and row["turn_latency"]["count"] == 8
+    assert len(row["requests_per_worker"]) == 2
+
+    # A thread checkpointed by one worker resumes in another.
+    builder = StateGraph(MessagesState)
+    builder.add_node("echo", lambda state: {"messages": [("ai", f"seen {len(state['messages'])}")]})
+    builder.set_entry_point("echo")
+    path = str(tmp_path / "checkpoints.db")
+    thread = {"configurable": {"thread_id": "s1"}}
+    first, second = SQLiteSaver(path, ttl_seconds=60), SQLiteSaver(path, ttl_seconds=60)
+    asyncio.run(builder.compile(checkpointer=first).ainvoke({"messages": [("user", "hi")]}, thread))
+    state = asyncio.run(builder.compile(checkpointer=second).ainvoke({"messages": [("user", "again")]}, thread))
+    assert [m.content for m in state["messages"]] == ["hi", "seen 1", "again", "seen 3"]
+    second.delete_thread("s1")
+    assert first.get_tuple(thread) is None
+
+
+def test_turns_send_only_new_messages_to_the_checkpointed_thread_and_resume(monkeypatch):
+    from uuid import uuid4
+
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    from models import SessionData
+
+    labelled = lambda reply: [StubResult(message_type="Question explanation"), StubResult(content=reply)]
+    stub = StubLLM(labelled("Explained.") + labelled("Again.") + labelled("Resumed."))
+    for module in ("checkpoint_store", "ai", "chat_service"):
+        sys.modules.pop(module, None)
+    monkeypatch.setenv("GRAPH_CHECKPOINTER", "memory")
+    monkeypatch.setattr("langchain.chat_models.init_chat_model", lambda *_args, **_kwargs: stub)
+    ai = importlib.import_module("ai")
+    chat_service = importlib.import_module("chat_service")
+    graph = ai.build_graph(model="stubbed", fast_path_threshold=None, checkpointer=InMemorySaver())
+    monkeypatch.setattr(chat_service, "graph", graph)
+    converted = []
+    monkeypatch.setattr(chat_service, "session_to_state", lambda sd, sid: converted.append(len(sd.messages)) or {"messages": []})
+
+    session_id, session = uuid4(), SessionData(username="a", auth_token="t")
+    thread = {"configurable": {"thread_id": str(session_id)}}
+
+    async def scenario():
+        data, _ = await chat_service.apply_user_message_and_get_reply(session_id, session, "What does it ask?")
+        data, _ = chat_service.record_turn(data, "Pinned statement", "1. Two Sum", "LeetCode Question")
+        data, reply = await chat_service.apply_user_message_and_get_reply(session_id, data, "Again?")
+        # A stream cut off after the planner step leaves the turn unfinished in the thread.
+        stream = chat_service.stream_user_message_reply(session_id, data, "Cut off?")
+        assert await anext(stream) == ("message_type", "Question explanation")
+        await stream.aclose()
+        resumed = [event async for event in chat_service.stream_resumed_reply(session_id, data)]
+        nothing = [event async for event in chat_service.stream_resumed_reply(session_id, resumed[-1][1][0])]
+        return reply, resumed, nothing, await graph.aget_state(thread)
+
+    reply, resumed, nothing, snapshot = asyncio.run(scenario())
+    assert reply == "Again." and converted == [0]  # only the first turn seeded the thread
+    assert [event for event, _ in resumed] == ["message_type", "token", "done"]
+    data, reply = resumed[-1][1]
+    assert reply == "Resumed." and data.checkpointed_upto == len(data.messages) == 8
+    assert [m.id for m in snapshot.values["messages"]] == [m.id for m in data.messages]
+    assert nothing == [("done", None)]
+
+
+def test_batch_classifier_dedupes_caches_and_retries_with_bounded_concurrency(monkeypatch):
+    from langchain_core.runnables import RunnableLambda
+
+    from classifier import BatchClassifier, ClassificationCache
+    from models import MessageClassifier
+
+    class Overloaded(Exception):
+        status_code = 529
+
+    class LabelLLM:
+        def __init__(self):
+            self.calls, self.active, self.peak = [], 0, 0
+            self.failed = False
+
+        def with_structured_output(self, schema):
+            async def classify(messages):
+                text = messages[-1]["content"]
+                self.calls.append(text)
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+                try:
+                    await asyncio.sleep(0.01)
+                    if text == "flaky" and not self.failed:
+                        self.failed = True
+                        raise Overloaded()
+                    return schema(message_type="Solution explanation" if "approach" in text else "Question explanation")
+                finally:
+                    self.active -= 1
+
+            assert schema is MessageClassifier
+            return RunnableLambda(classify)
+
+    async def scenario():
+        llm = LabelLLM()
+        cache = ClassificationCache()
+        classifier = BatchClassifier(llm, model="m", cache=cache, concurrency=3, backoff=0, fast_path_threshold=None)
+        texts = [f"message {i}" for i in range(10)] + ["message 0", "what approach works?", "flaky"]
+        first = await classifier.classify(texts)
+        again = await classifier.classify([("message 1", None), ("message 1", "LeetCode Question #1: Two Sum")])
+        # A new prompt or label set does not reuse the old labels.
+        monkeypatch.setattr("classifier.PROMPT_VERSION", "edited")
+        reprompted = await classifier.classify(["message 1"])
+        return llm, first, again, reprompted
+
+    llm, first, again, reprompted = asyncio.run(scenario())
+    assert [r.message_type for r in first[:10]] == ["Question explanation"] * 10
+    assert first[11].message_type == "Solution explanation" and first[12].source == "llm"
+    # 12 distinct messages, "flaky" retried once, one miss in the second batch,
+    # then one after the prompt change.
+    assert len(llm.calls) == 12 + 1 + 1 + 1 and llm.calls.count("message 0") == 1
+    assert llm.peak <= 3
+    # Same text with a different pinned question is a different cache entry.
+    assert [r.source for r in again] == ["cache", "llm"]
+    assert reprompted[0].source == "llm"
+
+
+def test_routing_eval_records_then_replays_the_golden_set(tmp_path):
+    from langchain_core.runnables import RunnableLambda
+
+    from routing_eval import ReplayLLM, evaluate, load_golden
+
+    examples = load_golden()
+    gold = {example.text: example.label for example in examples}
+
+    class GoldLLM:
+        calls = 0
+
+        def with_structured_output(self, schema):
+            async def classify(messages):
+                GoldLLM.calls += 1
+                text = messages[-1]["content"]
+                # Get one label wrong so the confusion matrix has an off-diagonal cell.
+                label = "Solution explanation" if gold[text] == "Question explanation" else gold[text]
+                return schema(message_type=label)
+
+            return RunnableLambda(classify)
+
+    cassette = str(tmp_path / "cassette.json")
+    recorder = ReplayLLM(cassette, "m", GoldLLM(), mode="auto")
+    recorded = asyncio.run(evaluate(examples, recorder, fast_path_threshold=None))
+    recorder.save()
+    assert GoldLLM.calls == len(examples)
+
+    replayed = asyncio.run(evaluate(examples, ReplayLLM(cassette, "m", mode="replay"), fast_path_threshold=None))
+    assert GoldLLM.calls == len(examples)
+    assert replayed["llm_calls"] == {"replayed": len(examples)}
+    assert replayed["confusion"] == recorded["confusion"]
+    assert replayed["confusion"]["Question explanation"] == {"Solution explanation": 6}
+    assert replayed["per_label"]["Question explanation"]["recall"] == 0
+    assert replayed["accuracy"] == round(42 / 48, 4)
+
+    # A different model is a different prompt key: nothing replays.
+    other = asyncio.run(evaluate(examples[:3], ReplayLLM(cassette, "other", mode="replay"), fast_path_threshold=None))
+    assert other["errors"] == 3 and other["llm_calls"] == {"missed": 3}
+
+
+def test_parallel_code_drafts_run_concurrently_and_merge_in_order(monkeypatch):
+    from model_tiers import ModelChoice
+
+    brute = FlakyLLM([StubResult(content="A. 🧩 Problem Understanding\nFind a pair.\n\nB1. 💻 Brute Force\nloops\n\nC1. 🧠 Brute Force Explanation\nO(n^2)")], [(0.3, None)])
+    optimized = FlakyLLM([StubResult(content="B2. 💻 Optimized\nhash map\n\nC2. 🧠 Optimized Explanation\nO(n)\n\nD. 📈 Summary\n| table |")], [(0.15, None)])
+    models = {"planner": StubLLM([StubResult(message_type="Code the solution as per user req/code correction")]), "brute": brute, "optimized": optimized}
+
+    sys.modules.pop("ai", None)
+    sys.modules.pop("chat_service", None)
+    monkeypatch.setattr("langchain.chat_models.init_chat_model", lambda name, **_kwargs: models.get(name, StubLLM([])))
+    ai = importlib.import_module("ai")
+    chat_service = importlib.import_module("chat_service")
+    graph = ai.build_graph(
+        model="default", fast_path_threshold=None, parallel_code_drafts=True,
+        node_models={"planner": ModelChoice("planner"), ai.BRUTE_FORCE_DRAFT: ModelChoice("brute"), ai.OPTIMIZED_DRAFT: ModelChoice("optimized")},
+    )
+    monkeypatch.setattr(chat_service, "graph", graph)
+
+    async def collect():
+        state = {"messages": [HumanMessage(content="Write two sum in Python")], "message_type": None}
+        started = asyncio.get_running_loop().time()
+        events = [event async for event in chat_service.stream_graph(state)]
+        return events, asyncio.get_running_loop().time() - started
+
+    events, elapsed = asyncio.run(collect())
+    assert elapsed < 0.4  # about the slower draft, not the sum of both
+    tokens = [payload for name, payload in events if name == "token"]
+    # Whichever draft is ready first is streamed first; the merged reply is not repeated.
+    assert tokens[0].startswith("B2.") and tokens[1] == "\n\n" and tokens[2].startswith("A.") and len(tokens) == 3
+
+    reply = events[-1][1]["messages"][-1].content
+    headings = [line.split(" ")[0] for line in reply.splitlines() if line[:3] in {"A. ", "B1.", "B2.", "C1.", "C2.", "D. "}]
+    assert headings == ["A.", "B1.", "B2.", "C1.", "C2.", "D."]
+    assert not events[-1][1].get("drafts")
+
+
+def test_generated_code_is_checked_in_the_sandbox_and_repaired_once(monkeypatch):
+    from langchain_core.messages import AIMessage
+
+    from catalog import catalog
+    from sandbox import SandboxPool
+
+    broken = "class Solution:\n    def twoSum(self, nums: List[int], target: int) -> List[int]:\n        return [0, 1]\n"
+    fixed = (
+        "class Solution:\n    def twoSum(self, nums: List[int], target: int) -> List[int]:\n"
+        "        seen = {}\n        for i, n in enumerate(nums):\n            if target - n in seen:\n"
+        "                return [seen[target - n], i]\n            seen[n] = i\n"
+    )
+    stub = StubLLM([
+        StubResult(message_type="Code the solution as per user req/code correction"),
+        StubResult(content=f"Brute force:\n```python\n{fixed}```\nOptimized:\n```python\n{broken}```"),
+        StubResult(content=f"```python\n{fixed}```"),  # the single repair call
+    ])
+    sys.modules.pop("ai", None)
+    monkeypatch.setattr("langchain.chat_models.init_chat_model", lambda *_args, **_kwargs: stub)
+    ai = importlib.import_module("ai")
+
+    pool = SandboxPool(workers=1)
+    try:
+        graph = ai.build_graph(model="stubbed", fast_path_threshold=None, node_models={}, sandbox=pool)
+        state = {"messages": [
+            HumanMessage(content=catalog.by_number(1).context_statement()),
+            AIMessage(content="1. Two Sum\n\nHow may I assist you further?"),
+            HumanMessage(content="Write it in Python"),
+        ], "message_type": None}
+        result = asyncio.run(graph.ainvoke(state))
+    finally:
+        pool.close()
+
+    reply = result["messages"][-1].content
+    assert len(result["messages"]) == 4 and not stub._responses
+    assert broken not in reply and reply.count(fixed) == 2
+    assert "- Brute force: ✅ 3/3 passed" in reply and "- Optimized: ✅ 3/3 passed" in reply and "(after an automatic fix)" in reply
+    assert [(b["label"], b["passed"], b["repaired"]) for b in result["verification"]["blocks"]] == [
+        ("Brute force", True, False), ("Optimized", True, True)]
+
+
+def test_streamed_reply_sends_the_verification_note_but_not_the_repair_call(monkeypatch):
+    from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+    from langchain_core.messages import AIMessage
+
+    from catalog import catalog
+    from model_tiers import ModelChoice
+    from sandbox import SandboxPool
+
+    broken = "class Solution:\n    def twoSum(self, nums: List[int], target: int) -> List[int]:\n        return [0, 1]\n"
+    fixed = (
+        "class Solution:\n    def twoSum(self, nums: List[int], target: int) -> List[int]:\n"
+        "        seen = {}\n        for i, n in enumerate(nums):\n            if target - n in seen:\n"
+        "                return [seen[target - n], i]\n            seen[n] = i\n"
+    )
+    stub = StubLLM([
+        StubResult(message_type="Code the solution as per user req/code correction"),
+        StubResult(content=f"Optimized:\n```python\n{broken}```"),
+    ])
+    # The repair model streams, as a real one would.
+    repairer = GenericFakeChatModel(messages=iter([AIMessage(content=f"REPAIRTOKENS ```python\n{fixed}```")]))
+    for module in ("ai", "chat_service"):
+        sys.modules.pop(module, None)
+    monkeypatch.setattr(
+        "langchain.chat_models.init_chat_model", lambda name, **_kwargs: repairer if name == "repairer" else stub)
+    chat_service = importlib.import_module("chat_service")
+    ai = importlib.import_module("ai")
+
+    pool = SandboxPool(workers=1)
+    try:
+        graph = ai.build_graph(
+            model="stubbed", fast_path_threshold=None, node_models={ai.VERIFY_NODE: ModelChoice("repairer")}, sandbox=pool)
+        monkeypatch.setattr(chat_service, "graph", graph)
+        state = {"messages": [
+            HumanMessage(content=catalog.by_number(1).context_statement()),
+            AIMessage(content="1. Two Sum\n\nHow may I assist you further?"),
+            HumanMessage(content="Write it in Python"),
+        ], "message_type": None}
+
+        async def collect():
+            return [event async for event in chat_service.stream_graph(state)]
+
+        events = asyncio.run(collect())
+    finally:
+        pool.close()
+
+    tokens = "".join(text for name, text in events if name == "token")
+    assert "REPAIRTOKENS" not in tokens and tokens.count(fixed) == 1
+    assert "(after an automatic fix)" in tokens
+    assert events[-1][1]["verification"]["blocks"][0]["repaired"]
+
+
+def test_sandbox_contains_hangs_network_and_writes(tmp_path, monkeypatch):
+    from sandbox import SandboxPool
+
+    monkeypatch.setenv("SANDBOX_TEST_SECRET", "sk-secret")
+    examples = [{"input": {"n": 2}, "output": 4}]
+    target = tmp_path / "written"
+    host_file = tmp_path / "host.txt"
+    host_file.write_text("keep me")
+    writes = {
+        "truncate": f"os.truncate({str(host_file)!r}, 0)",
+        "os_open": f"os.open({str(host_file)!r}, os.O_WRONLY | os.O_TRUNC)",
+        "chmod": f"os.chmod({str(host_file)!r}, 0o777)",
+        "symlink": f"os.symlink({str(host_file)!r}, {str(tmp_path / 'link')!r})",
+    }
+    jobs = {
+        **{name: f"import os\ndef square(n):\n    {line}\n" for name, line in writes.items()},
+        "env": "import os\ndef square(n):\n    return os.environ.get('SANDBOX_TEST_SECRET')\n",
+        "ok": "def square(n):\n    return n * n\n",
+        "hang": "def square(n):\n    while True:\n        pass\n",
+        "network": "import socket\ndef square(n):\n    socket.socket().connect(('127.0.0.1', 9))\n",
+        "write": f"def square(n):\n    open({str(target)!r}, 'w').write('x')\n",
+    }
+
+    async def scenario():
+        pool = SandboxPool(workers=2, timeout=0.5)
+        try:
+            return {name: await pool.check(code, "square", examples) for name, code in jobs.items()}
+        finally:
+            pool.close()
+
+    results = asyncio.run(scenario())
+    assert results["ok"].passed and results["ok"].runtime_ms >= 0
+    assert not results["hang"].passed and "timed out" in results["hang"].error
+    assert "PermissionError" in results["network"].cases[0].error
+    assert "PermissionError" in results["write"].cases[0].error and not target.exists()
+    for name in writes:
+        assert "PermissionError" in results[name].cases[0].error, name
+    assert host_file.read_text() == "keep me" and oct(host_file.stat().st_mode)[-3:] != "777"
+    assert results["env"].cases[0].got == "None"  # the server's environment never reaches the code
+
+
+def test_benchmark_fits_growth_and_flags_wrong_claims(monkeypatch):
+    from langchain_core.messages import AIMessage
+
+    from catalog import catalog
+    from complexity import complexity_report
+    from sandbox import BenchResult, SandboxPool
+
+    brute = (
+        "class Solution:\n    def twoSum(self, nums: List[int], target: int) -> List[int]:\n"
+        "        for i in range(len(nums)):\n            for j in range(i + 1, len(nums)):\n"
+        "                if nums[i] + nums[j] == target:\n                    return [i, j]\n"
+    )
+    optimized = (
+        "class Solution:\n    def twoSum(self, nums: List[int], target: int) -> List[int]:\n"
+        "        seen = {}\n        for i, n in enumerate(nums):\n            if target - n in seen:\n"
+        "                return [seen[target - n], i]\n            seen[n] = i\n"
+    )
+    table = "| Approach | Time | Space |\n|---|---|---|\n| Brute force | O(n²) | O(1) |\n| Optimized | O(log n) | O(n) |\n"
+    stub = StubLLM([
+        StubResult(message_type="Code the solution as per user req/code correction"),
+        StubResult(content=f"Brute force:\n```python\n{brute}```\nOptimized:\n```python\n{optimized}```\n{table}"),
+    ])
+    sys.modules.pop("ai", None)
+    monkeypatch.setattr("langchain.chat_models.init_chat_model", lambda *_args, **_kwargs: stub)
+    ai = importlib.import_module("ai")
+
+    pool = SandboxPool(workers=2)
+    try:
+        graph = ai.build_graph(model="stubbed", fast_path_threshold=None, node_models={}, sandbox=pool, benchmark_seconds=0.5)
+        state = {"messages": [
+            HumanMessage(content=catalog.by_number(1).context_statement()),
+            AIMessage(content="1. Two Sum\n\nHow may I assist you further?"),
+            HumanMessage(content="Write it in Python"),
+        ], "message_type": None}
+        result = asyncio.run(graph.ainvoke(state))
+    finally:
+        pool.close()
+
+    report = result["verification"]["benchmarks"]
+    rows = {row["label"]: row for row in report["rows"]}
+    assert rows["Brute force"]["measured_time"] == "O(n^2)" and rows["Brute force"]["claimed_time"] == "O(n²)"
+    assert rows["Optimized"]["measured_time"] in {"O(n)", "O(n log n)"} and rows["Optimized"]["measured_space"] == "O(n)"
+    assert rows["Optimized"]["largest_n"] > rows["Brute force"]["largest_n"] >= report["n"]
+    assert report["warnings"] == [f"Optimized: claimed O(log n) time, but the timings grow like {rows['Optimized']['measured_time']}."]
+    assert "| Optimized | O(log n) |" in result["messages"][-1].content
+
+    # An "optimized" solution that is no faster at the largest common size is flagged.
+    points = [{"n": n, "seconds": n * 1e-6, "peak_bytes": 100} for n in (8, 16, 32, 64)]
+    slow = complexity_report({"Brute force": BenchResult(points), "Optimized": BenchResult(points)}, "")
+    assert slow["warnings"] == ["The optimized solution is not faster than the brute force one at n = 64: 64.0 µs against 64.0 µs."]
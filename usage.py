@@ -0,0 +1,62 @@
+"""
+Per-call LLM token usage, including provider prompt-cache reads and writes.
+
+Pass a `UsageRecorder` as a callback when running the graph; it records one
+`CallUsage` per chat-model call, tagged with the graph node that made it and
+its latency.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import asdict, dataclass
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+
+@dataclass
+class CallUsage:
+    node: str | None
+    model: str | None
+    input_tokens: int
+    output_tokens: int
+    cache_read_tokens: int
+    cache_write_tokens: int
+    latency_seconds: float | None = None
+
+
+class UsageRecorder(BaseCallbackHandler):
+    run_inline = True
+
+    def __init__(self) -> None:
+        self.calls: list[CallUsage] = []
+        self._nodes: dict[UUID, tuple[str | None, float]] = {}
+
+    def on_chat_model_start(self, serialized: dict[str, Any], messages, *, run_id: UUID, metadata: dict | None = None, **kwargs: Any) -> None:
+        self._nodes[run_id] = ((metadata or {}).get("langgraph_node"), time.perf_counter())
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        node, started = self._nodes.pop(run_id, (None, None))
+        latency = time.perf_counter() - started if started is not None else None
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if not usage:
+                    continue
+                details = usage.get("input_token_details") or {}
+                self.calls.append(CallUsage(
+                    node=node,
+                    model=message.response_metadata.get("model_name") or message.response_metadata.get("model"),
+                    input_tokens=usage.get("input_tokens", 0),
+                    output_tokens=usage.get("output_tokens", 0),
+                    cache_read_tokens=details.get("cache_read", 0),
+                    cache_write_tokens=details.get("cache_creation", 0),
+                    latency_seconds=latency,
+                ))
+
+    def as_dicts(self) -> list[dict]:
+        return [asdict(call) for call in self.calls]